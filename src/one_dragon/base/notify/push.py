@@ -24,6 +24,7 @@ class Push():
 
     def __init__(self, ctx: ScriptChainerContext):
         self.ctx: ScriptChainerContext = ctx
+        self._channel_state = threading.local()  # 每个渠道在自己的线程中发送 记录该渠道是否推送失败
 
 
     def bark(self, title: str, content: str, image: Optional[BytesIO]) -> None:
@@ -962,8 +963,9 @@ class Push():
 
 
     def log_error(self, message: str) -> None:
-        """记录错误日志"""
+        """记录错误日志 各渠道只在推送失败时记录错误 同时标记当前渠道发送失败"""
         log.error(f'指令[ 通知 ] {message}')
+        self._channel_state.failed = True
 
 
     def get_config(self, key: str):
@@ -971,16 +973,44 @@ class Push():
         return getattr(self.ctx.push_config, key.lower(), None)
 
 
-    def send(self, content: str, image: Optional[BytesIO] = None, test_method: Optional[str] = None) -> None:
+    def send_channels(self, content: str, channels: Optional[list[str]] = None,
+                      image: Optional[BytesIO] = None) -> list[str]:
+        """
+        发送到各个渠道 每个渠道一个线程
+        渠道抛出异常 或者返回非成功的响应(记录了推送失败) 都认为该渠道发送失败
+        :param content: 消息内容
+        :param channels: 需要发送的渠道名称 为None时发送到全部渠道
+        :param image: 图片
+        :return: 发送失败的渠道名称
+        """
         title = self.ctx.push_config.custom_push_title
-
-        notify_function = self.add_notify_function()
-        ts = [
-            threading.Thread(target=mode, args=(title, content, image), name=mode.__name__)
-            for mode in notify_function
+        notify_function = [
+            i for i in self.add_notify_function()
+            if channels is None or i.__name__ in channels
         ]
+
+        failed: list[str] = []
+        failed_lock = threading.Lock()
+
+        def send_one(method) -> None:
+            self._channel_state.failed = False
+            try:
+                method(title, content, image)
+            except Exception:
+                log.error(f'指令[ 通知 ] 渠道发送失败 {method.__name__}', exc_info=True)
+                self._channel_state.failed = True
+            if self._channel_state.failed:
+                with failed_lock:
+                    failed.append(method.__name__)
+
+        ts = [threading.Thread(target=send_one, args=(mode,), name=mode.__name__) for mode in notify_function]
         [t.start() for t in ts]
         [t.join() for t in ts]
+        return failed
+
+
+    def send(self, content: str, image: Optional[BytesIO] = None, test_method: Optional[str] = None) -> None:
+        self.send_channels(content, image=image)
 
 
 def main():
@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+from typing import Optional
+
+import yaml
+
+from one_dragon.utils import os_utils
+from one_dragon.utils.log_utils import log
+
+# 有C扩展时使用更快的解析器
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+class ScriptChainIndexEntry:
+
+    def __init__(self, module_name: str, mtime_ns: int, size: int,
+                 script_count: int, valid: bool, error: str = ''):
+        """
+        索引中的一个脚本链 只记录列表需要显示的信息
+        :param module_name: 脚本链名称 即文件名
+        :param mtime_ns: 文件的修改时间
+        :param size: 文件大小
+        :param script_count: 脚本数量
+        :param valid: 文件能否正常解析
+        :param error: 不能解析时的原因
+        """
+        self.module_name: str = module_name
+        self.mtime_ns: int = mtime_ns
+        self.size: int = size
+        self.script_count: int = script_count
+        self.valid: bool = valid
+        self.error: str = error
+
+    def to_dict(self) -> dict:
+        return {
+            'module_name': self.module_name,
+            'mtime_ns': self.mtime_ns,
+            'size': self.size,
+            'script_count': self.script_count,
+            'valid': self.valid,
+            'error': self.error,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> 'ScriptChainIndexEntry':
+        return ScriptChainIndexEntry(
+            module_name=data['module_name'],
+            mtime_ns=data['mtime_ns'],
+            size=data['size'],
+            script_count=data['script_count'],
+            valid=data['valid'],
+            error=data.get('error', ''),
+        )
+
+
+def read_index_entry(module_name: str, file_path: str, mtime_ns: int, size: int) -> ScriptChainIndexEntry:
+    """
+    解析一个脚本链文件 生成索引
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            data = yaml.load(file, Loader=_YAML_LOADER)
+    except Exception as e:
+        return ScriptChainIndexEntry(module_name, mtime_ns, size, 0, False, f'文件解析失败 {e}')
+
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return ScriptChainIndexEntry(module_name, mtime_ns, size, 0, False, '文件内容不是字典')
+    script_list = data.get('script_list', [])
+    if script_list is None:
+        script_list = []
+    if not isinstance(script_list, list) or any(not isinstance(i, dict) for i in script_list):
+        return ScriptChainIndexEntry(module_name, mtime_ns, size, 0, False, 'script_list 格式错误')
+    return ScriptChainIndexEntry(module_name, mtime_ns, size, len(script_list), True)
+
+
+class ScriptChainIndex:
+
+    def __init__(self, config_dir: str, index_path: Optional[str] = None):
+        """
+        脚本链配置的元数据索引 用于显示脚本链列表 不需要创建每个 ScriptChainConfig
+        索引保存在本地 每次只重新解析修改时间或大小变化的文件
+        :param config_dir: 脚本链配置所在的目录
+        :param index_path: 索引文件路径 默认为 .log/script_chain_index.json
+        """
+        if index_path is None:
+            index_path = os.path.join(os_utils.get_path_under_work_dir('.log'), 'script_chain_index.json')
+        self.config_dir: str = config_dir
+        self.index_path: str = index_path
+
+        self._lock = threading.Lock()
+        self._entries: Optional[dict[str, ScriptChainIndexEntry]] = None  # 第一次使用时从索引文件读取
+
+    def _load(self) -> dict[str, ScriptChainIndexEntry]:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            return {
+                i['module_name']: ScriptChainIndexEntry.from_dict(i)
+                for i in data.get('entries', [])
+            }
+        except Exception:
+            log.error(f'脚本链索引读取失败 重新生成 {self.index_path}', exc_info=True)
+            return {}
+
+    def _save(self) -> None:
+        data = {'entries': [i.to_dict() for i in self._entries.values()]}
+        temp_path = f'{self.index_path}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(data, file, ensure_ascii=False)
+            os.replace(temp_path, self.index_path)
+        except Exception:
+            log.error(f'脚本链索引保存失败 {self.index_path}', exc_info=True)
+
+    def get_entries(self) -> list[ScriptChainIndexEntry]:
+        """
+        获取全部脚本链的索引 按名称排序
+        只读取目录中文件的修改时间和大小 有变化的文件才重新解析
+        """
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+
+            changed: bool = False
+            current: dict[str, ScriptChainIndexEntry] = {}
+            with os.scandir(self.config_dir) as it:
+                for dir_entry in it:
+                    if not dir_entry.name.endswith('.yml') or not dir_entry.is_file():
+                        continue
+                    module_name = dir_entry.name[:-4]
+                    stat = dir_entry.stat()
+                    entry = self._entries.get(module_name)
+                    if entry is None or entry.mtime_ns != stat.st_mtime_ns or entry.size != stat.st_size:
+                        entry = read_index_entry(module_name, dir_entry.path, stat.st_mtime_ns, stat.st_size)
+                        changed = True
+                    current[module_name] = entry
+
+            if len(current) != len(self._entries):  # 有文件被删除
+                changed = True
+            self._entries = current
+            if changed:
+                self._save()
+
+            return sorted(current.values(), key=lambda i: i.module_name)
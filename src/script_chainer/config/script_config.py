@@ -1,8 +1,20 @@
+import copy
 import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
 from enum import Enum
+from typing import Optional, Iterator, TYPE_CHECKING
+
+import yaml
 
 from one_dragon.base.config.config_item import ConfigItem, get_config_item_from_enum
 from one_dragon.base.config.yaml_config import YamlConfig
+from one_dragon.utils.log_utils import log
+
+if TYPE_CHECKING:
+    from script_chainer.config.script_plan import ChainPlan
 
 
 class CheckDoneMethods(Enum):
@@ -10,6 +22,8 @@ class CheckDoneMethods(Enum):
     GAME_CLOSED = ConfigItem(label='游戏被关闭', value='game_closed', desc='游戏被关闭时 认为任务完成')
     SCRIPT_CLOSED = ConfigItem(label='脚本被关闭', value='script_closed', desc='脚本被关闭时 认为任务完成')
     GAME_OR_SCRIPT_CLOSED = ConfigItem(label='游戏或脚本被关闭', value='game_or_script_closed', desc='游戏或脚本被关闭时 认为任务完成')
+    LOG_MATCHED = ConfigItem(label='日志出现完成标记', value='log_matched', desc='脚本日志出现匹配正则的内容时 认为任务完成')
+    TREE_EMPTY = ConfigItem(label='脚本进程树全部退出', value='tree_empty', desc='脚本启动的进程及其后代进程全部退出时 认为任务完成 不需要进程名称')
 
 
 class ScriptProcessName(Enum):
@@ -27,6 +41,16 @@ class GameProcessName(Enum):
     ZZZ_CN = ConfigItem(label='绝区零', value='ZenlessZoneZero.exe')
 
 
+class ProcessPriority(Enum):
+
+    DEFAULT = ConfigItem(label='不修改', value='')
+    IDLE = ConfigItem(label='低', value='idle', desc='Windows为低优先级 其它系统为nice 19')
+    BELOW_NORMAL = ConfigItem(label='低于正常', value='below_normal', desc='Windows为低于正常 其它系统为nice 10')
+    NORMAL = ConfigItem(label='正常', value='normal', desc='Windows为正常 其它系统为nice 0')
+    ABOVE_NORMAL = ConfigItem(label='高于正常', value='above_normal', desc='Windows为高于正常 其它系统为nice -5 需要权限')
+    HIGH = ConfigItem(label='高', value='high', desc='Windows为高 其它系统为nice -10 需要权限')
+
+
 class ScriptConfig:
 
     def __init__(self,
@@ -40,6 +64,33 @@ class ScriptConfig:
                  script_arguments: str,
                  notify_start: bool,
                  notify_done: bool,
+                 depends_on: Optional[list[int]] = None,
+                 parallel_group: str = '',
+                 ready_process_name: str = '',
+                 ready_max_seconds: float = 5,
+                 ready_log_file: str = '',
+                 ready_log_regex: str = '',
+                 ready_tcp_port: int = 0,
+                 ready_timeout_seconds: float = 20,
+                 create_retry_seconds: float = 1,
+                 create_retry_backoff: float = 1,
+                 teardown_wait_game_closed: bool = False,
+                 teardown_cpu_percent: float = 0,
+                 teardown_max_seconds: float = 10,
+                 max_rss_mb: float = 0,
+                 max_cpu_seconds: float = 0,
+                 hang_seconds: float = 0,
+                 hang_notify: bool = True,
+                 hang_kill: bool = False,
+                 script_priority: str = '',
+                 script_affinity: str = '',
+                 game_priority: str = '',
+                 game_affinity: str = '',
+                 done_log_file: str = '',
+                 done_log_regex: str = '',
+                 capture_output: bool = False,
+                 output_max_mb: float = 5,
+                 output_backup_count: int = 3,
                  ):
 
         self.idx: int = 0  # 下标 由外面控制
@@ -53,6 +104,33 @@ class ScriptConfig:
         self.script_arguments: str = script_arguments  # 运行脚本的附加参数
         self.notify_start: bool = notify_start  # 是否在脚本开始时通知
         self.notify_done: bool = notify_done  # 是否在脚本完成时通知
+        self.depends_on: Optional[list[int]] = depends_on  # 依赖的脚本下标 None时按顺序依赖前一组脚本
+        self.parallel_group: str = parallel_group  # 并行分组 相邻且分组相同的脚本可以同时运行
+        self.ready_process_name: str = ready_process_name  # 该进程出现后 认为脚本已启动
+        self.ready_max_seconds: float = ready_max_seconds  # 子进程存活这么久后 认为脚本已启动
+        self.ready_log_file: str = ready_log_file  # 该日志文件出现匹配的内容后 认为脚本已启动
+        self.ready_log_regex: str = ready_log_regex  # 日志文件需要匹配的正则
+        self.ready_tcp_port: int = ready_tcp_port  # 该本地端口可以连接后 认为脚本已启动 0为不检查
+        self.ready_timeout_seconds: float = ready_timeout_seconds  # 超过这个时间仍未启动 认为子进程创建失败
+        self.create_retry_seconds: float = create_retry_seconds  # 子进程异常退出后 等待多久重新创建
+        self.create_retry_backoff: float = create_retry_backoff  # 每次重新创建后 等待时间乘以该倍数
+        self.teardown_wait_game_closed: bool = teardown_wait_game_closed  # 结束后 等待游戏进程退出再开始下一个脚本
+        self.teardown_cpu_percent: float = teardown_cpu_percent  # 结束后 等待系统CPU占用低于该值再开始下一个脚本 0为不检查
+        self.teardown_max_seconds: float = teardown_max_seconds  # 结束后 等待开始下一个脚本的最长时间
+        self.max_rss_mb: float = max_rss_mb  # 脚本和游戏进程树合计的内存上限 超过时强制关闭 0为不限制
+        self.max_cpu_seconds: float = max_cpu_seconds  # 脚本和游戏进程树合计的CPU时间上限 超过时强制关闭 0为不限制
+        self.hang_seconds: float = hang_seconds  # 脚本和游戏进程树这么久没有CPU和读写活动时 认为卡住 0为不检查
+        self.hang_notify: bool = hang_notify  # 卡住时是否通知
+        self.hang_kill: bool = hang_kill  # 卡住时是否强制关闭
+        self.script_priority: str = script_priority  # 脚本进程树的优先级 为空时不修改
+        self.script_affinity: str = script_affinity  # 脚本进程树可以使用的CPU 例如 0-3,6 为空时不修改
+        self.game_priority: str = game_priority  # 游戏进程树的优先级 为空时不修改
+        self.game_affinity: str = game_affinity  # 游戏进程树可以使用的CPU 为空时不修改
+        self.done_log_file: str = done_log_file  # 检查完成方式为日志出现完成标记时 跟踪的日志文件 可以使用通配符
+        self.done_log_regex: str = done_log_regex  # 日志中表示完成的正则
+        self.capture_output: bool = capture_output  # 是否捕获脚本的输出 写入 .log/script_output 下的日志
+        self.output_max_mb: float = output_max_mb  # 输出日志单个文件的大小上限 超过后轮转
+        self.output_backup_count: int = output_backup_count  # 输出日志轮转后保留的旧文件数量
 
     @property
     def script_display_name(self) -> str:
@@ -67,10 +145,18 @@ class ScriptConfig:
     def check_done_display_name(self) -> str:
         config = get_config_item_from_enum(CheckDoneMethods, self.check_done)
         if config is not None:
-            return config.value.label
+            return config.label
         else:
             return ''
 
+    def get_full_path(self, file_path: str) -> str:
+        """
+        相对路径认为是相对脚本所在的目录
+        """
+        if os.path.isabs(file_path):
+            return file_path
+        return os.path.join(os.path.dirname(self.script_path), file_path)
+
     @property
     def invalid_message(self) -> str:
         """
@@ -98,6 +184,127 @@ class ScriptConfig:
             return '脚本进程名称为空'
         elif self.run_timeout_seconds <= 0:
             return '运行超时时间必须大于0'
+        elif self.ready_max_seconds < 0 or self.teardown_max_seconds < 0 or self.create_retry_seconds < 0:
+            return '等待时间不能小于0'
+        elif self.ready_timeout_seconds <= 0:
+            return '启动超时时间必须大于0'
+        elif self.create_retry_backoff < 1:
+            return '重试等待倍数不能小于1'
+        elif self.ready_tcp_port < 0 or self.ready_tcp_port > 65535:
+            return f'就绪端口非法 {self.ready_tcp_port}'
+        elif bool(self.ready_log_file) != bool(self.ready_log_regex):
+            return '就绪日志文件和正则需要同时填写'
+        elif self.ready_log_regex and not is_valid_regex(self.ready_log_regex):
+            return f'就绪日志正则非法 {self.ready_log_regex}'
+        elif (self.check_done == CheckDoneMethods.LOG_MATCHED.value.value
+              and (len(self.done_log_file) == 0 or len(self.done_log_regex) == 0)):
+            return '完成日志文件和正则需要同时填写'
+        elif self.done_log_regex and not is_valid_regex(self.done_log_regex):
+            return f'完成日志正则非法 {self.done_log_regex}'
+        elif self.max_rss_mb < 0 or self.max_cpu_seconds < 0:
+            return '资源上限不能小于0'
+        elif self.hang_seconds < 0:
+            return '卡住检测时间不能小于0'
+        elif get_config_item_from_enum(ProcessPriority, self.script_priority) is None:
+            return f'脚本进程优先级非法 {self.script_priority}'
+        elif get_config_item_from_enum(ProcessPriority, self.game_priority) is None:
+            return f'游戏进程优先级非法 {self.game_priority}'
+        elif self.script_affinity and not is_valid_cpu_list(self.script_affinity):
+            return f'脚本进程CPU非法 {self.script_affinity}'
+        elif self.game_affinity and not is_valid_cpu_list(self.game_affinity):
+            return f'游戏进程CPU非法 {self.game_affinity}'
+        elif self.capture_output and (self.output_max_mb <= 0 or self.output_backup_count < 0):
+            return '输出日志大小必须大于0 保留数量不能小于0'
+        elif self.depends_on is not None and any(i < 0 or i == self.idx for i in self.depends_on):
+            return f'依赖的脚本下标非法 {depends_on_to_str(self.depends_on)}'
+
+
+def is_valid_regex(pattern: str) -> bool:
+    try:
+        re.compile(pattern)
+        return True
+    except re.error:
+        return False
+
+
+def str_to_cpu_list(text: str) -> list[int]:
+    """
+    CPU列表的文本 转化成CPU下标 格式与 taskset 一致 例如 0-3,6
+    :param text: 文本
+    :return: 去重排序后的CPU下标 文本为空时返回空列表
+    """
+    result: set[int] = set()
+    for part in text.replace('，', ',').split(','):
+        part = part.strip()
+        if len(part) == 0:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            start_idx, end_idx = int(start.strip()), int(end.strip())
+            if start_idx > end_idx:
+                raise ValueError(f'CPU范围非法 {part}')
+            result.update(range(start_idx, end_idx + 1))
+        else:
+            result.add(int(part))
+    if any(i < 0 for i in result):
+        raise ValueError(f'CPU下标非法 {text}')
+    return sorted(result)
+
+
+def is_valid_cpu_list(text: str) -> bool:
+    """
+    CPU列表的文本格式是否合法
+    不检查本机是否存在这些CPU 配置可能在核心数量不同的机器上编辑 运行时忽略本机不存在的CPU
+    """
+    try:
+        cpu_list = str_to_cpu_list(text)
+    except ValueError:
+        return False
+    return len(cpu_list) > 0
+
+
+def depends_on_to_str(depends_on: Optional[list[int]]) -> str:
+    """
+    依赖的脚本下标 转化成用逗号分隔的文本
+    :param depends_on: 依赖的脚本下标
+    :return: 文本
+    """
+    if depends_on is None:
+        return ''
+    return ','.join(str(i) for i in depends_on)
+
+
+def str_to_depends_on(text: Optional[str]) -> Optional[list[int]]:
+    """
+    用逗号分隔的文本 转化成依赖的脚本下标
+    :param text: 文本 为空时返回None 表示按顺序依赖
+    :return: 依赖的脚本下标
+    """
+    if text is None or len(text.strip()) == 0:
+        return None
+    return [int(i.strip()) for i in text.replace('，', ',').split(',') if len(i.strip()) > 0]
+
+
+def save_yaml_atomic(file_path: str, data: dict) -> None:
+    """
+    先写入同目录下的临时文件 再替换原文件 写入中途崩溃时 原文件保持完整
+    :param file_path: 文件路径
+    :param data: 数据
+    """
+    dir_path, file_name = os.path.split(file_path)
+    fd, temp_path = tempfile.mkstemp(prefix=f'.{file_name}.', suffix='.tmp', dir=dir_path)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            yaml.dump(data, file, allow_unicode=True, sort_keys=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
 
 
 class ScriptChainConfig(YamlConfig):
@@ -110,22 +317,70 @@ class ScriptChainConfig(YamlConfig):
             is_mock=is_mock, sample=False, copy_from_sample=False,
         )
 
-        self.script_list: list[ScriptConfig] = [
-            ScriptConfig(
-                script_path=i.get('script_path', ''),
-                script_process_name=i.get('script_process_name', ''),
-                game_process_name=i.get('game_process_name', ''),
-                run_timeout_seconds=i.get('run_timeout_seconds', 3600),
-                check_done=i.get('check_done', ''),
-                kill_script_after_done=i.get('kill_script_after_done', True),
-                kill_game_after_done=i.get('kill_game_after_done', True),
-                script_arguments=i.get('script_arguments', ''),
-                notify_start=i.get('notify_start', True),
-                notify_done=i.get('notify_done', True),
-            )
-            for i in self.get('script_list', [])
-        ]
-        self.init_idx()
+        self._script_list: Optional[list[ScriptConfig]] = None  # 第一次使用时才从配置中创建
+
+        self._transaction_depth: int = 0  # 编辑事务的嵌套层数
+        self._transaction_dirty: bool = False  # 事务期间是否有需要保存的修改
+
+        self.write_behind_seconds: float = 0  # 大于0时 保存后延迟这么久在后台写入 期间的多次保存合并为一次
+        self._write_lock = threading.Lock()
+        self._write_timer: Optional[threading.Timer] = None
+        self._pending_data: Optional[dict] = None  # 等待后台写入的内容
+
+    @property
+    def script_list(self) -> list[ScriptConfig]:
+        """
+        脚本列表 第一次使用时才创建 只需要脚本链的其它配置时 不需要创建每个脚本配置
+        """
+        if self._script_list is None:
+            self._script_list = [
+                ScriptConfig(
+                    script_path=i.get('script_path', ''),
+                    script_process_name=i.get('script_process_name', ''),
+                    game_process_name=i.get('game_process_name', ''),
+                    run_timeout_seconds=i.get('run_timeout_seconds', 3600),
+                    check_done=i.get('check_done', ''),
+                    kill_script_after_done=i.get('kill_script_after_done', True),
+                    kill_game_after_done=i.get('kill_game_after_done', True),
+                    script_arguments=i.get('script_arguments', ''),
+                    notify_start=i.get('notify_start', True),
+                    notify_done=i.get('notify_done', True),
+                    depends_on=i.get('depends_on', None),
+                    parallel_group=i.get('parallel_group', ''),
+                    ready_process_name=i.get('ready_process_name', ''),
+                    ready_max_seconds=i.get('ready_max_seconds', 5),
+                    ready_log_file=i.get('ready_log_file', ''),
+                    ready_log_regex=i.get('ready_log_regex', ''),
+                    ready_tcp_port=i.get('ready_tcp_port', 0),
+                    ready_timeout_seconds=i.get('ready_timeout_seconds', 20),
+                    create_retry_seconds=i.get('create_retry_seconds', 1),
+                    create_retry_backoff=i.get('create_retry_backoff', 1),
+                    teardown_wait_game_closed=i.get('teardown_wait_game_closed', False),
+                    teardown_cpu_percent=i.get('teardown_cpu_percent', 0),
+                    teardown_max_seconds=i.get('teardown_max_seconds', 10),
+                    max_rss_mb=i.get('max_rss_mb', 0),
+                    max_cpu_seconds=i.get('max_cpu_seconds', 0),
+                    hang_seconds=i.get('hang_seconds', 0),
+                    hang_notify=i.get('hang_notify', True),
+                    hang_kill=i.get('hang_kill', False),
+                    script_priority=i.get('script_priority', ''),
+                    script_affinity=i.get('script_affinity', ''),
+                    game_priority=i.get('game_priority', ''),
+                    game_affinity=i.get('game_affinity', ''),
+                    done_log_file=i.get('done_log_file', ''),
+                    done_log_regex=i.get('done_log_regex', ''),
+                    capture_output=i.get('capture_output', False),
+                    output_max_mb=i.get('output_max_mb', 5),
+                    output_backup_count=i.get('output_backup_count', 3),
+                )
+                for i in self.get('script_list', [])
+            ]
+            self.init_idx()
+        return self._script_list
+
+    @script_list.setter
+    def script_list(self, new_value: list[ScriptConfig]) -> None:
+        self._script_list = new_value
 
     def init_idx(self) -> None:
         """
@@ -135,8 +390,143 @@ class ScriptChainConfig(YamlConfig):
         for i in range(len(self.script_list)):
             self.script_list[i].idx = i
 
+    @property
+    def max_concurrency(self) -> int:
+        """
+        最多同时运行的脚本数量
+        """
+        return self.get('max_concurrency', 1)
+
+    @max_concurrency.setter
+    def max_concurrency(self, new_value: int) -> None:
+        self.update('max_concurrency', new_value)
+
+    @property
+    def admission_min_memory_mb(self) -> float:
+        """
+        系统可用内存不少于该值时 才开始下一个脚本 0为不检查
+        """
+        return self.get('admission_min_memory_mb', 0)
+
+    @admission_min_memory_mb.setter
+    def admission_min_memory_mb(self, new_value: float) -> None:
+        self.update('admission_min_memory_mb', new_value)
+
+    @property
+    def admission_max_cpu_percent(self) -> float:
+        """
+        系统CPU占用低于该值时 才开始下一个脚本 0为不检查
+        """
+        return self.get('admission_max_cpu_percent', 0)
+
+    @admission_max_cpu_percent.setter
+    def admission_max_cpu_percent(self, new_value: float) -> None:
+        self.update('admission_max_cpu_percent', new_value)
+
+    @property
+    def admission_max_wait_seconds(self) -> float:
+        """
+        等待系统资源的最长时间 超过后直接开始运行
+        """
+        return self.get('admission_max_wait_seconds', 600)
+
+    @admission_max_wait_seconds.setter
+    def admission_max_wait_seconds(self, new_value: float) -> None:
+        self.update('admission_max_wait_seconds', new_value)
+
+    @property
+    def schedule(self) -> str:
+        """
+        常驻模式下定时运行的cron表达式 例如 "30 4 * * *" 为空时不定时运行
+        """
+        return self.get('schedule', '')
+
+    @schedule.setter
+    def schedule(self, new_value: str) -> None:
+        self.update('schedule', new_value)
+
+    def compile(self) -> 'ChainPlan':
+        """
+        编译成不可修改的运行计划 校验 路径 参数和显示名称只计算一次
+        修改配置后需要重新编译
+        """
+        from script_chainer.config.script_plan import ChainPlan  # script_plan 依赖本模块
+        return ChainPlan(self)
+
+    @contextmanager
+    def transaction(self) -> Iterator['ScriptChainConfig']:
+        """
+        编辑事务 期间的修改只在退出时写入一次文件
+        出现异常时 恢复到事务开始前的内容 不写入文件
+        可以嵌套 只有最外层的事务会写入和恢复
+        """
+        outermost = self._transaction_depth == 0
+        backup = (copy.deepcopy(self.data), copy.deepcopy(self._script_list)) if outermost else None
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if outermost:
+                self.data, self._script_list = backup
+                self._transaction_dirty = False
+            raise
+        finally:
+            self._transaction_depth -= 1
+
+        if outermost and self._transaction_dirty:
+            self._transaction_dirty = False
+            self.save()
+
     def save(self):
+        if self._transaction_depth > 0:  # 事务结束时统一保存
+            self._transaction_dirty = True
+            return
+        if self._script_list is not None:  # 没有使用过脚本列表时 保留原来的内容
+            self._update_data()
+        self._write()
+
+    def _write(self) -> None:
+        """
+        写入文件 开启延迟写入时 由后台定时器写入
+        """
+        if self.file_path is None:
+            return
+        if self.write_behind_seconds <= 0:
+            with self._write_lock:
+                save_yaml_atomic(self.file_path, self.data)
+            return
+
+        with self._write_lock:
+            self._pending_data = copy.deepcopy(self.data)  # 后台写入时 界面可能继续修改
+            if self._write_timer is not None:
+                self._write_timer.cancel()
+            self._write_timer = threading.Timer(self.write_behind_seconds, self.flush)
+            self._write_timer.name = f'script_chain_write_{self.module_name}'
+            self._write_timer.start()
+
+    def flush(self) -> None:
+        """
+        立刻写入等待中的内容 没有等待中的内容时不操作
+        """
+        with self._write_lock:
+            if self._write_timer is not None:
+                self._write_timer.cancel()
+                self._write_timer = None
+            data = self._pending_data
+            self._pending_data = None
+            if data is None:
+                return
+            try:
+                save_yaml_atomic(self.file_path, data)
+            except Exception:
+                log.error(f'脚本链保存失败 {self.file_path}', exc_info=True)
+
+    def _update_data(self) -> None:
+        """
+        把脚本列表写回 data
+        """
         self.data = {
+            **self.data,
             'script_list': [
                 {
                     'script_path': i.script_path,
@@ -149,11 +539,37 @@ class ScriptChainConfig(YamlConfig):
                     'script_arguments': i.script_arguments,
                     'notify_start': i.notify_start,
                     'notify_done': i.notify_done,
+                    'depends_on': i.depends_on,
+                    'parallel_group': i.parallel_group,
+                    'ready_process_name': i.ready_process_name,
+                    'ready_max_seconds': i.ready_max_seconds,
+                    'ready_log_file': i.ready_log_file,
+                    'ready_log_regex': i.ready_log_regex,
+                    'ready_tcp_port': i.ready_tcp_port,
+                    'ready_timeout_seconds': i.ready_timeout_seconds,
+                    'create_retry_seconds': i.create_retry_seconds,
+                    'create_retry_backoff': i.create_retry_backoff,
+                    'teardown_wait_game_closed': i.teardown_wait_game_closed,
+                    'teardown_cpu_percent': i.teardown_cpu_percent,
+                    'teardown_max_seconds': i.teardown_max_seconds,
+                    'max_rss_mb': i.max_rss_mb,
+                    'max_cpu_seconds': i.max_cpu_seconds,
+                    'hang_seconds': i.hang_seconds,
+                    'hang_notify': i.hang_notify,
+                    'hang_kill': i.hang_kill,
+                    'script_priority': i.script_priority,
+                    'script_affinity': i.script_affinity,
+                    'game_priority': i.game_priority,
+                    'game_affinity': i.game_affinity,
+                    'done_log_file': i.done_log_file,
+                    'done_log_regex': i.done_log_regex,
+                    'capture_output': i.capture_output,
+                    'output_max_mb': i.output_max_mb,
+                    'output_backup_count': i.output_backup_count,
                 }
                 for i in self.script_list
            ]
         }
-        YamlConfig.save(self)
 
     def add_one(self) -> ScriptConfig:
         """
@@ -186,6 +602,10 @@ class ScriptChainConfig(YamlConfig):
         if index < 0 or index >= len(self.script_list):
             return
         del self.script_list[index]
+        self.remap_depends_on({
+            i: None if i == index else (i if i < index else i - 1)
+            for i in range(len(self.script_list) + 1)
+        })
         self.init_idx()
         self.save()
 
@@ -198,9 +618,25 @@ class ScriptChainConfig(YamlConfig):
         if index <= 0 or index >= len(self.script_list):
             return
         self.script_list[index], self.script_list[index - 1] = self.script_list[index - 1], self.script_list[index]
+        self.remap_depends_on({index: index - 1, index - 1: index})
         self.init_idx()
         self.save()
 
+    def remap_depends_on(self, idx_mapping: dict[int, Optional[int]]) -> None:
+        """
+        脚本下标变化后 更新各个脚本依赖的下标
+        :param idx_mapping: 旧下标 -> 新下标 不在映射中的下标保持不变 映射到None的依赖会被移除
+        :return:
+        """
+        for config in self.script_list:
+            if config.depends_on is None:
+                continue
+            config.depends_on = [
+                idx_mapping.get(i, i)
+                for i in config.depends_on
+                if i not in idx_mapping or idx_mapping[i] is not None
+            ]
+
     def update_config(self, config: ScriptConfig) -> None:
         """
         更新一个配置
@@ -0,0 +1,188 @@
+import os
+import shlex
+from typing import Optional, Any
+
+from script_chainer.config.script_config import ScriptConfig, CheckDoneMethods, ScriptChainConfig
+
+# 从 ScriptConfig 复制到运行计划的字段
+SCRIPT_CONFIG_FIELDS: tuple[str, ...] = (
+    'idx',
+    'script_path',
+    'script_process_name',
+    'game_process_name',
+    'run_timeout_seconds',
+    'check_done',
+    'kill_script_after_done',
+    'kill_game_after_done',
+    'script_arguments',
+    'notify_start',
+    'notify_done',
+    'depends_on',
+    'parallel_group',
+    'ready_process_name',
+    'ready_max_seconds',
+    'ready_log_file',
+    'ready_log_regex',
+    'ready_tcp_port',
+    'ready_timeout_seconds',
+    'create_retry_seconds',
+    'create_retry_backoff',
+    'teardown_wait_game_closed',
+    'teardown_cpu_percent',
+    'teardown_max_seconds',
+    'max_rss_mb',
+    'max_cpu_seconds',
+    'hang_seconds',
+    'hang_notify',
+    'hang_kill',
+    'script_priority',
+    'script_affinity',
+    'game_priority',
+    'game_affinity',
+    'done_log_file',
+    'done_log_regex',
+    'capture_output',
+    'output_max_mb',
+    'output_backup_count',
+)
+
+
+def split_arguments(text: Optional[str]) -> list[str]:
+    """
+    按命令行的规则拆分脚本参数 带空格的路径可以用引号括起来
+    Windows下不把反斜杠当作转义符 只去掉参数两边的引号
+    :param text: 参数文本
+    :return: 参数列表
+    :raises ValueError: 引号不成对
+    """
+    if text is None or len(text.strip()) == 0:
+        return []
+    if os.name != 'nt':
+        return shlex.split(text)
+    result: list[str] = []
+    for arg in shlex.split(text, posix=False):
+        if len(arg) >= 2 and arg[0] == arg[-1] and arg[0] in ('"', "'"):
+            arg = arg[1:-1]
+        result.append(arg)
+    return result
+
+
+class ScriptPlan:
+
+    __slots__ = SCRIPT_CONFIG_FIELDS + (
+        'command',
+        'ready_log_path',
+        'done_log_path',
+        'script_display_name',
+        'game_display_name',
+        'check_done_display_name',
+        'done_by_game_closed',
+        'done_by_script_closed',
+        'done_by_tree_empty',
+        'done_by_log_matched',
+        'invalid_message',
+    )
+
+    # 与 ScriptConfig 同名的字段见 SCRIPT_CONFIG_FIELDS 以下为编译时计算的字段
+    command: tuple[str, ...]  # 脚本路径和拆分后的参数
+    ready_log_path: str  # 就绪日志的完整路径 没有配置时为空
+    done_log_path: str  # 完成日志的完整路径 没有配置时为空
+    script_display_name: str
+    game_display_name: str
+    check_done_display_name: str
+    done_by_game_closed: bool  # 游戏被关闭时完成
+    done_by_script_closed: bool  # 脚本被关闭时完成 与游戏被关闭同时为True时 任意一个被关闭就完成
+    done_by_tree_empty: bool  # 脚本进程树全部退出时完成
+    done_by_log_matched: bool  # 日志出现完成标记时完成
+    invalid_message: Optional[str]  # 编译时检查的非法信息 合法时为None
+
+    def __init__(self, config: ScriptConfig):
+        """
+        一个脚本的运行计划 由 ScriptConfig 编译得到 创建后不能修改
+        校验 路径 参数 显示名称和完成方式只在编译时计算一次 执行器运行时直接读取
+        """
+        set_value = object.__setattr__
+        for field in SCRIPT_CONFIG_FIELDS:
+            value = getattr(config, field)
+            if isinstance(value, list):  # 列表也不能修改
+                value = tuple(value)
+            set_value(self, field, value)
+
+        script_path = os.path.abspath(config.script_path) if config.script_path else ''
+        set_value(self, 'script_path', script_path)
+        set_value(self, 'ready_log_path', config.get_full_path(config.ready_log_file) if config.ready_log_file else '')
+        set_value(self, 'done_log_path', config.get_full_path(config.done_log_file) if config.done_log_file else '')
+        set_value(self, 'script_display_name', config.script_display_name)
+        set_value(self, 'game_display_name', config.game_display_name)
+        set_value(self, 'check_done_display_name', config.check_done_display_name)
+
+        check_done = config.check_done
+        set_value(self, 'done_by_game_closed', check_done in (CheckDoneMethods.GAME_CLOSED.value.value,
+                                                              CheckDoneMethods.GAME_OR_SCRIPT_CLOSED.value.value))
+        set_value(self, 'done_by_script_closed', check_done in (CheckDoneMethods.SCRIPT_CLOSED.value.value,
+                                                                CheckDoneMethods.GAME_OR_SCRIPT_CLOSED.value.value))
+        set_value(self, 'done_by_tree_empty', check_done == CheckDoneMethods.TREE_EMPTY.value.value)
+        set_value(self, 'done_by_log_matched', check_done == CheckDoneMethods.LOG_MATCHED.value.value)
+
+        invalid_message = config.invalid_message
+        arguments: list[str] = []
+        try:
+            arguments = split_arguments(config.script_arguments)
+        except ValueError as e:
+            if invalid_message is None:
+                invalid_message = f'脚本参数非法 {e}'
+        set_value(self, 'command', (script_path, *arguments))
+        set_value(self, 'invalid_message', invalid_message)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f'运行计划不能修改 {name}')
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f'运行计划不能修改 {name}')
+
+
+class ChainPlan:
+
+    __slots__ = (
+        'module_name',
+        'scripts',
+        'max_concurrency',
+        'admission_min_memory_mb',
+        'admission_max_cpu_percent',
+        'admission_max_wait_seconds',
+        'schedule',
+    )
+
+    module_name: str
+    scripts: tuple[ScriptPlan, ...]
+    max_concurrency: int
+    admission_min_memory_mb: float
+    admission_max_cpu_percent: float
+    admission_max_wait_seconds: float
+    schedule: str
+
+    def __init__(self, chain_config: ScriptChainConfig):
+        """
+        一个脚本链的运行计划 由 ScriptChainConfig.compile 生成 创建后不能修改
+        """
+        set_value = object.__setattr__
+        set_value(self, 'module_name', chain_config.module_name)
+        set_value(self, 'scripts', tuple(ScriptPlan(i) for i in chain_config.script_list))
+        set_value(self, 'max_concurrency', chain_config.max_concurrency)
+        set_value(self, 'admission_min_memory_mb', chain_config.admission_min_memory_mb)
+        set_value(self, 'admission_max_cpu_percent', chain_config.admission_max_cpu_percent)
+        set_value(self, 'admission_max_wait_seconds', chain_config.admission_max_wait_seconds)
+        set_value(self, 'schedule', chain_config.schedule)
+
+    @property
+    def invalid_scripts(self) -> list[ScriptPlan]:
+        """
+        配置不合法的脚本
+        """
+        return [i for i in self.scripts if i.invalid_message is not None]
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f'运行计划不能修改 {name}')
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f'运行计划不能修改 {name}')
@@ -5,6 +5,7 @@ from one_dragon.utils import os_utils
 from one_dragon.base.config.push_config import PushConfig
 from one_dragon.custom.custom_config import CustomConfig
 from one_dragon.envs.project_config import ProjectConfig
+from script_chainer.config.script_chain_index import ScriptChainIndex, ScriptChainIndexEntry
 from script_chainer.config.script_config import ScriptChainConfig
 
 ONE_DRAGON_CONTEXT_EXECUTOR = ThreadPoolExecutor(thread_name_prefix='one_dragon_context', max_workers=1)
@@ -16,6 +17,14 @@ class ScriptChainerContext:
         self.project_config: ProjectConfig = ProjectConfig()
         self.custom_config: CustomConfig = CustomConfig()
         self.push_config: PushConfig = PushConfig()
+        self.script_chain_index: ScriptChainIndex = ScriptChainIndex(self.script_chain_config_dir())
+
+    def get_script_chain_index_list(self) -> list[ScriptChainIndexEntry]:
+        """
+        全部脚本链的元数据 只解析有变化的文件 用于显示脚本链列表
+        需要脚本列表时 再按名称创建 ScriptChainConfig
+        """
+        return self.script_chain_index.get_entries()
 
     def get_all_script_chain_config(self) -> list[ScriptChainConfig]:
         config_list: list[ScriptChainConfig] = []
@@ -52,6 +61,7 @@ class ScriptChainerContext:
         :param config:
         :return:
         """
+        config.flush()  # 避免延迟写入在删除后重新创建文件
         file_path = os.path.join(self.script_chain_config_dir(), f'{config.module_name}.yml')
         if os.path.exists(file_path):
             os.remove(file_path)
@@ -70,8 +80,11 @@ class ScriptChainerContext:
         if os.path.exists(new_file_path):
             raise ValueError(f'脚本链 {new_module_name} 已存在')
         
+        old_config.flush()  # 避免延迟写入在删除后重新创建文件
+
         # 创建新配置
         new_config = ScriptChainConfig(module_name=new_module_name)
+        new_config.data = old_config.data.copy()
         new_config.script_list = old_config.script_list.copy()
         new_config.save()
         
@@ -0,0 +1,300 @@
+import argparse
+import os
+import random
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import psutil
+
+from one_dragon.utils import os_utils
+from script_chainer.config.script_config import ScriptChainConfig, ScriptConfig, CheckDoneMethods
+from script_chainer.runner.chain_journal import ChainJournal
+from script_chainer.runner.metrics_store import MetricsStore, percentile
+
+# 模拟脚本 每个进程启动和退出时各记录一行 "<start|exit> <时间>" 到 <记录目录>/<脚本下标>_<pid>.txt
+STUB_SCRIPT = '''#!/usr/bin/env python3
+import os
+import subprocess
+import sys
+import time
+
+record_dir, idx, kind, seconds, children = sys.argv[1], sys.argv[2], sys.argv[3], float(sys.argv[4]), int(sys.argv[5])
+
+
+def record(event):
+    with open(os.path.join(record_dir, f'{idx}_{os.getpid()}.txt'), 'a') as file:
+        file.write(f'{event} {time.time()}\\n')
+
+
+record('start')
+if kind == 'child':  # 被 spawn 启动的子进程
+    time.sleep(seconds)
+elif kind == 'spawn':  # 启动器 启动子进程后自己先退出
+    for _ in range(children):
+        subprocess.Popen([sys.executable, __file__, record_dir, idx, 'child', str(seconds), '0'],
+                         start_new_session=True)
+    time.sleep(0.05)
+elif kind == 'exit':  # 第一次运行返回异常退出码 执行器重试后正常运行
+    marker = os.path.join(record_dir, f'{idx}.failed')
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        record('exit')
+        sys.exit(3)
+    time.sleep(seconds)
+elif kind == 'hang':  # 一直不退出 直到超时
+    time.sleep(seconds)
+else:
+    time.sleep(seconds)
+record('exit')
+'''
+
+STUB_KINDS: list[str] = ['sleep', 'spawn', 'exit', 'hang']
+
+
+class StubRun:
+
+    def __init__(self, idx: int, kind: str):
+        """
+        一个模拟脚本的实际运行记录
+        """
+        self.idx: int = idx
+        self.kind: str = kind
+        self.start_time: Optional[float] = None  # 最后一次运行的第一个进程启动时间
+        self.end_time: Optional[float] = None  # 最后一次运行的最后一个进程退出时间
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    """
+    解析模拟脚本的比例 例如 sleep=6,spawn=3,exit=0.5,hang=0.5
+    """
+    mix: dict[str, float] = {}
+    for item in text.split(','):
+        kind, weight = item.split('=')
+        if kind not in STUB_KINDS:
+            raise ValueError(f'未知的模拟脚本类型 {kind}')
+        mix[kind] = float(weight)
+    return mix
+
+
+def create_chain(chain_name: str, stub_path: str, record_dir: str, count: int, mix: dict[str, float],
+                 run_seconds: float, hang_timeout_seconds: int, seed: int) -> list[str]:
+    """
+    生成由模拟脚本组成的脚本链配置
+    全部脚本使用进程树全部退出作为检查完成方式 不需要进程名称 也不会按名称关闭其它进程
+    :return: 每个脚本的类型
+    """
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix.keys()), weights=list(mix.values()), k=count)
+
+    chain_config = ScriptChainConfig(chain_name)
+    chain_config.script_list = []
+    for kind in kinds:
+        if kind == 'hang':
+            seconds = hang_timeout_seconds * 3
+        else:
+            seconds = run_seconds
+        config = ScriptConfig(
+            script_path=stub_path,
+            script_process_name='',
+            game_process_name='',
+            run_timeout_seconds=hang_timeout_seconds if kind == 'hang' else 3600,
+            check_done=CheckDoneMethods.TREE_EMPTY.value.value,
+            kill_script_after_done=False,
+            kill_game_after_done=False,
+            script_arguments=f'{record_dir} {len(chain_config.script_list)} {kind} {seconds:g} {2 if kind == "spawn" else 0}',
+            notify_start=False,
+            notify_done=False,
+            ready_max_seconds=0,
+            teardown_max_seconds=0,
+        )
+        chain_config.script_list.append(config)
+    chain_config.init_idx()
+    chain_config.save()
+    return kinds
+
+
+def read_stub_runs(record_dir: str, kinds: list[str]) -> dict[int, StubRun]:
+    """
+    读取模拟脚本记录的启动和退出时间
+    异常退出后重试的脚本 只统计最后一次运行
+    """
+    records: dict[int, list[tuple[float, Optional[float]]]] = {}  # 下标 -> [(启动时间, 退出时间)]
+    for file_name in os.listdir(record_dir):
+        if not file_name.endswith('.txt'):
+            continue
+        idx = int(file_name.split('_')[0])
+        start_time: Optional[float] = None
+        exit_time: Optional[float] = None
+        with open(os.path.join(record_dir, file_name)) as file:
+            for line in file:
+                event, t = line.split()
+                if event == 'start':
+                    start_time = float(t)
+                else:
+                    exit_time = float(t)
+        if start_time is not None:
+            records.setdefault(idx, []).append((start_time, exit_time))
+
+    result: dict[int, StubRun] = {}
+    for idx, process_list in records.items():
+        process_list.sort()
+        run = StubRun(idx, kinds[idx])
+        if run.kind == 'exit' and len(process_list) > 1:  # 去掉第一次异常退出的运行
+            process_list = process_list[1:]
+        run.start_time = process_list[0][0]
+        exit_times = [i[1] for i in process_list]
+        run.end_time = None if any(i is None for i in exit_times) else max(exit_times)
+        result[idx] = run
+    return result
+
+
+def kill_stub_processes(stub_dir: str) -> int:
+    """
+    关闭残留的模拟脚本进程 例如超时的 hang 脚本
+    :return: 关闭的进程数量
+    """
+    killed: list[psutil.Process] = []
+    for proc in psutil.process_iter(['cmdline']):
+        cmdline = proc.info['cmdline'] or []
+        if any(stub_dir in i for i in cmdline):
+            try:
+                proc.kill()
+                killed.append(proc)
+            except psutil.Error:
+                pass
+    psutil.wait_procs(killed, timeout=5)
+    return len(killed)
+
+
+def format_distribution(values: list[float], unit: str = '秒') -> str:
+    if len(values) == 0:
+        return '无数据'
+    return (f'n={len(values)} p50={percentile(values, 50):.3f}{unit} p90={percentile(values, 90):.3f}{unit} '
+            f'p99={percentile(values, 99):.3f}{unit} max={max(values):.3f}{unit}')
+
+
+def run_benchmark(count: int, mix: dict[str, float], run_seconds: float, hang_timeout_seconds: int,
+                  engine: str, max_concurrency: int, sample_interval: float, seed: int) -> str:
+    """
+    生成模拟脚本链 用子进程运行执行器 采样执行器的内存 结束后汇总
+    执行器只能从项目的配置目录读取脚本链 结束后删除生成的脚本链配置和执行器写入的断点续跑记录
+    :return: 报告文本
+    """
+    chain_name = f'_benchmark_{os.getpid()}'
+    stub_dir = tempfile.mkdtemp(prefix='script_chainer_benchmark_')
+    record_dir = os.path.join(stub_dir, 'records')
+    os.mkdir(record_dir)
+    stub_path = os.path.join(stub_dir, 'stub.py')
+    with open(stub_path, 'w') as file:
+        file.write(STUB_SCRIPT)
+    os.chmod(stub_path, os.stat(stub_path).st_mode | stat.S_IEXEC | stat.S_IXGRP | stat.S_IXOTH)
+    metrics_db = os.path.join(stub_dir, 'metrics.db')
+
+    chain_config = ScriptChainConfig(chain_name)
+    journal = ChainJournal(chain_name)
+
+    src_dir = os_utils.get_path_under_work_dir('src')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = src_dir + os.pathsep + env.get('PYTHONPATH', '')
+    command = [
+        sys.executable, os.path.join(src_dir, 'script_chainer', 'win_exe', 'script_runner.py'),
+        '--chain', chain_name,
+        '--engine', engine,
+        '--max-concurrency', str(max_concurrency),
+        '--metrics-db', metrics_db,
+    ]
+
+    rss_samples: list[tuple[float, int]] = []  # (时间, 执行器内存)
+    try:
+        kinds = create_chain(chain_name, stub_path, record_dir, count, mix, run_seconds, hang_timeout_seconds, seed)
+        bench_start = time.time()
+        runner = subprocess.Popen(command, cwd=os_utils.get_work_dir(), env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        runner_proc = psutil.Process(runner.pid)
+        while runner.poll() is None:
+            try:
+                rss_samples.append((time.time() - bench_start, runner_proc.memory_info().rss))
+            except psutil.Error:
+                break
+            time.sleep(sample_interval)
+        runner.wait()
+        bench_seconds = time.time() - bench_start
+        stub_runs = read_stub_runs(record_dir, kinds)
+        metrics_rows = MetricsStore(metrics_db).load(chain_name)
+    finally:
+        leftover = kill_stub_processes(stub_dir)
+        chain_config.delete()
+        if os.path.exists(journal.file_path):
+            os.remove(journal.file_path)
+        shutil.rmtree(stub_dir, ignore_errors=True)
+
+    overhead_list: list[float] = []
+    detect_list: list[float] = []
+    results: dict[str, int] = {}
+    for row in metrics_rows:
+        results[row['result']] = results.get(row['result'], 0) + 1
+        run = stub_runs.get(row['script_idx'])
+        if run is None or run.end_time is None or row['total_seconds'] is None or row['result'] != 'success':
+            continue
+        runner_done_time = row['start_time'] + row['total_seconds']
+        overhead_list.append(row['total_seconds'] - (run.end_time - run.start_time))
+        detect_list.append(runner_done_time - run.end_time)
+
+    lines: list[str] = [
+        f'模拟脚本 {count} 个 执行器 {engine} 并发 {max_concurrency} 总耗时 {bench_seconds:.1f}秒',
+        f'脚本类型 {" ".join(f"{k}={kinds.count(k)}" for k in STUB_KINDS if kinds.count(k) > 0)}',
+        f'运行结果 {" ".join(f"{k}={v}" for k, v in results.items())} 结束后残留进程 {leftover}',
+        f'单个脚本的执行器开销 {format_distribution(overhead_list)}',
+        f'退出检测延迟 {format_distribution([i for i in detect_list if i >= 0])}',
+        f'进程树未结束就判断为完成 {len([i for i in detect_list if i < 0])} 个',
+    ]
+
+    if len(rss_samples) > 0:
+        rss_mb = [i[1] / 1024 / 1024 for i in rss_samples]
+        lines.append(f'执行器内存 开始 {rss_mb[0]:.1f}MB 最高 {max(rss_mb):.1f}MB 结束 {rss_mb[-1]:.1f}MB')
+        # 跳过启动阶段 用后面的采样估计内存增长速度
+        steady = rss_samples[len(rss_samples) // 5:]
+        if len(steady) >= 2 and steady[-1][0] > steady[0][0]:
+            growth = (steady[-1][1] - steady[0][1]) / 1024 / 1024 / (steady[-1][0] - steady[0][0]) * 60
+            lines.append(f'执行器内存增长 {growth:+.2f}MB/分钟')
+        step = max(1, len(rss_samples) // 10)
+        lines.append('执行器内存变化 ' + ' '.join(f'{t:.0f}s={rss / 1024 / 1024:.1f}MB'
+                                           for t, rss in rss_samples[::step]))
+
+    return '\n'.join(lines)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='使用模拟脚本测试执行器的开销 退出检测延迟和内存增长 仅支持Linux')
+    parser.add_argument('--count', type=int, default=200, help='模拟脚本的数量')
+    parser.add_argument('--mix', type=str, default='sleep=6,spawn=3,exit=0.5,hang=0.5', help='各类模拟脚本的比例')
+    parser.add_argument('--run-seconds', type=float, default=0.2, help='模拟脚本的运行时间')
+    parser.add_argument('--hang-timeout', type=int, default=2, help='hang 脚本的运行超时时间')
+    parser.add_argument('--engine', type=str, default='thread', choices=['thread', 'asyncio'], help='执行器')
+    parser.add_argument('--max-concurrency', type=int, default=1, help='最多同时运行的脚本数量')
+    parser.add_argument('--sample-interval', type=float, default=1, help='执行器内存的采样间隔')
+    parser.add_argument('--seed', type=int, default=0, help='生成脚本链的随机种子')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print(run_benchmark(
+        count=args.count,
+        mix=parse_mix(args.mix),
+        run_seconds=args.run_seconds,
+        hang_timeout_seconds=args.hang_timeout,
+        engine=args.engine,
+        max_concurrency=args.max_concurrency,
+        sample_interval=args.sample_interval,
+        seed=args.seed,
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from one_dragon.utils import os_utils
+
+# 启动时不应该导入的模块 只有用到对应功能时才导入
+DEFAULT_FORBIDDEN_MODULES: list[str] = [
+    'requests',
+    'smtplib',
+    'asyncio',
+    'cv2',
+    'one_dragon.base.notify.push',
+    'script_chainer.context.script_chainer_context',
+]
+
+
+class ImportRecord:
+
+    def __init__(self, module_name: str, self_us: int, cumulative_us: int, depth: int):
+        """
+        -X importtime 输出的一行
+        :param module_name: 模块名称
+        :param self_us: 模块自身的导入时间 微秒
+        :param cumulative_us: 包括子模块的导入时间 微秒
+        :param depth: 导入的层级 0为直接导入
+        """
+        self.module_name: str = module_name
+        self.self_us: int = self_us
+        self.cumulative_us: int = cumulative_us
+        self.depth: int = depth
+
+
+def parse_importtime(stderr: str) -> list[ImportRecord]:
+    """
+    解析 -X importtime 的输出 格式为 "import time: 自身 | 累计 | 缩进模块名"
+    """
+    records: list[ImportRecord] = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():  # 表头
+            continue
+        name_part = parts[2].rstrip()
+        module_name = name_part.lstrip()
+        depth = (len(name_part) - len(module_name) - 1) // 2
+        records.append(ImportRecord(module_name, int(parts[0]), int(parts[1]), depth))
+    return records
+
+
+def get_env() -> dict[str, str]:
+    src_dir = os_utils.get_path_under_work_dir('src')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = src_dir + os.pathsep + env.get('PYTHONPATH', '')
+    return env
+
+
+def measure_wall_seconds(module_name: str, runs: int) -> list[float]:
+    """
+    多次启动新的解释器导入模块 记录从创建进程到退出的时间
+    """
+    env = get_env()
+    result: list[float] = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, '-c', f'import {module_name}'], env=env, cwd=os_utils.get_work_dir(),
+                       check=True, stdout=subprocess.DEVNULL)
+        result.append(time.perf_counter() - start_time)
+    return result
+
+
+def measure_imports(module_name: str) -> list[ImportRecord]:
+    """
+    用 -X importtime 启动一次 记录每个模块的导入时间
+    """
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+                               env=get_env(), cwd=os_utils.get_work_dir(),
+                               check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return parse_importtime(completed.stderr)
+
+
+def build_report(module_name: str, runs: int, top: int, forbidden: list[str]) -> tuple[str, float, list[str]]:
+    """
+    :return: 报告文本, 启动时间的中位数(秒), 启动时导入了的禁止模块
+    """
+    wall_seconds = measure_wall_seconds(module_name, runs)
+    records = measure_imports(module_name)
+    loaded = {i.module_name for i in records}
+    forbidden_loaded = [i for i in forbidden if i in loaded]
+
+    median_seconds = statistics.median(wall_seconds)
+    lines: list[str] = [
+        f'导入 {module_name} 的启动时间 运行{runs}次 '
+        f'中位数 {median_seconds * 1000:.0f}ms 最小 {min(wall_seconds) * 1000:.0f}ms 最大 {max(wall_seconds) * 1000:.0f}ms',
+        f'共导入 {len(records)} 个模块 合计 {sum(i.self_us for i in records) / 1000:.0f}ms',
+    ]
+
+    target = [i for i in records if i.module_name == module_name]
+    if len(target) > 0:
+        lines.append(f'{module_name} 累计 {target[0].cumulative_us / 1000:.1f}ms')
+
+    lines.append(f'累计导入时间最长的模块 前{top}个')
+    for record in sorted(records, key=lambda i: i.cumulative_us, reverse=True)[:top]:
+        lines.append(f'  {record.cumulative_us / 1000:8.1f}ms 自身 {record.self_us / 1000:6.1f}ms  {record.module_name}')
+
+    if len(forbidden_loaded) > 0:
+        lines.append(f'启动时导入了不应该导入的模块 {", ".join(forbidden_loaded)}')
+    return '\n'.join(lines), median_seconds, forbidden_loaded
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='测量执行器的启动时间和导入耗时 可以作为回归检查')
+    parser.add_argument('--module', type=str, default='script_chainer.win_exe.script_runner', help='需要测量的模块')
+    parser.add_argument('--runs', type=int, default=5, help='测量启动时间的次数')
+    parser.add_argument('--top', type=int, default=15, help='输出导入时间最长的模块数量')
+    parser.add_argument('--max-ms', type=float, default=0, help='启动时间的中位数超过该值时返回非0 0为不检查')
+    parser.add_argument('--forbid', type=str, default=','.join(DEFAULT_FORBIDDEN_MODULES),
+                        help='启动时不应该导入的模块 用逗号分隔 导入时返回非0')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    forbidden = [i.strip() for i in args.forbid.split(',') if len(i.strip()) > 0]
+    report, median_seconds, forbidden_loaded = build_report(args.module, args.runs, args.top, forbidden)
+    print(report)
+
+    failed: bool = len(forbidden_loaded) > 0
+    if 0 < args.max_ms < median_seconds * 1000:
+        print(f'启动时间超过上限 {median_seconds * 1000:.0f}ms > {args.max_ms:g}ms')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
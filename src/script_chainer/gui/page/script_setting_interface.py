@@ -1,5 +1,6 @@
 import os
-from typing import Optional
+from contextlib import contextmanager
+from typing import Optional, Iterator
 
 from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QColor
@@ -19,7 +20,8 @@ from one_dragon_qt.widgets.setting_card.switch_setting_card import SwitchSetting
 from one_dragon_qt.widgets.setting_card.text_setting_card import TextSettingCard
 from one_dragon_qt.widgets.vertical_scroll_interface import VerticalScrollInterface
 from script_chainer.config.script_config import ScriptChainConfig, ScriptConfig, GameProcessName, CheckDoneMethods, \
-    ScriptProcessName
+    ScriptProcessName, ProcessPriority, depends_on_to_str, str_to_depends_on
+from script_chainer.config.script_plan import ScriptPlan
 from script_chainer.context.script_chainer_context import ScriptChainerContext
 
 
@@ -67,6 +69,21 @@ class ScriptEditDialog(MessageBoxBase):
         )
         self.viewLayout.addWidget(self.check_done_opt)
 
+        self.done_log_file_opt = TextSettingCard(
+            icon=FluentIcon.DOCUMENT,
+            title='完成日志文件',
+            content='检查完成方式为日志出现完成标记时使用 可以使用通配符 相对路径为脚本所在目录'
+        )
+        self.done_log_file_opt.line_edit.setMinimumWidth(200)
+        self.viewLayout.addWidget(self.done_log_file_opt)
+
+        self.done_log_regex_opt = TextSettingCard(
+            icon=FluentIcon.SEARCH,
+            title='完成日志正则',
+            content='日志出现匹配的内容时 认为任务完成'
+        )
+        self.viewLayout.addWidget(self.done_log_regex_opt)
+
         self.kill_script_after_done_opt = SwitchSettingCard(
             icon=FluentIcon.POWER_BUTTON,
             title='结束后关闭脚本进程',
@@ -86,6 +103,182 @@ class ScriptEditDialog(MessageBoxBase):
         self.script_arguments_opt.line_edit.setMinimumWidth(200)
         self.viewLayout.addWidget(self.script_arguments_opt)
 
+        self.parallel_group_opt = TextSettingCard(
+            icon=FluentIcon.TILES,
+            title='并行分组',
+            content='相邻且分组相同的脚本可以同时运行'
+        )
+        self.viewLayout.addWidget(self.parallel_group_opt)
+
+        self.depends_on_opt = TextSettingCard(
+            icon=FluentIcon.LINK,
+            title='依赖的脚本下标',
+            content='从0开始 用逗号分隔 为空时按顺序运行'
+        )
+        self.viewLayout.addWidget(self.depends_on_opt)
+
+        self.ready_process_name_opt = TextSettingCard(
+            icon=FluentIcon.GAME,
+            title='就绪进程名称',
+            content='该进程出现后 认为脚本已启动'
+        )
+        self.viewLayout.addWidget(self.ready_process_name_opt)
+
+        self.ready_max_seconds_opt = TextSettingCard(
+            icon=FluentIcon.HISTORY,
+            title='启动等待(秒)',
+            content='子进程存活这么久后 认为脚本已启动'
+        )
+        self.viewLayout.addWidget(self.ready_max_seconds_opt)
+
+        self.ready_log_file_opt = TextSettingCard(
+            icon=FluentIcon.DOCUMENT,
+            title='就绪日志文件',
+            content='该日志出现匹配下面正则的内容后 认为脚本已启动'
+        )
+        self.ready_log_file_opt.line_edit.setMinimumWidth(200)
+        self.viewLayout.addWidget(self.ready_log_file_opt)
+
+        self.ready_log_regex_opt = TextSettingCard(
+            icon=FluentIcon.SEARCH,
+            title='就绪日志正则',
+        )
+        self.viewLayout.addWidget(self.ready_log_regex_opt)
+
+        self.ready_tcp_port_opt = TextSettingCard(
+            icon=FluentIcon.WIFI,
+            title='就绪端口',
+            content='该本地端口可以连接后 认为脚本已启动 0为不检查'
+        )
+        self.viewLayout.addWidget(self.ready_tcp_port_opt)
+
+        self.ready_timeout_seconds_opt = TextSettingCard(
+            icon=FluentIcon.HISTORY,
+            title='启动超时(秒)',
+            content='超过这个时间仍未启动 认为子进程创建失败'
+        )
+        self.viewLayout.addWidget(self.ready_timeout_seconds_opt)
+
+        self.create_retry_seconds_opt = TextSettingCard(
+            icon=FluentIcon.SYNC,
+            title='重试等待(秒)',
+            content='子进程异常退出后 等待多久重新创建'
+        )
+        self.viewLayout.addWidget(self.create_retry_seconds_opt)
+
+        self.create_retry_backoff_opt = TextSettingCard(
+            icon=FluentIcon.SYNC,
+            title='重试等待倍数',
+            content='每次重新创建后 等待时间乘以该倍数'
+        )
+        self.viewLayout.addWidget(self.create_retry_backoff_opt)
+
+        self.teardown_wait_game_closed_opt = SwitchSettingCard(
+            icon=FluentIcon.POWER_BUTTON,
+            title='等待游戏进程退出',
+            content='结束后 游戏进程退出才开始下一个脚本'
+        )
+        self.viewLayout.addWidget(self.teardown_wait_game_closed_opt)
+
+        self.teardown_cpu_percent_opt = TextSettingCard(
+            icon=FluentIcon.SPEED_HIGH,
+            title='等待CPU占用低于(%)',
+            content='结束后 CPU占用低于该值才开始下一个脚本 0为不检查'
+        )
+        self.viewLayout.addWidget(self.teardown_cpu_percent_opt)
+
+        self.teardown_max_seconds_opt = TextSettingCard(
+            icon=FluentIcon.HISTORY,
+            title='结束等待(秒)',
+            content='最多等待多久开始下一个脚本'
+        )
+        self.viewLayout.addWidget(self.teardown_max_seconds_opt)
+
+        self.max_rss_mb_opt = TextSettingCard(
+            icon=FluentIcon.IOT,
+            title='内存上限(MB)',
+            content='脚本和游戏合计超过后强制关闭 0为不限制'
+        )
+        self.viewLayout.addWidget(self.max_rss_mb_opt)
+
+        self.max_cpu_seconds_opt = TextSettingCard(
+            icon=FluentIcon.SPEED_HIGH,
+            title='CPU时间上限(秒)',
+            content='脚本和游戏合计超过后强制关闭 0为不限制'
+        )
+        self.viewLayout.addWidget(self.max_cpu_seconds_opt)
+
+        self.hang_seconds_opt = TextSettingCard(
+            icon=FluentIcon.STOP_WATCH,
+            title='卡住检测(秒)',
+            content='脚本和游戏这么久没有CPU和读写活动时 认为卡住 0为不检查'
+        )
+        self.viewLayout.addWidget(self.hang_seconds_opt)
+
+        self.hang_notify_opt = SwitchSettingCard(
+            icon=FluentIcon.MESSAGE,
+            title='卡住时通知',
+        )
+        self.viewLayout.addWidget(self.hang_notify_opt)
+
+        self.hang_kill_opt = SwitchSettingCard(
+            icon=FluentIcon.POWER_BUTTON,
+            title='卡住时强制关闭',
+            content='关闭脚本和游戏的进程树 开始下一个脚本'
+        )
+        self.viewLayout.addWidget(self.hang_kill_opt)
+
+        self.script_priority_opt = ComboBoxSettingCard(
+            icon=FluentIcon.SPEED_HIGH,
+            title='脚本进程优先级',
+            content='包括脚本启动的子进程',
+            options_enum=ProcessPriority,
+        )
+        self.viewLayout.addWidget(self.script_priority_opt)
+
+        self.script_affinity_opt = TextSettingCard(
+            icon=FluentIcon.SPEED_HIGH,
+            title='脚本进程CPU',
+            content='可以使用的CPU 例如 0-3,6 为空时不限制'
+        )
+        self.viewLayout.addWidget(self.script_affinity_opt)
+
+        self.game_priority_opt = ComboBoxSettingCard(
+            icon=FluentIcon.GAME,
+            title='游戏进程优先级',
+            content='包括游戏启动的子进程',
+            options_enum=ProcessPriority,
+        )
+        self.viewLayout.addWidget(self.game_priority_opt)
+
+        self.game_affinity_opt = TextSettingCard(
+            icon=FluentIcon.GAME,
+            title='游戏进程CPU',
+            content='可以使用的CPU 例如 4-7 为空时不限制'
+        )
+        self.viewLayout.addWidget(self.game_affinity_opt)
+
+        self.capture_output_opt = SwitchSettingCard(
+            icon=FluentIcon.DOCUMENT,
+            title='捕获脚本输出',
+            content='脚本的输出写入 .log/script_output 失败时通知最后几行'
+        )
+        self.viewLayout.addWidget(self.capture_output_opt)
+
+        self.output_max_mb_opt = TextSettingCard(
+            icon=FluentIcon.DOCUMENT,
+            title='输出日志大小(MB)',
+            content='单个文件超过后轮转'
+        )
+        self.viewLayout.addWidget(self.output_max_mb_opt)
+
+        self.output_backup_count_opt = TextSettingCard(
+            icon=FluentIcon.HISTORY,
+            title='输出日志保留数量',
+            content='轮转后保留的旧文件数量'
+        )
+        self.viewLayout.addWidget(self.output_backup_count_opt)
+
         self.error_label = CaptionLabel(text="输入不正确")
         self.error_label.setTextColor("#cf1010", QColor(255, 28, 32))
         self.error_label.hide()
@@ -120,6 +313,33 @@ class ScriptEditDialog(MessageBoxBase):
             script_arguments=config.script_arguments,
             notify_start=config.notify_start,
             notify_done=config.notify_done,
+            depends_on=config.depends_on,
+            parallel_group=config.parallel_group,
+            ready_process_name=config.ready_process_name,
+            ready_max_seconds=config.ready_max_seconds,
+            ready_log_file=config.ready_log_file,
+            ready_log_regex=config.ready_log_regex,
+            ready_tcp_port=config.ready_tcp_port,
+            ready_timeout_seconds=config.ready_timeout_seconds,
+            create_retry_seconds=config.create_retry_seconds,
+            create_retry_backoff=config.create_retry_backoff,
+            teardown_wait_game_closed=config.teardown_wait_game_closed,
+            teardown_cpu_percent=config.teardown_cpu_percent,
+            teardown_max_seconds=config.teardown_max_seconds,
+            max_rss_mb=config.max_rss_mb,
+            max_cpu_seconds=config.max_cpu_seconds,
+            hang_seconds=config.hang_seconds,
+            hang_notify=config.hang_notify,
+            hang_kill=config.hang_kill,
+            script_priority=config.script_priority,
+            script_affinity=config.script_affinity,
+            game_priority=config.game_priority,
+            game_affinity=config.game_affinity,
+            done_log_file=config.done_log_file,
+            done_log_regex=config.done_log_regex,
+            capture_output=config.capture_output,
+            output_max_mb=config.output_max_mb,
+            output_backup_count=config.output_backup_count,
         )
         self.config.idx = config.idx
 
@@ -133,6 +353,33 @@ class ScriptEditDialog(MessageBoxBase):
         self.script_arguments_opt.setValue(config.script_arguments, emit_signal=False)
         self.notify_start_opt.setValue(config.notify_start, emit_signal=False)
         self.notify_done_opt.setValue(config.notify_done, emit_signal=False)
+        self.parallel_group_opt.setValue(config.parallel_group, emit_signal=False)
+        self.depends_on_opt.setValue(depends_on_to_str(config.depends_on), emit_signal=False)
+        self.ready_process_name_opt.setValue(config.ready_process_name, emit_signal=False)
+        self.ready_max_seconds_opt.setValue(f'{config.ready_max_seconds:g}', emit_signal=False)
+        self.ready_log_file_opt.setValue(config.ready_log_file, emit_signal=False)
+        self.ready_log_regex_opt.setValue(config.ready_log_regex, emit_signal=False)
+        self.ready_tcp_port_opt.setValue(str(config.ready_tcp_port), emit_signal=False)
+        self.ready_timeout_seconds_opt.setValue(f'{config.ready_timeout_seconds:g}', emit_signal=False)
+        self.create_retry_seconds_opt.setValue(f'{config.create_retry_seconds:g}', emit_signal=False)
+        self.create_retry_backoff_opt.setValue(f'{config.create_retry_backoff:g}', emit_signal=False)
+        self.teardown_wait_game_closed_opt.setValue(config.teardown_wait_game_closed, emit_signal=False)
+        self.teardown_cpu_percent_opt.setValue(f'{config.teardown_cpu_percent:g}', emit_signal=False)
+        self.teardown_max_seconds_opt.setValue(f'{config.teardown_max_seconds:g}', emit_signal=False)
+        self.max_rss_mb_opt.setValue(f'{config.max_rss_mb:g}', emit_signal=False)
+        self.max_cpu_seconds_opt.setValue(f'{config.max_cpu_seconds:g}', emit_signal=False)
+        self.hang_seconds_opt.setValue(f'{config.hang_seconds:g}', emit_signal=False)
+        self.hang_notify_opt.setValue(config.hang_notify, emit_signal=False)
+        self.hang_kill_opt.setValue(config.hang_kill, emit_signal=False)
+        self.script_priority_opt.setValue(config.script_priority, emit_signal=False)
+        self.script_affinity_opt.setValue(config.script_affinity, emit_signal=False)
+        self.game_priority_opt.setValue(config.game_priority, emit_signal=False)
+        self.game_affinity_opt.setValue(config.game_affinity, emit_signal=False)
+        self.done_log_file_opt.setValue(config.done_log_file, emit_signal=False)
+        self.done_log_regex_opt.setValue(config.done_log_regex, emit_signal=False)
+        self.capture_output_opt.setValue(config.capture_output, emit_signal=False)
+        self.output_max_mb_opt.setValue(f'{config.output_max_mb:g}', emit_signal=False)
+        self.output_backup_count_opt.setValue(str(config.output_backup_count), emit_signal=False)
 
     def on_script_path_clicked(self) -> None:
         file_path, _ = QFileDialog.getOpenFileName(self, gt('选择你的脚本'))
@@ -155,6 +402,33 @@ class ScriptEditDialog(MessageBoxBase):
             script_arguments=self.script_arguments_opt.get_value(),
             notify_start=self.notify_start_opt.get_value(),
             notify_done=self.notify_done_opt.get_value(),
+            depends_on=str_to_depends_on(self.depends_on_opt.get_value()),
+            parallel_group=self.parallel_group_opt.get_value().strip(),
+            ready_process_name=self.ready_process_name_opt.get_value().strip(),
+            ready_max_seconds=float(self.ready_max_seconds_opt.get_value()),
+            ready_log_file=self.ready_log_file_opt.get_value().strip(),
+            ready_log_regex=self.ready_log_regex_opt.get_value(),
+            ready_tcp_port=int(self.ready_tcp_port_opt.get_value()),
+            ready_timeout_seconds=float(self.ready_timeout_seconds_opt.get_value()),
+            create_retry_seconds=float(self.create_retry_seconds_opt.get_value()),
+            create_retry_backoff=float(self.create_retry_backoff_opt.get_value()),
+            teardown_wait_game_closed=self.teardown_wait_game_closed_opt.get_value(),
+            teardown_cpu_percent=float(self.teardown_cpu_percent_opt.get_value()),
+            teardown_max_seconds=float(self.teardown_max_seconds_opt.get_value()),
+            max_rss_mb=float(self.max_rss_mb_opt.get_value()),
+            max_cpu_seconds=float(self.max_cpu_seconds_opt.get_value()),
+            hang_seconds=float(self.hang_seconds_opt.get_value()),
+            hang_notify=self.hang_notify_opt.get_value(),
+            hang_kill=self.hang_kill_opt.get_value(),
+            script_priority=self.script_priority_opt.getValue(),
+            script_affinity=self.script_affinity_opt.get_value().strip(),
+            game_priority=self.game_priority_opt.getValue(),
+            game_affinity=self.game_affinity_opt.get_value().strip(),
+            done_log_file=self.done_log_file_opt.get_value().strip(),
+            done_log_regex=self.done_log_regex_opt.get_value(),
+            capture_output=self.capture_output_opt.get_value(),
+            output_max_mb=float(self.output_max_mb_opt.get_value()),
+            output_backup_count=int(self.output_backup_count_opt.get_value()),
         )
         config.idx = self.config.idx
 
@@ -162,8 +436,14 @@ class ScriptEditDialog(MessageBoxBase):
 
     def validate(self) -> bool:
         """ 重写验证表单数据的方法 """
-        config = self.get_config_value()
-        invalid_message = config.invalid_message
+        try:
+            config = self.get_config_value()
+        except ValueError:
+            self.error_label.setText('数字格式不正确')
+            self.error_label.show()
+            return False
+        # 与执行器使用相同的校验 包括脚本参数的引号
+        invalid_message = ScriptPlan(config).invalid_message
         if invalid_message is not None:
             self.error_label.setText(invalid_message)
             self.error_label.show()
@@ -179,7 +459,7 @@ class ScriptSettingCard(MultiPushSettingCard):
     move_up = Signal(int)
     deleted = Signal(int)
 
-    def __init__(self, config: ScriptConfig, parent=None):
+    def __init__(self, config: ScriptConfig, plan: ScriptPlan, parent=None):
         self.edit_btn: PushButton = PushButton(text='编辑')
         self.edit_btn.clicked.connect(self.on_edit_clicked)
 
@@ -202,7 +482,7 @@ class ScriptSettingCard(MultiPushSettingCard):
             ]
         )
         self.config: ScriptConfig = config
-        self.init_by_config(config)
+        self.init_by_config(config, plan)
 
     def on_edit_clicked(self) -> None:
         """
@@ -212,19 +492,19 @@ class ScriptSettingCard(MultiPushSettingCard):
         dialog = ScriptEditDialog(config=self.edit_btn.property('config'),
                                   parent=self.window())
         if dialog.exec() == QDialog.DialogCode.Accepted:
-            config = dialog.get_config_value()
-            self.init_by_config(config)
-            self.value_changed.emit(config)
+            # 保存后由脚本链重新编译 再更新全部卡片的显示
+            self.value_changed.emit(dialog.get_config_value())
 
-    def init_by_config(self, config: ScriptConfig) -> None:
+    def init_by_config(self, config: ScriptConfig, plan: ScriptPlan) -> None:
         """
         根据配置初始化
-        :param config:
+        :param config: 脚本配置
+        :param plan: 脚本链编译后该脚本的运行计划 显示名称直接从中读取
         :return:
         """
         self.config = config
-        self.setTitle(f'游戏 {self.config.game_display_name}')
-        self.setContent(f'脚本 {self.config.script_display_name}')
+        self.setTitle(f'游戏 {plan.game_display_name}')
+        self.setContent(f'脚本 {plan.script_display_name}')
 
         self.edit_btn.setProperty('config', config)
         self.move_up_btn.setProperty('idx', config.idx)
@@ -305,6 +585,11 @@ class ScriptSettingInterface(VerticalScrollInterface):
         self.chain_combo_box.setCurrentIndex(0)
         self.update_chain_display()
 
+    def on_interface_hidden(self) -> None:
+        VerticalScrollInterface.on_interface_hidden(self)
+        if self.chosen_config is not None:
+            self.chosen_config.flush()
+
     def update_chain_combo_box(self) -> None:
         """
         更新脚本链选项
@@ -312,8 +597,8 @@ class ScriptSettingInterface(VerticalScrollInterface):
         """
         self.chain_combo_box.set_items(
             [
-                ConfigItem(i.module_name)
-                for i in self.ctx.get_all_script_chain_config()
+                ConfigItem(i.module_name if i.valid else f'{i.module_name} (配置错误)', value=i.module_name)
+                for i in self.ctx.get_script_chain_index_list()
             ],
             target_value=None if self.chosen_config is None else self.chosen_config.module_name
         )
@@ -325,7 +610,11 @@ class ScriptSettingInterface(VerticalScrollInterface):
         :return:
         """
         module_name = self.chain_combo_box.currentData()
+        if self.chosen_config is not None:
+            self.chosen_config.flush()
         self.chosen_config = ScriptChainConfig(module_name)
+        # 连续编辑时合并写入 写入使用临时文件替换 不会损坏配置
+        self.chosen_config.write_behind_seconds = 1
         self.update_chain_display()
 
     def on_add_chain_clicked(self) -> None:
@@ -365,6 +654,7 @@ class ScriptSettingInterface(VerticalScrollInterface):
             try:
                 new_config = self.ctx.rename_script_chain_config(self.chosen_config, new_name)
                 self.chosen_config = new_config
+                self.chosen_config.write_behind_seconds = 1
                 self.update_chain_combo_box()
                 self.chain_combo_box.init_with_value(new_name)
             except ValueError as e:
@@ -379,8 +669,8 @@ class ScriptSettingInterface(VerticalScrollInterface):
         """
         if self.chosen_config is None:
             return
-        self.chosen_config.add_one()
-        self.update_chain_display()
+        with self._edit_chosen_chain() as chain_config:
+            chain_config.add_one()
 
     def update_chain_display(self) -> None:
         """
@@ -403,13 +693,17 @@ class ScriptSettingInterface(VerticalScrollInterface):
             self.script_group.cardLayout.removeWidget(last_card)
             self.script_group.adjustSize()
 
+        # 整个脚本链只编译一次 每个卡片使用对应的运行计划
+        chain_plan = self.chosen_config.compile()
+
         # 初始化已有的显示 group中数量不足则新增
         for i in range(len(self.chosen_config.script_list)):
             if i < len(self.script_card_list):
                 card: ScriptSettingCard = self.script_card_list[i]
-                card.init_by_config(self.chosen_config.script_list[i])
+                card.init_by_config(self.chosen_config.script_list[i], chain_plan.scripts[i])
             else:
-                card: ScriptSettingCard = ScriptSettingCard(self.chosen_config.script_list[i], parent=self.script_group)
+                card: ScriptSettingCard = ScriptSettingCard(self.chosen_config.script_list[i], chain_plan.scripts[i],
+                                                            parent=self.script_group)
                 card.setVisible(True)
                 self.script_card_list.append(card)
                 self.script_group.addSettingCard(card)
@@ -424,7 +718,8 @@ class ScriptSettingInterface(VerticalScrollInterface):
         if self.chosen_config is None:
             return
 
-        self.chosen_config.update_config(config)
+        with self._edit_chosen_chain() as chain_config:
+            chain_config.update_config(config)
 
     def script_config_move_up(self, idx: int) -> None:
         """
@@ -433,8 +728,8 @@ class ScriptSettingInterface(VerticalScrollInterface):
         if self.chosen_config is None:
             return
 
-        self.chosen_config.move_up(idx)
-        self.update_chain_display()
+        with self._edit_chosen_chain() as chain_config:
+            chain_config.move_up(idx)
 
     def script_config_deleted(self, idx: int) -> None:
         """
@@ -443,8 +738,20 @@ class ScriptSettingInterface(VerticalScrollInterface):
         if self.chosen_config is None:
             return
 
-        self.chosen_config.delete_one(idx)
-        self.update_chain_display()
+        with self._edit_chosen_chain() as chain_config:
+            chain_config.delete_one(idx)
+
+    @contextmanager
+    def _edit_chosen_chain(self) -> Iterator[ScriptChainConfig]:
+        """
+        在一个事务中修改当前脚本链 多步修改只写入一次
+        出现异常时恢复到修改前的内容 结束后都会刷新显示 保证卡片与配置一致
+        """
+        try:
+            with self.chosen_config.transaction():
+                yield self.chosen_config
+        finally:
+            self.update_chain_display()
 
 
 class ChainRenameDialog(MessageBoxBase):
@@ -0,0 +1,139 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from typing import Optional
+
+# 代理和协调器共用的密钥 命令行没有传入时从该环境变量读取
+AGENT_TOKEN_ENV: str = 'SCRIPT_CHAINER_AGENT_TOKEN'
+
+# 本机控制接口的密钥 命令行没有传入时从该环境变量读取
+CONTROL_TOKEN_ENV: str = 'SCRIPT_CHAINER_CONTROL_TOKEN'
+
+TIMESTAMP_HEADER: str = 'X-Chainer-Timestamp'
+SIGNATURE_HEADER: str = 'X-Chainer-Signature'
+# 每个请求随机生成 时间范围内重复出现的请求会被拒绝
+NONCE_HEADER: str = 'X-Chainer-Nonce'
+# 控制接口的修改请求需要带上该请求头 浏览器跨站请求不能直接附带自定义请求头
+CONTROL_TOKEN_HEADER: str = 'X-Chainer-Token'
+
+# 请求时间与本机时间相差超过该秒数时拒绝 避免截获的请求被重放
+MAX_CLOCK_SKEW_SECONDS: float = 60
+
+
+class NonceCache:
+
+    def __init__(self, max_size: int = 10000):
+        """
+        最近收到的请求随机数 时间检查只能拒绝过期的请求 时间范围内的重放需要按随机数拒绝
+        随机数在请求时间超出允许范围后过期 过期之后请求会因为时间被拒绝 不需要继续保存
+        :param max_size: 最多保存的数量 达到后拒绝新的请求 避免占用过多内存
+        """
+        self.max_size: int = max_size
+        self._lock = threading.Lock()  # 请求在多个线程中处理
+        self._expire_times: dict[str, float] = {}  # 随机数 -> 过期时间
+        self._next_prune_time: float = 0  # 下一次清理过期随机数的时间
+
+    def add(self, nonce: str, request_time: float) -> Optional[str]:
+        """
+        记录一个随机数
+        :param nonce: 请求的随机数
+        :param request_time: 请求时间
+        :return: 不能记录的原因 随机数已经出现过时拒绝 通过时返回None
+        """
+        now = time.time()
+        with self._lock:
+            if now >= self._next_prune_time:
+                self._expire_times = {k: v for k, v in self._expire_times.items() if v > now}
+                self._next_prune_time = now + 1
+            expire_time = self._expire_times.get(nonce)
+            if expire_time is not None and expire_time > now:
+                return '请求重复'
+            if len(self._expire_times) >= self.max_size:
+                return '最近的请求过多'
+            self._expire_times[nonce] = max(now, request_time) + MAX_CLOCK_SKEW_SECONDS
+            return None
+
+
+def get_agent_token(token: Optional[str], env_name: str = AGENT_TOKEN_ENV) -> Optional[str]:
+    """
+    获取密钥 优先使用命令行参数 其次使用环境变量
+    :param token: 命令行传入的密钥
+    :param env_name: 环境变量名称
+    :return: 都没有时返回None
+    """
+    if token:
+        return token
+    token = os.environ.get(env_name)
+    return token if token else None
+
+
+def sign_request(token: str, method: str, path: str, timestamp: str, nonce: str, body: bytes) -> str:
+    """
+    计算请求的签名 HMAC-SHA256(密钥, 方法 路径 时间 随机数 请求体)
+    密钥本身不在网络中传输
+    :param token: 共用的密钥
+    :param method: 请求方法 GET / POST
+    :param path: 请求路径 包括查询参数
+    :param timestamp: 请求时间 秒
+    :param nonce: 请求的随机数
+    :param body: 请求体
+    :return: 十六进制的签名
+    """
+    message = f'{method}\n{path}\n{timestamp}\n{nonce}\n'.encode('utf-8') + body
+    return hmac.new(token.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+def get_auth_headers(token: str, method: str, path: str, body: bytes) -> dict[str, str]:
+    """
+    发送请求时需要附带的认证请求头
+    """
+    timestamp = f'{time.time():.3f}'
+    nonce = secrets.token_hex(16)
+    return {
+        TIMESTAMP_HEADER: timestamp,
+        NONCE_HEADER: nonce,
+        SIGNATURE_HEADER: sign_request(token, method, path, timestamp, nonce, body),
+    }
+
+
+def verify_control_token(token: Optional[str], header_value: Optional[str]) -> Optional[str]:
+    """
+    校验控制接口的修改请求
+    必须带上 CONTROL_TOKEN_HEADER 请求头 网页不能在用户不知情时跨站发出这样的请求
+    配置了密钥时 请求头的值需要与密钥一致
+    :param token: 控制接口的密钥 为None时只检查请求头存在
+    :param header_value: 请求头的值
+    :return: 校验失败的原因 通过时返回None
+    """
+    if not header_value:
+        return f'缺少请求头 {CONTROL_TOKEN_HEADER}'
+    if token is not None and not hmac.compare_digest(token.encode('utf-8'), header_value.encode('utf-8')):
+        return '密钥错误'
+    return None
+
+
+def verify_request(token: str, method: str, path: str,
+                   timestamp: Optional[str], nonce: Optional[str], signature: Optional[str], body: bytes,
+                   nonce_cache: Optional[NonceCache] = None) -> Optional[str]:
+    """
+    校验收到的请求
+    :param nonce_cache: 最近收到的随机数 签名正确后才记录 为None时不检查重放
+    :return: 校验失败的原因 通过时返回None
+    """
+    if not timestamp or not nonce or not signature:
+        return '缺少认证信息'
+    try:
+        request_time = float(timestamp)
+    except ValueError:
+        return '请求时间非法'
+    if abs(time.time() - request_time) > MAX_CLOCK_SKEW_SECONDS:
+        return '请求时间与本机相差过大'
+    expected = sign_request(token, method, path, timestamp, nonce, body)
+    if not hmac.compare_digest(expected, signature):
+        return '签名错误'
+    if nonce_cache is not None:
+        return nonce_cache.add(nonce, request_time)
+    return None
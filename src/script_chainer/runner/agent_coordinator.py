@@ -0,0 +1,383 @@
+import json
+import queue
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import deque
+from typing import Callable, Optional
+
+from one_dragon.utils.log_utils import log
+from script_chainer.runner.agent_auth import get_auth_headers
+
+
+class AgentClient:
+
+    def __init__(self, url: str, token: str, timeout: float = 10):
+        """
+        访问一个代理的接口 每个请求都附带签名
+        :param url: 代理的地址 例如 http://192.168.1.2:8601
+        :param token: 与代理共用的密钥
+        :param timeout: 请求的超时时间 长轮询时会加上等待时间
+        """
+        self.url: str = url.rstrip('/')
+        self.token: str = token
+        self.timeout: float = timeout
+        self.name: str = urllib.parse.urlsplit(self.url).netloc or self.url
+
+    def request(self, method: str, path: str, data: Optional[dict] = None,
+                timeout: Optional[float] = None) -> tuple[int, dict]:
+        """
+        发送请求
+        :param method: 请求方法
+        :param path: 请求路径 包括查询参数
+        :param data: 请求体 为None时不发送
+        :param timeout: 超时时间 为None时使用默认值
+        :return: HTTP状态码, 响应内容
+        :raises OSError: 连接失败
+        :raises PermissionError: 密钥错误 代理拒绝请求
+        """
+        body = b'' if data is None else json.dumps(data, ensure_ascii=False).encode('utf-8')
+        headers = get_auth_headers(self.token, method, path, body)
+        if data is not None:
+            headers['Content-Type'] = 'application/json; charset=utf-8'
+        req = urllib.request.Request(self.url + path, data=body if data is not None else None,
+                                     headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout if timeout is None else timeout) as response:
+                return response.status, json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:  # 非2xx 仍然读取返回的错误信息
+            try:
+                error_data = json.loads(e.read().decode('utf-8'))
+            except ValueError:
+                error_data = {'error': str(e)}
+            if e.code == 401:
+                raise PermissionError(f'代理拒绝请求 {self.name} {error_data.get("error")}')
+            return e.code, error_data
+
+    def get_status(self) -> dict:
+        code, data = self.request('GET', '/status')
+        if code != 200:
+            raise OSError(f'读取代理状态失败 {self.name} {code} {data.get("error")}')
+        return data
+
+    def start_run(self, chain_name: str, resume: bool = False) -> tuple[int, dict]:
+        return self.request('POST', '/run', {'chain': chain_name, 'resume': resume})
+
+    def get_events(self, since: int, wait_seconds: float) -> dict:
+        code, data = self.request('GET', f'/events?since={since}&wait={wait_seconds:g}',
+                                  timeout=self.timeout + wait_seconds)
+        if code != 200:
+            raise OSError(f'读取代理事件失败 {self.name} {code} {data.get("error")}')
+        return data
+
+
+class AgentState:
+
+    def __init__(self, client: AgentClient):
+        """
+        协调器记录的一个代理的负载
+        """
+        self.client: AgentClient = client
+        self.capacity: int = 0  # 最多同时运行的脚本链数量 0为还没有读取到
+        self.running: int = 0  # 正在运行的脚本链数量 包括其它协调器分配的
+        self.cpu_percent: float = 0
+        self.reachable: bool = False
+        self.auth_failed: bool = False  # 密钥错误 不再使用该代理
+        self.last_ok_time: float = time.time()  # 最后一次请求成功的时间
+
+    def update(self, status: dict) -> None:
+        agent = status.get('agent', {})
+        self.capacity = int(agent.get('capacity', 1))
+        self.running = len(agent.get('running', []))
+        self.cpu_percent = float(agent.get('cpu_percent') or 0)  # 代理刚启动时为null
+        self.reachable = True
+        self.last_ok_time = time.time()
+
+    @property
+    def free_slots(self) -> int:
+        return self.capacity - self.running if self.reachable and not self.auth_failed else 0
+
+    def is_lost(self, lost_seconds: float) -> bool:
+        """
+        是否已经不能使用
+        :param lost_seconds: 超过该秒数无法访问时认为不能使用
+        """
+        return self.auth_failed or time.time() - self.last_ok_time > lost_seconds
+
+    @property
+    def load_key(self) -> tuple[float, float]:
+        """
+        负载 越小越优先分配 先比较运行中的比例 再比较CPU占用
+        """
+        return self.running / max(1, self.capacity), self.cpu_percent
+
+
+class CoordinatedRun:
+
+    def __init__(self, chain_name: str):
+        """
+        协调器分配的一个脚本链的运行结果
+        """
+        self.chain_name: str = chain_name
+        self.agent_name: Optional[str] = None
+        self.run_id: Optional[str] = None
+        self.done: dict[str, str] = {}  # 脚本下标 -> 结果
+        self.aborted: bool = False
+        self.error: Optional[str] = None  # 没有正常运行完成的原因
+        self.finished: bool = False
+
+    @property
+    def message(self) -> str:
+        if self.error is not None:
+            return f'脚本链 {self.chain_name} 运行失败 {self.error}'
+        counts: dict[str, int] = {}
+        for result in self.done.values():
+            counts[result] = counts.get(result, 0) + 1
+        summary = ' '.join(f'{k}={v}' for k, v in sorted(counts.items()))
+        status = '已中止' if self.aborted else '已完成'
+        return f'脚本链 {self.chain_name} {status} 代理 {self.agent_name} {summary}'
+
+
+class AgentEventStream:
+
+    def __init__(self, state: AgentState, event_queue: queue.Queue, since: int, wait_seconds: float = 10):
+        """
+        在后台线程中长轮询一个代理的事件 放入协调器的队列
+        :param state: 代理
+        :param event_queue: 协调器的事件队列 放入 (代理, 事件)
+        :param since: 从编号大于该值的事件开始读取
+        :param wait_seconds: 长轮询的等待时间
+        """
+        self.state: AgentState = state
+        self.event_queue: queue.Queue = event_queue
+        self.since: int = since
+        self.wait_seconds: float = wait_seconds
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name=f'agent_events_{self.state.client.name}', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def _run(self) -> None:
+        client = self.state.client
+        retry_seconds: float = 1
+        while not self._stop_event.is_set():
+            try:
+                data = client.get_events(self.since, self.wait_seconds)
+            except PermissionError as e:  # 密钥错误时重试没有意义
+                self.state.auth_failed = True
+                self.event_queue.put((self.state, {'type': 'auth_failed', 'error': str(e)}))
+                return
+            except Exception as e:
+                log.error(f'读取代理事件失败 {client.name} {e}')
+                self._stop_event.wait(retry_seconds)
+                retry_seconds = min(retry_seconds * 2, 30)
+                continue
+            retry_seconds = 1
+            self.state.last_ok_time = time.time()
+            if data.get('lost') and self.since > 0:  # 从头读取时 之前的事件本来就不需要
+                self.event_queue.put((self.state, {'type': 'events_lost'}))
+            for event in data.get('events', []):
+                self.event_queue.put((self.state, event))
+            self.since = data.get('next', self.since)
+
+
+class ChainCoordinator:
+
+    def __init__(self,
+                 clients: list[AgentClient],
+                 message_callback: Callable[[str, str], None],
+                 resume: bool = False,
+                 status_interval: float = 5,
+                 lost_seconds: float = 120,
+                 ):
+        """
+        把脚本链分配到多个代理上运行 每次分配给负载最低且有空位的代理
+        运行中持续接收每个脚本的结果 全部脚本链结束后返回
+        :param clients: 代理列表
+        :param message_callback: 输出信息的回调 参数为 信息, 日志级别
+        :param resume: 代理是否断点续跑
+        :param status_interval: 有等待分配的脚本链但没有空位时 重新读取代理负载并尝试分配的间隔
+        :param lost_seconds: 代理超过该秒数无法访问时 它正在运行的脚本链记为失败
+        """
+        self.agents: list[AgentState] = [AgentState(i) for i in clients]
+        self.message_callback: Callable[[str, str], None] = message_callback
+        self.resume: bool = resume
+        self.status_interval: float = status_interval
+        self.lost_seconds: float = lost_seconds
+
+        self._event_queue: queue.Queue = queue.Queue()
+
+    def refresh_status(self) -> None:
+        """
+        读取全部代理的负载
+        """
+        for agent in self.agents:
+            if agent.auth_failed:
+                continue
+            try:
+                agent.update(agent.client.get_status())
+            except PermissionError as e:
+                self.message_callback(str(e), 'ERROR')
+                agent.auth_failed = True
+            except Exception as e:
+                if agent.reachable:
+                    self.message_callback(f'代理无法访问 {agent.client.name} {e}', 'ERROR')
+                agent.reachable = False
+
+    def run(self, chain_names: list[str]) -> list[CoordinatedRun]:
+        """
+        运行脚本链 直到全部结束
+        :param chain_names: 脚本链名称
+        :return: 每个脚本链的结果 顺序与传入的相同
+        """
+        runs = [CoordinatedRun(i) for i in chain_names]
+        pending: deque[CoordinatedRun] = deque(runs)
+        running: dict[tuple[str, str], CoordinatedRun] = {}  # (代理地址, run_id) -> 运行结果
+        missing: dict[str, set[str]] = {}  # 脚本链名称 -> 没有该配置的代理
+
+        streams: list[AgentEventStream] = []
+        for agent in self.agents:
+            if agent.auth_failed:
+                continue
+            try:  # 先定位到当前位置 之后分配的脚本链的事件都不会错过
+                since = agent.client.get_events(0, 0)['next']
+            except PermissionError as e:
+                self.message_callback(str(e), 'ERROR')
+                agent.auth_failed = True
+                continue
+            except Exception:
+                since = 0  # 从头读取 按 run_id 过滤之前的事件
+            stream = AgentEventStream(agent, self._event_queue, since)
+            stream.start()
+            streams.append(stream)
+
+        try:
+            next_dispatch_time: float = 0
+            while len(pending) > 0 or len(running) > 0:
+                if len(pending) > 0 and time.time() >= next_dispatch_time:
+                    self.refresh_status()
+                    self._dispatch(pending, running, missing)
+                    next_dispatch_time = time.time() + self.status_interval
+
+                try:
+                    agent, event = self._event_queue.get(timeout=1)
+                except queue.Empty:
+                    self._check_lost(running)
+                    continue
+                if self._handle_event(agent, event, running):  # 有空位了 立刻分配下一个
+                    next_dispatch_time = 0
+        finally:
+            for stream in streams:
+                stream.stop()
+        return runs
+
+    def _dispatch(self, pending: deque[CoordinatedRun], running: dict[tuple[str, str], CoordinatedRun],
+                  missing: dict[str, set[str]]) -> None:
+        """
+        把等待中的脚本链分配给负载最低的代理 没有空位时保留到下一次
+        """
+        for _ in range(len(pending)):
+            run = pending.popleft()
+            candidates = sorted(
+                [i for i in self.agents
+                 if i.free_slots > 0 and i.client.url not in missing.get(run.chain_name, set())],
+                key=lambda i: i.load_key
+            )
+            started = False
+            for agent in candidates:
+                try:
+                    code, data = agent.client.start_run(run.chain_name, self.resume)
+                except PermissionError as e:
+                    self.message_callback(str(e), 'ERROR')
+                    agent.auth_failed = True
+                    continue
+                except Exception as e:
+                    self.message_callback(f'代理无法访问 {agent.client.name} {e}', 'ERROR')
+                    agent.reachable = False
+                    continue
+                if code == 200:
+                    agent.running += 1
+                    run.agent_name = agent.client.name
+                    run.run_id = data['run_id']
+                    running[(agent.client.url, run.run_id)] = run
+                    self.message_callback(f'脚本链 {run.chain_name} 分配到代理 {agent.client.name}', 'INFO')
+                    started = True
+                    break
+                elif code == 404:  # 该代理没有这个脚本链
+                    missing.setdefault(run.chain_name, set()).add(agent.client.url)
+                elif code == 503:  # 其它协调器刚分配了脚本链
+                    agent.running = agent.capacity
+                elif code == 409 and 'game' in data:  # 该代理上同一个游戏正在运行 尝试其它代理 都不行时之后重试
+                    continue
+                else:  # 409 正在运行 或其它错误 之后重试
+                    self.message_callback(f'代理 {agent.client.name} 拒绝运行 {run.chain_name} {data.get("error")}', 'ERROR')
+                    break
+
+            if started:
+                continue
+            if len(missing.get(run.chain_name, set())) >= len(self.agents):
+                run.error = '全部代理都没有该脚本链配置'
+                run.finished = True
+                self.message_callback(run.message, 'ERROR')
+            elif all(i.auth_failed or (not i.reachable and i.is_lost(self.lost_seconds)) for i in self.agents):
+                run.error = '没有可以访问的代理'
+                run.finished = True
+                self.message_callback(run.message, 'ERROR')
+            else:
+                pending.append(run)
+
+    def _handle_event(self, agent: AgentState, event: dict,
+                      running: dict[tuple[str, str], CoordinatedRun]) -> bool:
+        """
+        处理代理的事件
+        :return: 是否有脚本链结束
+        """
+        if event['type'] == 'events_lost':
+            self.message_callback(f'代理 {agent.client.name} 的部分事件已被丢弃 结果可能不完整', 'ERROR')
+            return False
+        if event['type'] == 'auth_failed':
+            self.message_callback(event['error'], 'ERROR')
+            self._check_lost(running)
+            return False
+        run = running.get((agent.client.url, event.get('run_id')))
+        if run is None:  # 其它协调器分配的脚本链
+            return False
+        event_type = event['type']
+        if event_type == 'script_started':
+            self.message_callback(f'[{agent.client.name}] {run.chain_name} 开始运行 {event["script"]}', 'INFO')
+        elif event_type == 'script_done':
+            run.done[str(event['idx'])] = event['result']
+            level = 'PASS' if event['result'] == 'success' else 'ERROR'
+            self.message_callback(f'[{agent.client.name}] {run.chain_name} {event["script"]} '
+                                  f'{event["result"]} 用时 {event["seconds"]:.0f}秒', level)
+        elif event_type == 'run_done':
+            del running[(agent.client.url, run.run_id)]
+            agent.running = max(0, agent.running - 1)
+            run.done = event.get('done') or run.done
+            run.aborted = bool(event.get('aborted'))
+            run.error = event.get('error')
+            run.finished = True
+            self.message_callback(run.message, 'ERROR' if run.error is not None or run.aborted else 'PASS')
+            return True
+        return False
+
+    def _check_lost(self, running: dict[tuple[str, str], CoordinatedRun]) -> None:
+        """
+        代理长时间无法访问时 它正在运行的脚本链记为失败 不重新分配 避免同一个游戏被运行两次
+        """
+        for agent in self.agents:
+            if not agent.is_lost(self.lost_seconds):
+                continue
+            for key in [k for k in running.keys() if k[0] == agent.client.url]:
+                run = running.pop(key)
+                run.error = f'代理 {agent.client.name} 密钥错误' if agent.auth_failed \
+                    else f'代理 {agent.client.name} 超过{self.lost_seconds:g}秒无法访问'
+                run.finished = True
+                self.message_callback(run.message, 'ERROR')
@@ -0,0 +1,263 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Optional
+
+import psutil
+
+from one_dragon.utils.log_utils import log
+from script_chainer.config.script_config import ScriptChainConfig
+from script_chainer.runner.agent_auth import verify_request, NonceCache, TIMESTAMP_HEADER, NONCE_HEADER, \
+    SIGNATURE_HEADER
+from script_chainer.runner.chain_daemon import get_chain_games
+from script_chainer.runner.control_server import ControlRequestHandler, ControlServer
+from script_chainer.runner.cpu_sampler import SystemCpuSampler
+from script_chainer.runner.run_control import RunController
+
+# 长轮询最多等待的秒数
+MAX_EVENT_WAIT_SECONDS: float = 30
+
+
+class AgentEventLog:
+
+    def __init__(self, max_events: int = 1000):
+        """
+        代理上发生的事件 按顺序编号 协调器按编号增量读取
+        只保留最近的事件 读取太慢的协调器会丢失事件
+        :param max_events: 最多保留的事件数量
+        """
+        self._condition = threading.Condition()
+        self._events: deque[dict] = deque(maxlen=max_events)
+        self._next_seq: int = 1  # 下一个事件的编号
+
+    def add(self, event: dict) -> None:
+        with self._condition:
+            self._events.append({**event, 'seq': self._next_seq, 'time': time.time()})
+            self._next_seq += 1
+            self._condition.notify_all()
+
+    def get_events(self, since: int, wait_seconds: float = 0) -> dict:
+        """
+        读取编号大于 since 的事件 没有新事件时最多等待 wait_seconds 秒
+        :param since: 上一次读到的最后一个编号 第一次读取时传0
+        :param wait_seconds: 没有新事件时的等待时间
+        :return: events=事件列表 next=下一次传入的编号 lost=是否有事件已经被丢弃
+        """
+        deadline = time.time() + min(wait_seconds, MAX_EVENT_WAIT_SECONDS)
+        with self._condition:
+            while self._next_seq - 1 <= since:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            events = [i for i in self._events if i['seq'] > since]
+            oldest_seq = self._events[0]['seq'] if len(self._events) > 0 else self._next_seq
+            return {
+                'events': events,
+                'next': self._next_seq - 1,
+                'lost': since + 1 < oldest_seq,
+            }
+
+
+class AgentRequestHandler(ControlRequestHandler):
+
+    server: 'AgentServer'
+
+    def do_GET(self) -> None:
+        if not self._check_auth():
+            return
+        path, query = self._parse_path()
+        if path == '/events':
+            try:
+                since = int(query.get('since', '0'))
+                wait_seconds = float(query.get('wait', '0'))
+            except ValueError as e:
+                self._send_json(400, {'error': f'参数错误 {e}'})
+                return
+            self._send_json(200, self.server.event_log.get_events(since, wait_seconds))
+        else:
+            ControlRequestHandler.do_GET(self)
+
+    def do_POST(self) -> None:
+        if not self._check_auth():
+            return
+        path, query = self._parse_path()
+        if path == '/run':
+            try:
+                data = json.loads(self._body.decode('utf-8')) if len(self._body) > 0 else {}
+            except ValueError as e:
+                self._send_json(400, {'error': f'请求体不是JSON {e}'})
+                return
+            chain_name = data.get('chain') if isinstance(data, dict) else None
+            if not isinstance(chain_name, str) or len(chain_name) == 0:
+                self._send_json(400, {'error': '缺少脚本链名称'})
+                return
+            code, response = self.server.start_run(chain_name, bool(data.get('resume', False)))
+            self._send_json(code, response)
+        else:
+            ControlRequestHandler.do_POST(self)
+
+    def _check_control_auth(self) -> bool:
+        # 代理的全部请求都已经校验过签名
+        return True
+
+    def _check_auth(self) -> bool:
+        """
+        读取请求体并校验签名 不通过时直接返回401
+        """
+        try:
+            length = int(self.headers.get('Content-Length', '0'))
+        except ValueError:
+            length = 0
+        self._body: bytes = self.rfile.read(length) if length > 0 else b''
+        error = verify_request(self.server.token, self.command, self.path,
+                               self.headers.get(TIMESTAMP_HEADER), self.headers.get(NONCE_HEADER),
+                               self.headers.get(SIGNATURE_HEADER), self._body, self.server.nonce_cache)
+        if error is not None:
+            log.error(f'代理拒绝请求 {self.client_address[0]} {self.command} {self.path} {error}')
+            self._send_json(401, {'error': error})
+            return False
+        return True
+
+
+class AgentServer(ControlServer):
+
+    handler_class = AgentRequestHandler
+
+    def __init__(self,
+                 controller: RunController,
+                 run_chain: Callable[[str, ScriptChainConfig, bool], None],
+                 token: str,
+                 port: int,
+                 host: str = '0.0.0.0',
+                 capacity: int = 1,
+                 ):
+        """
+        代理模式 接收协调器的运行请求 在本机运行脚本链 并把每个脚本的结果发给协调器
+        在控制接口的基础上增加以下接口 全部请求都需要签名 见 agent_auth
+            POST /run  {"chain": "01", "resume": false}  运行脚本链 返回 run_id 与正在运行的脚本链使用同一个游戏时返回409
+            GET  /events?since=0&wait=10               读取编号大于since的事件 没有时最多等待wait秒
+        GET /status 中增加 agent 字段 包含运行数量和本机负载 供协调器分配脚本链
+        :param controller: 执行器的运行状态
+        :param run_chain: 运行一个脚本链 参数为 脚本链名称, 脚本链配置, 是否断点续跑 会在单独的线程中调用
+        :param token: 与协调器共用的密钥
+        :param port: 端口
+        :param host: 监听的地址 默认监听全部网卡
+        :param capacity: 最多同时运行的脚本链数量
+        """
+        if not token:
+            raise ValueError('代理模式需要密钥')
+        self.run_chain: Callable[[str, ScriptChainConfig, bool], None] = run_chain
+        self.capacity: int = max(1, capacity)
+        self.event_log: AgentEventLog = AgentEventLog()
+        self.nonce_cache: NonceCache = NonceCache()  # 拒绝重放的请求
+
+        self._run_lock = threading.Lock()
+        self._run_ids: dict[str, str] = {}  # 正在运行的脚本链名称 -> run_id
+        self._last_chain_done: dict[str, dict] = {}  # run_id -> 脚本链结束的事件
+        self._run_threads: dict[str, threading.Thread] = {}  # run_id -> 线程
+        self._busy_games: dict[str, str] = {}  # 正在运行的游戏 -> 脚本链名称
+
+        ControlServer.__init__(self, controller, port, host, token=token)
+        controller.add_listener(self._on_controller_event)
+        self._cpu_sampler: SystemCpuSampler = SystemCpuSampler()  # 两次读取状态之间的平均占用
+
+    def get_status(self) -> dict:
+        status = ControlServer.get_status(self)
+        with self._run_lock:
+            running = sorted(self._run_ids.keys())
+        status['agent'] = {
+            'capacity': self.capacity,
+            'running': running,
+            'cpu_percent': self._cpu_sampler.get_percent(),
+            'available_memory_mb': psutil.virtual_memory().available / 1024 / 1024,
+        }
+        return status
+
+    def handle_error(self, request, client_address) -> None:
+        if isinstance(sys.exc_info()[1], ConnectionError):  # 协调器退出时会断开长轮询的连接 不需要输出异常
+            return
+        ControlServer.handle_error(self, request, client_address)
+
+    def start_run(self, chain_name: str, resume: bool) -> tuple[int, dict]:
+        """
+        在新的线程中运行脚本链
+        :return: HTTP状态码, 响应内容
+        """
+        if chain_name != os.path.basename(chain_name) or chain_name.startswith('.'):  # 只能运行配置目录中的脚本链
+            return 400, {'error': f'脚本链名称非法 {chain_name}'}
+        chain_config = ScriptChainConfig(chain_name)
+        if not chain_config.is_file_exists():
+            return 404, {'error': f'脚本链配置不存在 {chain_name}'}
+
+        games = get_chain_games(chain_config)
+
+        with self._run_lock:
+            if chain_name in self._run_ids:
+                return 409, {'error': f'脚本链正在运行 {chain_name}', 'run_id': self._run_ids[chain_name]}
+            for game in games:  # 同一个游戏只能有一个脚本链在运行
+                if game in self._busy_games:
+                    return 409, {'error': f'游戏正在被脚本链 {self._busy_games[game]} 使用 {game}', 'game': game}
+            if len(self._run_ids) >= self.capacity:
+                return 503, {'error': f'代理已满 {len(self._run_ids)}/{self.capacity}'}
+            run_id = uuid.uuid4().hex[:12]
+            self._run_ids[chain_name] = run_id
+            for game in games:
+                self._busy_games[game] = chain_name
+            thread = threading.Thread(target=self._run, args=(run_id, chain_name, chain_config, games, resume),
+                                      name=f'agent_run_{chain_name}', daemon=True)
+            self._run_threads[run_id] = thread
+            self.event_log.add({'type': 'run_accepted', 'run_id': run_id, 'chain': chain_name})
+        thread.start()
+        log.info(f'代理开始运行脚本链 {chain_name} {run_id}')
+        return 200, {'run_id': run_id, 'chain': chain_name}
+
+    def _run(self, run_id: str, chain_name: str, chain_config: ScriptChainConfig, games: set[str],
+             resume: bool) -> None:
+        error: Optional[str] = None
+        try:
+            self.run_chain(chain_name, chain_config, resume)
+        except Exception as e:
+            log.error(f'脚本链运行异常 {chain_name}', exc_info=True)
+            error = str(e)
+        finally:
+            with self._run_lock:
+                self._run_ids.pop(chain_name, None)
+                self._run_threads.pop(run_id, None)
+                for game in games:
+                    if self._busy_games.get(game) == chain_name:
+                        del self._busy_games[game]
+                chain_done = self._last_chain_done.pop(run_id, None)
+                self.event_log.add({
+                    'type': 'run_done',
+                    'run_id': run_id,
+                    'chain': chain_name,
+                    'done': {} if chain_done is None else chain_done['done'],
+                    'aborted': chain_done is not None and chain_done['aborted'],
+                    'error': error,
+                })
+
+    def _on_controller_event(self, event: dict) -> None:
+        """
+        执行器的运行状态变化 加上 run_id 写入事件记录
+        """
+        with self._run_lock:
+            run_id = self._run_ids.get(event['chain'])
+            if run_id is None:  # 不是通过代理运行的脚本链
+                return
+            if event['type'] == 'chain_done':
+                self._last_chain_done[run_id] = event
+            self.event_log.add({**event, 'run_id': run_id})
+
+    def wait_running(self) -> None:
+        """
+        等待正在运行的脚本链结束
+        """
+        with self._run_lock:
+            threads = list(self._run_threads.values())
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,423 @@
+import asyncio
+import os
+import time
+from typing import Callable, Optional
+
+from one_dragon.utils.log_utils import log
+from script_chainer.config.script_plan import ScriptPlan
+from script_chainer.runner.chain_journal import ChainJournal
+from script_chainer.runner.chain_scheduler import get_script_dependencies, get_blocked_scripts
+from script_chainer.runner.metrics_store import MetricsStore
+from script_chainer.runner.output_capture import ScriptOutputCapture, create_output_capture, get_done_notify_content
+from script_chainer.runner.probes import get_ready_probes, get_teardown_probes, check_probe_results, wait_probes_async, \
+    AdaptiveInterval
+from script_chainer.runner.process_table import ProcessTable
+from script_chainer.runner.process_tree_watcher import ProcessTreeWatcher
+from script_chainer.runner.process_teardown import teardown_script, teardown_startup_tree
+from script_chainer.runner.resource_guard import AdmissionController, get_over_limit_message, HangDetector, \
+    get_hang_notify_content
+from script_chainer.runner.run_control import RunController, ScriptRunState
+from script_chainer.runner.run_metrics import ScriptRunMetrics
+from script_chainer.runner.script_monitor import ScriptMonitor, start_tree_watcher, create_log_watcher, \
+    get_subprocess_kwargs
+from script_chainer.runner.script_run_result import ScriptRunResult
+
+
+class AsyncSupervisor:
+
+    def __init__(self,
+                 process_table: ProcessTable,
+                 message_callback: Callable[[str, str, bool], None],
+                 notify_callback: Optional[Callable[[str], None]] = None,
+                 max_concurrency: int = 1,
+                 journal: Optional[ChainJournal] = None,
+                 metrics_store: Optional[MetricsStore] = None,
+                 admission: Optional[AdmissionController] = None,
+                 controller: Optional[RunController] = None,
+                 ):
+        """
+        基于asyncio的脚本链执行器
+        每个脚本是一个协程 等待子进程和进程退出时不阻塞 超时可以随时取消
+        :param process_table: 共用的进程表快照
+        :param message_callback: 输出信息的回调 参数为 信息, 日志级别, 是否状态信息
+        :param notify_callback: 发送通知的回调 会在线程池中运行 不阻塞脚本链
+        :param max_concurrency: 最多同时运行的脚本数量
+        :param journal: 脚本链的进度日志
+        :param metrics_store: 脚本运行性能记录的存储 为None时不记录
+        :param admission: 准入控制 系统资源足够时才开始下一个脚本
+        :param controller: 运行状态和控制命令 为None时不响应控制命令
+        """
+        self.process_table: ProcessTable = process_table
+        self.message_callback: Callable[[str, str, bool], None] = message_callback
+        self.notify_callback: Optional[Callable[[str], None]] = notify_callback
+        self.max_concurrency: int = max(1, max_concurrency)
+        self.journal: Optional[ChainJournal] = journal
+        self.metrics_store: Optional[MetricsStore] = metrics_store
+        self.admission: Optional[AdmissionController] = admission
+        self.controller: Optional[RunController] = controller
+
+        self._notify_futures: list[asyncio.Future] = []
+
+    def print_message(self, message: str, level: str = 'INFO', status: bool = False) -> None:
+        self.message_callback(message, level, status)
+
+    def notify(self, content: str) -> None:
+        """
+        在线程池中发送通知 不等待结果
+        """
+        if self.notify_callback is None:
+            return
+        future = asyncio.get_running_loop().run_in_executor(None, self.notify_callback, content)
+        self._notify_futures.append(future)
+
+    async def wait_notify_done(self) -> None:
+        """
+        等待已发出的通知全部完成
+        """
+        results = await asyncio.gather(*self._notify_futures, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                log.error('发送通知失败', exc_info=result)
+        self._notify_futures.clear()
+
+    async def run_chain(self, chain_name: str, script_list: list[ScriptPlan],
+                        done_idx: Optional[set[int]] = None) -> None:
+        """
+        按依赖关系运行脚本链 互不依赖的脚本同时运行
+        :param chain_name: 脚本链名称
+        :param script_list: 脚本列表
+        :param done_idx: 已经完成的脚本下标 断点续跑时跳过这些脚本
+        """
+        if done_idx is None:
+            done_idx = set()
+        dependencies = get_script_dependencies(script_list)
+        blocked_set = get_blocked_scripts(dependencies)
+        if len(blocked_set) > 0:
+            self.print_message(f'脚本依赖无法满足 跳过运行 {sorted(blocked_set)}', 'ERROR')
+
+        has_dependents: set[int] = set()
+        for depend_set in dependencies.values():
+            has_dependents.update(depend_set)
+
+        done_event: dict[int, asyncio.Event] = {i.idx: asyncio.Event() for i in script_list}
+        for idx in done_idx:
+            if idx in done_event:
+                done_event[idx].set()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_one(script_config: ScriptPlan) -> None:
+            for idx in dependencies[script_config.idx]:
+                await done_event[idx].wait()
+
+            async with semaphore:
+                if self.controller is not None and self.controller.is_aborted(chain_name):
+                    self.print_message(f'脚本链已中止 跳过运行 {script_config.script_display_name}')
+                    done_event[script_config.idx].set()
+                    return
+                run_state = None
+                if self.controller is not None:
+                    run_state = self.controller.script_started(chain_name, script_config)
+                if self.admission is not None:
+                    await self.admission.wait_async(self.print_message)
+                if script_config.notify_start:
+                    self.notify(f'脚本链 {chain_name} 开始运行: {script_config.script_display_name}')
+                if self.journal is not None:
+                    self.journal.script_started(script_config.idx)
+                metrics = ScriptRunMetrics(chain_name, script_config.idx, script_config.script_path)
+                output_capture = create_output_capture(chain_name, script_config)
+                try:
+                    result = await self.run_script(script_config, metrics, output_capture, run_state)
+                except Exception:
+                    log.error(f'脚本运行异常 {script_config.script_display_name}', exc_info=True)
+                    result = ScriptRunResult.ERROR
+                if run_state is not None:
+                    self.controller.script_done(run_state, result.value)
+                if output_capture is not None:
+                    await output_capture.close_async()
+                if self.journal is not None:
+                    self.journal.script_done(script_config.idx, result)
+                if self.metrics_store is not None and result != ScriptRunResult.INVALID:
+                    if metrics.total_seconds is None:  # 创建失败或异常时 没有经过监控
+                        metrics.finish(result.value)
+                    await asyncio.to_thread(self.metrics_store.save, metrics)
+                if script_config.notify_done:
+                    self.notify(get_done_notify_content(chain_name, script_config, result, output_capture))
+
+            if script_config.idx in has_dependents:
+                await self.wait_teardown(script_config)
+            done_event[script_config.idx].set()
+
+        await asyncio.gather(*[
+            run_one(i)
+            for i in script_list
+            if i.idx not in blocked_set and i.idx not in done_idx
+        ])
+        await self.wait_notify_done()
+
+    async def wait_teardown(self, script_config: ScriptPlan) -> None:
+        """
+        脚本结束后 等待收尾探针全部满足再开始下一个脚本
+        没有配置探针时 等待固定的时间
+        """
+        probes = get_teardown_probes(script_config, self.process_table)
+        if len(probes) == 0:
+            self.print_message(f'{script_config.teardown_max_seconds:g}秒后开始下一个脚本')
+            await asyncio.sleep(script_config.teardown_max_seconds)
+            return
+
+        self.print_message(f'等待开始下一个脚本 {", ".join(i.display_name for i in probes)}')
+        if await wait_probes_async(probes, script_config.teardown_max_seconds):
+            self.print_message('收尾检查通过 开始下一个脚本', 'PASS')
+        else:
+            self.print_message('收尾检查超时 开始下一个脚本')
+
+    async def run_script(self, script_config: ScriptPlan,
+                         metrics: Optional[ScriptRunMetrics] = None,
+                         output_capture: Optional[ScriptOutputCapture] = None,
+                         run_state: Optional[ScriptRunState] = None) -> ScriptRunResult:
+        """
+        运行脚本 逻辑与同步执行器的 run_script 一致
+        :param script_config: 脚本配置
+        :param metrics: 记录性能指标 不需要保存时为None
+        :param output_capture: 捕获脚本的输出 为None时输出到执行器的控制台
+        :param run_state: 控制接口中的运行状态 为None时不更新状态 也不响应控制命令
+        :return: 运行结果
+        """
+        if metrics is None:  # 资源上限的检查依赖进程树采样 不保存也需要记录
+            metrics = ScriptRunMetrics('', script_config.idx, script_config.script_path)
+        script_path = script_config.script_path
+
+        invalid_message = script_config.invalid_message
+        if invalid_message is not None:
+            self.print_message(f'脚本配置不合法 跳过运行 {invalid_message}')
+            return ScriptRunResult.INVALID
+
+        command = list(script_config.command)
+        metrics.create_profiles(script_config, self.process_table)
+
+        start_time = time.time()
+        log_watcher = create_log_watcher(script_config)
+        process, tree_watcher = await self._create_subprocess(command, script_config, start_time, metrics,
+                                                              output_capture, run_state)
+        if run_state is not None and run_state.skip_requested:
+            await self._stop_startup_tree(process, tree_watcher)
+            self.print_message(f'脚本已跳过 {script_config.script_display_name}', 'ERROR')
+            return ScriptRunResult.SKIPPED
+        if process is None:
+            self.print_message(f'子进程创建失败 {script_path}')
+            return ScriptRunResult.CREATE_FAILED
+        else:
+            self.print_message(f'脚本子进程创建成功 {script_path}', 'PASS')
+
+        result: ScriptRunResult = ScriptRunResult.SUCCESS
+        loop = asyncio.get_running_loop()
+        changed_event = asyncio.Event()
+        monitor = ScriptMonitor(script_config, self.process_table,
+                                changed_callback=lambda: loop.call_soon_threadsafe(changed_event.set),
+                                tree_watcher=tree_watcher, log_watcher=log_watcher, game_profile=metrics.game_profile)
+        monitor.start()
+        metrics.start_sampling(script_config, self.process_table, process.pid, tree_watcher)
+        hang_detector = HangDetector(script_config.hang_seconds)
+        if run_state is not None:
+            run_state.wake_callback = lambda: loop.call_soon_threadsafe(changed_event.set)
+            self.controller.update(run_state, phase='running')
+        try:
+            while True:
+                is_done: bool = False
+
+                await asyncio.to_thread(metrics.sample)
+
+                status_message, status_level = monitor.get_status_message()
+                self.print_message(status_message, status_level, status=True)
+                if run_state is not None:
+                    self.controller.update(run_state, status=status_message)
+
+                done_message = monitor.get_done_message()
+                if done_message is not None:
+                    is_done = True
+                    self.print_message(done_message[0], done_message[1])
+                    if done_message[1] == 'ERROR':
+                        result = ScriptRunResult.ERROR
+
+                timeout_seconds = script_config.run_timeout_seconds if run_state is None else run_state.deadline_seconds
+                remaining = timeout_seconds - (time.time() - start_time)
+                if remaining < 0:
+                    is_done = True
+                    result = ScriptRunResult.TIMEOUT
+                    self.print_message(f'脚本运行超时 {script_config.script_display_name}', 'ERROR')
+
+                over_limit_message = get_over_limit_message(script_config, metrics)
+                if not is_done and over_limit_message is not None:
+                    is_done = True
+                    result = ScriptRunResult.OVER_LIMIT
+                    self.print_message(f'{over_limit_message} 强制关闭 {script_config.script_display_name}', 'ERROR')
+
+                if not is_done and hang_detector.update(metrics):
+                    hang_message = hang_detector.get_hang_message()
+                    if script_config.hang_notify:
+                        self.notify(get_hang_notify_content(metrics.chain_name, script_config, hang_message))
+                    if script_config.hang_kill:
+                        is_done = True
+                        result = ScriptRunResult.HUNG
+                        self.print_message(f'{hang_message} 强制关闭 {script_config.script_display_name}', 'ERROR')
+                    else:
+                        self.print_message(f'{hang_message} {script_config.script_display_name}', 'ERROR')
+
+                if not is_done and run_state is not None and run_state.skip_requested:
+                    is_done = True
+                    result = ScriptRunResult.SKIPPED
+                    self.print_message(f'脚本已跳过 强制关闭 {script_config.script_display_name}', 'ERROR')
+
+                if is_done:
+                    break
+
+                try:
+                    await asyncio.wait_for(changed_event.wait(), timeout=min(1.0, remaining))
+                except asyncio.TimeoutError:
+                    pass
+                changed_event.clear()
+        finally:
+            monitor.stop()
+            if run_state is not None:
+                run_state.wake_callback = None
+
+        metrics.finish(result.value, monitor)
+
+        # 关闭跟踪到的脚本和游戏进程树 确认退出后才开始下一个脚本
+        try:
+            teardown_report = await asyncio.to_thread(teardown_script, script_config, metrics, result, tree_watcher)
+        except Exception:
+            log.error('关闭进程失败', exc_info=True)
+            teardown_report = None
+        if teardown_report is not None:
+            metrics.teardown_seconds = teardown_report.seconds
+            self.print_message(teardown_report.message, 'ERROR' if len(teardown_report.remaining) > 0 else 'INFO')
+
+        return result
+
+    async def _stop_startup_tree(self, process: Optional[asyncio.subprocess.Process],
+                                 tree_watcher: Optional[ProcessTreeWatcher]) -> None:
+        """
+        启动阶段失败或被跳过时 停止跟踪并关闭这次创建的进程树
+        :param process: 执行器创建的子进程
+        :param tree_watcher: 子进程的进程树跟踪
+        """
+        if tree_watcher is not None:
+            tree_watcher.stop()
+        root_pid = process.pid if process is not None and process.returncode is None else None
+        try:
+            report = await asyncio.to_thread(teardown_startup_tree, root_pid, tree_watcher)
+        except Exception:
+            log.error('关闭脚本子进程失败', exc_info=True)
+            report = None
+        if report is not None:
+            self.print_message(report.message, 'ERROR' if len(report.remaining) > 0 else 'INFO')
+        if process is not None and root_pid is not None:
+            try:  # 回收执行器创建的子进程
+                await asyncio.wait_for(process.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _create_subprocess(
+            self, command: list[str], script_config: ScriptPlan, start_time: float,
+            metrics: Optional[ScriptRunMetrics] = None,
+            output_capture: Optional[ScriptOutputCapture] = None,
+            run_state: Optional[ScriptRunState] = None,
+    ) -> tuple[Optional[asyncio.subprocess.Process], Optional[ProcessTreeWatcher]]:
+        """
+        创建脚本子进程
+        子进程运行足够长的时间 或者满足任意一个就绪条件 认为创建成功 启动器正常退出也算运行中
+        子进程异常退出时按重试等待时间重新创建 超过启动超时时间都没有成功则认为失败
+        通过控制接口跳过时 立刻返回当前的子进程
+        :return: 创建成功的子进程, 子进程的进程树跟踪 创建失败时都为None
+        """
+        script_path = script_config.script_path
+        ready_probes = get_ready_probes(script_config, self.process_table)
+        deadline = start_time + script_config.ready_timeout_seconds
+        retry_seconds: float = script_config.create_retry_seconds
+        poll_interval = AdaptiveInterval()
+        if run_state is not None:
+            self.controller.update(run_state, phase='starting')
+        while time.time() < deadline:
+            if run_state is not None and run_state.skip_requested:
+                return None, None
+            create_time = time.time()
+            try:
+                popen_kwargs = get_subprocess_kwargs(script_config)
+                if output_capture is None:
+                    process = await asyncio.create_subprocess_exec(*command, cwd=os.path.dirname(script_path),
+                                                                   **popen_kwargs)
+                else:
+                    process = await asyncio.create_subprocess_exec(*command, cwd=os.path.dirname(script_path),
+                                                                   stdout=asyncio.subprocess.PIPE,
+                                                                   stderr=asyncio.subprocess.PIPE,
+                                                                   **popen_kwargs)
+                    output_capture.attach_async(process.stdout, process.stderr)
+                if metrics is not None:
+                    metrics.create_seconds = time.time() - create_time
+                tree_watcher = start_tree_watcher(
+                    self.process_table, process.pid, create_time,
+                    joined_callback=metrics.apply_tree_profile if metrics is not None and metrics.has_profiles else None,
+                )
+                self.print_message(f'创建脚本子进程 {script_path}')
+            except Exception:
+                self.print_message(f'创建子进程失败 {script_path}')
+                log.error(f'创建子进程失败 {script_path}', exc_info=True)
+                await asyncio.sleep(retry_seconds)
+                retry_seconds *= script_config.create_retry_backoff
+                continue
+
+            healthy_time = create_time + script_config.ready_max_seconds
+            ready: bool = False
+            poll_interval.reset()
+            while True:
+                if run_state is not None and run_state.skip_requested:
+                    return process, tree_watcher
+                return_code = process.returncode
+                if return_code is not None and return_code != 0:
+                    break
+                now = time.time()
+                if now >= healthy_time:
+                    ready = True
+                    break
+                probe_results = check_probe_results(ready_probes)
+                if run_state is not None:
+                    self.controller.update(run_state, probe_results=probe_results)
+                if any(probe_results.values()):
+                    ready = True
+                    break
+                if now >= deadline:
+                    break
+
+                wait_seconds = min(healthy_time, deadline) - now
+                if len(ready_probes) > 0:
+                    wait_seconds = min(wait_seconds, poll_interval.next())
+                if return_code is None:  # 运行中 等待子进程退出或等够时间
+                    try:
+                        await asyncio.wait_for(process.wait(), timeout=wait_seconds)
+                    except asyncio.TimeoutError:
+                        pass
+                else:  # 启动器已正常退出 可能启动了其它进程 继续等待
+                    await asyncio.sleep(wait_seconds)
+
+            if return_code is None:
+                process_result_display = '运行中'
+            elif return_code == 0:
+                process_result_display = '运行成功'
+            else:
+                process_result_display = '运行失败'
+            self.print_message(f'检测脚本子进程运行 {process_result_display}')
+
+            if ready:
+                return process, tree_watcher
+
+            # 启动超时 或子进程异常退出 关闭这次创建的进程树
+            await self._stop_startup_tree(process, tree_watcher)
+
+            if return_code is not None and return_code != 0:  # 子进程运行结束 返回异常 等待后尝试重新调用
+                self.print_message(f'{retry_seconds:g}秒后重新创建脚本子进程')
+                await asyncio.sleep(retry_seconds)
+                retry_seconds *= script_config.create_retry_backoff
+                continue
+
+        return None, None
@@ -0,0 +1,202 @@
+import datetime
+import os
+import threading
+from typing import Callable, Optional
+
+from one_dragon.utils.log_utils import log
+from script_chainer.config.script_config import ScriptChainConfig
+from script_chainer.runner.cron_schedule import CronSchedule
+
+
+def get_chain_games(chain_config: ScriptChainConfig) -> set[str]:
+    """
+    脚本链中用到的游戏进程名称
+    """
+    return {i.game_process_name for i in chain_config.script_list if i.game_process_name}
+
+
+class ScheduledChain:
+
+    def __init__(self, module_name: str, file_mtime: float, chain_config: ScriptChainConfig):
+        """
+        常驻模式下的一个脚本链
+        :param module_name: 脚本链名称
+        :param file_mtime: 加载时配置文件的修改时间 用于判断是否需要重新加载
+        :param chain_config: 脚本链配置
+        """
+        self.module_name: str = module_name
+        self.file_mtime: float = file_mtime
+        self.chain_config: ScriptChainConfig = chain_config
+        self.schedule: Optional[CronSchedule] = None
+        self.next_run_time: Optional[datetime.datetime] = None  # 下一次定时运行的时间
+        self.pending_time: Optional[datetime.datetime] = None  # 已经到时间 但在等待游戏空闲
+        self.running: bool = False
+
+
+class ChainDaemon:
+
+    def __init__(self,
+                 config_dir: str,
+                 run_chain: Callable[[str, ScriptChainConfig], None],
+                 message_callback: Callable[[str, str], None],
+                 check_interval: float = 1,
+                 reload_interval: float = 5,
+                 ):
+        """
+        常驻的脚本链调度
+        按脚本链配置中的 schedule 定时运行 配置文件变化后自动重新加载
+        同时运行多个脚本链时 用到同一个游戏的脚本链会排队 不会同时运行
+        执行器的配置 通知渠道等只在启动时初始化一次
+        :param config_dir: 脚本链配置的目录
+        :param run_chain: 运行一个脚本链 参数为 脚本链名称, 脚本链配置 会在单独的线程中调用
+        :param message_callback: 输出信息的回调 参数为 信息, 日志级别
+        :param check_interval: 检查是否到时间的间隔
+        :param reload_interval: 检查配置文件变化的间隔
+        """
+        self.config_dir: str = config_dir
+        self.run_chain: Callable[[str, ScriptChainConfig], None] = run_chain
+        self.message_callback: Callable[[str, str], None] = message_callback
+        self.check_interval: float = check_interval
+        self.reload_interval: float = reload_interval
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._chains: dict[str, ScheduledChain] = {}
+        self._busy_games: dict[str, str] = {}  # 正在运行的游戏 -> 脚本链名称
+        self._threads: dict[str, threading.Thread] = {}
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def reload(self) -> None:
+        """
+        检查配置目录 加载新增或修改过的脚本链 移除已经删除的脚本链
+        只比较文件的修改时间 没有变化的配置不会重新读取
+        """
+        file_mtimes: dict[str, float] = {}
+        try:
+            with os.scandir(self.config_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith('.yml'):
+                        file_mtimes[entry.name[:-4]] = entry.stat().st_mtime
+        except OSError:
+            log.error(f'读取脚本链配置目录失败 {self.config_dir}', exc_info=True)
+            return
+
+        now = datetime.datetime.now()
+        with self._lock:
+            for module_name in list(self._chains.keys()):
+                if module_name not in file_mtimes:
+                    del self._chains[module_name]
+                    self.message_callback(f'脚本链配置已删除 {module_name}', 'INFO')
+
+            for module_name, file_mtime in file_mtimes.items():
+                chain = self._chains.get(module_name)
+                if chain is not None and chain.file_mtime == file_mtime:
+                    continue
+                try:
+                    chain_config = ScriptChainConfig(module_name)
+                except Exception:
+                    log.error(f'加载脚本链配置失败 {module_name}', exc_info=True)
+                    continue
+
+                new_chain = ScheduledChain(module_name, file_mtime, chain_config)
+                if chain is not None:  # 保留运行状态
+                    new_chain.running = chain.running
+                    new_chain.pending_time = chain.pending_time
+                self._chains[module_name] = new_chain
+
+                schedule_text = chain_config.schedule
+                if not schedule_text:
+                    if chain is not None and chain.schedule is not None:
+                        self.message_callback(f'脚本链 {module_name} 已取消定时运行', 'INFO')
+                    continue
+                try:
+                    new_chain.schedule = CronSchedule(schedule_text)
+                except ValueError as e:
+                    self.message_callback(f'脚本链 {module_name} 的定时配置非法 {e}', 'ERROR')
+                    continue
+                new_chain.next_run_time = new_chain.schedule.get_next_time(now)
+                self.message_callback(f'脚本链 {module_name} 定时 {schedule_text} 下次运行 {new_chain.next_run_time}', 'INFO')
+
+    def run_forever(self) -> None:
+        """
+        一直运行直到调用 stop 返回前等待正在运行的脚本链结束
+        """
+        self.message_callback(f'常驻模式启动 配置目录 {self.config_dir}', 'INFO')
+        last_reload_time: Optional[datetime.datetime] = None
+        while not self._stop_event.is_set():
+            now = datetime.datetime.now()
+            if last_reload_time is None or (now - last_reload_time).total_seconds() >= self.reload_interval:
+                self.reload()
+                last_reload_time = now
+            self._check_due(now)
+            self._start_pending()
+            self._stop_event.wait(self.check_interval)
+        self.wait_running()
+
+    def wait_running(self) -> None:
+        """
+        等待正在运行的脚本链结束
+        """
+        with self._lock:
+            threads = list(self._threads.values())
+            running_names = list(self._threads.keys())
+        if len(threads) > 0:
+            self.message_callback(f'等待正在运行的脚本链结束 {", ".join(running_names)}', 'INFO')
+        for thread in threads:
+            thread.join()
+
+    def _check_due(self, now: datetime.datetime) -> None:
+        """
+        到时间的脚本链进入等待 上一次还没有运行时不重复排队
+        """
+        with self._lock:
+            for chain in self._chains.values():
+                if chain.schedule is None or chain.next_run_time is None or chain.next_run_time > now:
+                    continue
+                if chain.running or chain.pending_time is not None:
+                    self.message_callback(f'脚本链 {chain.module_name} 上一次还没有完成 跳过本次定时', 'ERROR')
+                else:
+                    chain.pending_time = chain.next_run_time
+                chain.next_run_time = chain.schedule.get_next_time(now)
+
+    def _start_pending(self) -> None:
+        """
+        按到时间的先后 启动游戏空闲的脚本链
+        """
+        with self._lock:
+            pending_list = sorted(
+                [i for i in self._chains.values() if i.pending_time is not None and not i.running],
+                key=lambda i: i.pending_time
+            )
+            for chain in pending_list:
+                games = get_chain_games(chain.chain_config)
+                if any(game in self._busy_games for game in games):  # 同一个游戏只能有一个脚本链在运行
+                    continue
+                for game in games:
+                    self._busy_games[game] = chain.module_name
+                chain.pending_time = None
+                chain.running = True
+                thread = threading.Thread(target=self._run_chain, args=(chain, games),
+                                          name=f'chain_daemon_{chain.module_name}', daemon=True)
+                self._threads[chain.module_name] = thread
+                thread.start()
+
+    def _run_chain(self, chain: ScheduledChain, games: set[str]) -> None:
+        self.message_callback(f'开始定时运行脚本链 {chain.module_name}', 'INFO')
+        try:
+            self.run_chain(chain.module_name, chain.chain_config)
+        except Exception:
+            log.error(f'脚本链运行异常 {chain.module_name}', exc_info=True)
+        finally:
+            with self._lock:
+                for game in games:
+                    if self._busy_games.get(game) == chain.module_name:
+                        del self._busy_games[game]
+                current = self._chains.get(chain.module_name)
+                if current is not None:
+                    current.running = False
+                chain.running = False
+                self._threads.pop(chain.module_name, None)
+            self.message_callback(f'定时运行脚本链结束 {chain.module_name}', 'INFO')
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional, TextIO
+
+from one_dragon.utils import os_utils
+from one_dragon.utils.log_utils import log
+from script_chainer.config.script_plan import ScriptPlan
+from script_chainer.runner.script_run_result import ScriptRunResult
+
+# 断点续跑时算作已完成的结果 其它结果的脚本会重新运行
+RESUME_DONE_RESULTS: set[str] = {ScriptRunResult.SUCCESS.value, ScriptRunResult.INVALID.value}
+
+
+def get_chain_fingerprint(script_list: list[ScriptPlan]) -> str:
+    """
+    脚本链内容的指纹 脚本链修改过之后 旧的进度不能用于断点续跑
+    :param script_list: 脚本列表
+    :return: 指纹
+    """
+    content = '\n'.join(f'{i.idx} {i.script_path} {i.script_arguments}' for i in script_list)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]
+
+
+class ChainJournal:
+
+    def __init__(self, chain_name: str, journal_dir: Optional[str] = None):
+        """
+        脚本链的进度日志 每次状态变化追加一行并落盘
+        每行是一个简短的json
+            {"e": "chain", "dt": "20240101", "fp": "...", "t": ...} 脚本链开始
+            {"e": "start", "i": 0, "t": ...} 脚本开始
+            {"e": "done", "i": 0, "r": "success", "t": ...} 脚本结束及结果
+            {"e": "chain_done", "t": ...} 脚本链结束
+        新的一次运行会清空文件 因此文件只保留最近一次运行的进度
+        :param chain_name: 脚本链名称
+        :param journal_dir: 日志所在目录 默认为 .log/journal
+        """
+        self.chain_name: str = chain_name
+        if journal_dir is None:
+            journal_dir = os_utils.get_path_under_work_dir('.log', 'journal')
+        self.file_path: str = os.path.join(journal_dir, f'{chain_name}.jsonl')
+
+        self._lock = threading.Lock()
+        self._file: Optional[TextIO] = None
+
+    def read_records(self) -> list[dict]:
+        """
+        读取全部记录 忽略写入中断导致的不完整行
+        """
+        records: list[dict] = []
+        if not os.path.exists(self.file_path):
+            return records
+
+        with open(self.file_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if len(line) == 0:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+
+        return records
+
+    def get_resume_done_idx(self, fingerprint: str) -> Optional[set[int]]:
+        """
+        获取可以断点续跑时 已经完成的脚本下标
+        只有上次运行在今天开始 未完成 且脚本链没有修改过时 才可以续跑
+        只有正常结束和配置不合法的脚本算作已完成 超时 跳过 创建失败等脚本续跑时会重新运行
+        :param fingerprint: 当前脚本链的指纹
+        :return: 已完成的脚本下标 不能续跑时返回None
+        """
+        records = self.read_records()
+        if len(records) == 0 or records[0].get('e') != 'chain':
+            return None
+
+        chain_record = records[0]
+        if chain_record.get('dt') != os_utils.get_dt() or chain_record.get('fp') != fingerprint:
+            return None
+
+        done_idx: set[int] = set()
+        for record in records:
+            event = record.get('e')
+            if event == 'chain_done':
+                return None
+            elif event == 'done' and record.get('r') in RESUME_DONE_RESULTS:
+                done_idx.add(record.get('i'))
+
+        return done_idx
+
+    def begin(self, fingerprint: str, resume: bool) -> None:
+        """
+        开始记录
+        :param fingerprint: 当前脚本链的指纹
+        :param resume: 是否断点续跑 续跑时在原有记录后追加 否则清空重新记录
+        """
+        with self._lock:
+            self._file = open(self.file_path, 'a' if resume else 'w', encoding='utf-8')
+            if resume and not self._ends_with_newline():  # 上次写入中断 先结束不完整的行
+                self._file.write('\n')
+        if not resume:
+            self._append({'e': 'chain', 'dt': os_utils.get_dt(), 'fp': fingerprint})
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.file_path, 'rb') as file:
+            file.seek(0, os.SEEK_END)
+            if file.tell() == 0:
+                return True
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) == b'\n'
+
+    def script_started(self, idx: int) -> None:
+        self._append({'e': 'start', 'i': idx})
+
+    def script_done(self, idx: int, result: ScriptRunResult) -> None:
+        self._append({'e': 'done', 'i': idx, 'r': result.value})
+
+    def chain_done(self) -> None:
+        self._append({'e': 'chain_done'})
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _append(self, record: dict) -> None:
+        """
+        追加一行记录 并等待落盘
+        """
+        record['t'] = round(time.time(), 3)
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.write(line + '\n')
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except Exception:
+                log.error(f'写入脚本链进度失败 {self.file_path}', exc_info=True)
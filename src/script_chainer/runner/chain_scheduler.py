@@ -0,0 +1,140 @@
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Callable, Optional
+
+from one_dragon.utils.log_utils import log
+from script_chainer.config.script_plan import ScriptPlan
+
+
+def get_script_dependencies(script_list: list[ScriptPlan]) -> dict[int, set[int]]:
+    """
+    计算每个脚本依赖的脚本下标
+    配置了 depends_on 的脚本 直接使用配置的依赖
+    其余脚本依赖前一组的全部脚本 相邻且 parallel_group 相同的脚本为一组 没有分组的脚本单独一组
+    因此两者都没有配置时 就是原来的按顺序运行
+    :param script_list: 脚本列表
+    :return: 脚本下标 -> 依赖的脚本下标
+    """
+    result: dict[int, set[int]] = {}
+    valid_idx_set: set[int] = {i.idx for i in script_list}
+
+    prev_stage: list[int] = []
+    current_stage: list[int] = []
+    current_group: Optional[str] = None
+    for config in script_list:
+        group = config.parallel_group
+        if len(current_stage) == 0 or not group or group != current_group:
+            if len(current_stage) > 0:
+                prev_stage = current_stage
+            current_stage = []
+            current_group = group if group else None
+        current_stage.append(config.idx)
+
+        if config.depends_on is not None:
+            result[config.idx] = {i for i in config.depends_on if i in valid_idx_set and i != config.idx}
+        else:
+            result[config.idx] = set(prev_stage)
+
+    return result
+
+
+def get_blocked_scripts(dependencies: dict[int, set[int]]) -> set[int]:
+    """
+    找出依赖永远无法满足的脚本 即处于循环依赖中 或依赖了这些脚本的脚本
+    :param dependencies: 脚本下标 -> 依赖的脚本下标
+    :return: 无法运行的脚本下标
+    """
+    remaining: dict[int, set[int]] = {idx: set(depend_set) for idx, depend_set in dependencies.items()}
+    while True:
+        ready = [idx for idx, depend_set in remaining.items() if len(depend_set) == 0]
+        if len(ready) == 0:
+            break
+        for idx in ready:
+            del remaining[idx]
+        for depend_set in remaining.values():
+            depend_set.difference_update(ready)
+
+    return set(remaining.keys())
+
+
+class ChainScheduler:
+
+    def __init__(self,
+                 script_list: list[ScriptPlan],
+                 run_script: Callable[[ScriptPlan], None],
+                 max_concurrency: int = 1,
+                 teardown: Optional[Callable[[ScriptPlan], None]] = None,
+                 message_callback: Optional[Callable[[str], None]] = None,
+                 done_idx: Optional[set[int]] = None,
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 ):
+        """
+        按依赖关系运行脚本链 互不依赖的脚本可以同时运行
+        :param script_list: 脚本列表
+        :param run_script: 运行单个脚本的方法 会在线程池中调用
+        :param max_concurrency: 最多同时运行的脚本数量
+        :param teardown: 脚本结束后 等待可以开始后续脚本的方法 只对有后续脚本的脚本调用
+        :param message_callback: 调度信息的回调
+        :param done_idx: 已经完成的脚本下标 断点续跑时跳过这些脚本
+        :param should_stop: 返回True时不再开始新的脚本 等待正在运行的脚本结束
+        """
+        self.script_list: list[ScriptPlan] = script_list
+        self.run_script: Callable[[ScriptPlan], None] = run_script
+        self.max_concurrency: int = max(1, max_concurrency)
+        self.teardown: Optional[Callable[[ScriptPlan], None]] = teardown
+        self.message_callback: Optional[Callable[[str], None]] = message_callback
+        self.done_idx: set[int] = set() if done_idx is None else done_idx
+        self.should_stop: Optional[Callable[[], bool]] = should_stop
+
+    def run(self) -> None:
+        """
+        运行全部脚本 直到全部结束
+        """
+        dependencies = get_script_dependencies(self.script_list)
+        has_dependents: set[int] = set()
+        for depend_set in dependencies.values():
+            has_dependents.update(depend_set)
+
+        pending: dict[int, ScriptPlan] = {i.idx: i for i in self.script_list if i.idx not in self.done_idx}
+        done_set: set[int] = set(self.done_idx)
+        running: dict[Future, ScriptPlan] = {}
+
+        with ThreadPoolExecutor(thread_name_prefix='script_chain', max_workers=self.max_concurrency) as executor:
+            while len(pending) > 0 or len(running) > 0:
+                if len(pending) > 0 and self.should_stop is not None and self.should_stop():
+                    self._message(f'脚本链已中止 跳过运行 {sorted(pending.keys())}')
+                    pending.clear()
+
+                for idx in sorted(pending.keys()):
+                    if len(running) >= self.max_concurrency:
+                        break
+                    if not dependencies[idx].issubset(done_set):
+                        continue
+
+                    config = pending.pop(idx)
+                    future = executor.submit(self._run_one, config, idx in has_dependents)
+                    running[future] = config
+
+                if len(running) == 0:
+                    if len(pending) > 0:
+                        self._message(f'脚本依赖无法满足 跳过运行 {sorted(pending.keys())}')
+                    break
+
+                finished, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    config = running.pop(future)
+                    done_set.add(config.idx)
+                    try:
+                        future.result()
+                    except Exception:
+                        log.error(f'脚本运行异常 {config.script_display_name}', exc_info=True)
+
+    def _run_one(self, script_config: ScriptPlan, has_dependents: bool) -> None:
+        try:
+            self.run_script(script_config)
+        finally:
+            if has_dependents and self.teardown is not None:
+                self.teardown(script_config)
+
+    def _message(self, message: str) -> None:
+        if self.message_callback is not None:
+            self.message_callback(message)
@@ -0,0 +1,137 @@
+import atexit
+import datetime
+import logging
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from colorama import Fore, Style
+
+LEVEL_COLORS: dict[str, str] = {
+    'INFO': Fore.CYAN,
+    'ERROR': Fore.YELLOW + Style.BRIGHT,
+    'PASS': Fore.GREEN,
+}
+
+
+class ConsoleHandler(logging.Handler):
+
+    def __init__(self):
+        """
+        把执行器的信息加上时间和颜色输出到控制台
+        只处理带有 console_level 的日志 即通过 ConsoleWriter.write 写入的信息
+        """
+        logging.Handler.__init__(self)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        level = getattr(record, 'console_level', None)
+        if level is None:
+            return
+        try:
+            timestamp = datetime.datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]
+            color = LEVEL_COLORS.get(level, Fore.WHITE)
+            sys.stdout.write(f'{timestamp} | {color}{level}{Style.RESET_ALL} | {record.getMessage()}\n')
+            sys.stdout.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self) -> None:
+        sys.stdout.flush()
+
+
+class StatusThrottleFilter(logging.Filter):
+
+    def __init__(self, throttle_seconds: float = 0):
+        """
+        节流重复的状态信息 同一条状态信息在间隔内只输出一次
+        :param throttle_seconds: 间隔 0为不节流
+        """
+        logging.Filter.__init__(self)
+        self.throttle_seconds: float = throttle_seconds
+        self._last_time: dict[str, float] = {}  # 状态信息 -> 上次输出的时间
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.throttle_seconds <= 0 or not getattr(record, 'status', False):
+            return True
+
+        message = record.getMessage()
+        last_time = self._last_time.get(message)
+        if last_time is not None and record.created - last_time < self.throttle_seconds:
+            return False
+
+        if len(self._last_time) > 1000:  # 状态信息种类有限 这里只是防止意外增长
+            self._last_time.clear()
+        self._last_time[message] = record.created
+        return True
+
+
+class ConsoleWriter:
+
+    def __init__(self, logger: logging.Logger, status_throttle_seconds: float = 0):
+        """
+        基于队列的控制台和日志输出
+        写入时只把日志放入队列 加时间、颜色以及写控制台和文件都在后台线程中进行
+        :param logger: 执行器使用的日志 原有的处理器会移到后台线程中
+        :param status_throttle_seconds: 重复状态信息的节流间隔 0为不节流
+        """
+        self.logger: logging.Logger = logger
+        self.throttle_filter: StatusThrottleFilter = StatusThrottleFilter(status_throttle_seconds)
+
+        self._lock = threading.Lock()
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._listener: Optional[QueueListener] = None
+
+    def set_status_throttle(self, seconds: float) -> None:
+        """
+        设置重复状态信息的节流间隔
+        :param seconds: 间隔 0为不节流
+        """
+        self.throttle_filter.throttle_seconds = seconds
+
+    def start(self) -> None:
+        """
+        开始后台输出 并在进程退出时输出剩余的信息
+        """
+        with self._lock:
+            if self._listener is not None:
+                return
+
+            console_handler = ConsoleHandler()
+            console_handler.addFilter(self.throttle_filter)
+            handlers = [*self.logger.handlers, console_handler]
+
+            self.logger.handlers.clear()
+            self.logger.addHandler(QueueHandler(self._queue))
+
+            self._listener = QueueListener(self._queue, *handlers, respect_handler_level=True)
+            self._listener.start()
+            atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """
+        输出队列中剩余的信息 并停止后台线程
+        """
+        with self._lock:
+            if self._listener is None:
+                return
+            self._listener.stop()  # 会先处理完队列中剩余的信息
+            for handler in self._listener.handlers:
+                handler.flush()
+                if not isinstance(handler, ConsoleHandler):
+                    self.logger.addHandler(handler)
+            for handler in [i for i in self.logger.handlers if isinstance(i, QueueHandler)]:
+                self.logger.removeHandler(handler)
+            self._listener = None
+
+    def write(self, message: str, level: str = 'INFO', status: bool = False) -> None:
+        """
+        写入一条信息 不阻塞调用方
+        :param message: 信息
+        :param level: 显示的级别 INFO / PASS / ERROR
+        :param status: 是否状态信息 状态信息会被节流
+        """
+        if self._listener is None:
+            self.start()
+        self.logger.info(message, extra={'console_level': level, 'status': status}, stacklevel=3)
@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional
+
+from one_dragon.utils.log_utils import log
+from script_chainer.runner.agent_auth import CONTROL_TOKEN_HEADER, verify_control_token
+from script_chainer.runner.run_control import RunController
+
+
+class ControlRequestHandler(BaseHTTPRequestHandler):
+
+    server: 'ControlServer'
+
+    def do_GET(self) -> None:
+        path, query = self._parse_path()
+        if path == '/status':
+            self._send_json(200, self.server.get_status())
+        else:
+            self._send_json(404, {'error': f'未知的路径 {path}'})
+
+    def do_POST(self) -> None:
+        if not self._check_control_auth():
+            return
+        path, query = self._parse_path()
+        controller = self.server.controller
+        try:
+            chain_name = query.get('chain')
+            idx = int(query['idx']) if 'idx' in query else None
+            if path == '/skip':
+                self._send_json(200, {'count': controller.skip(chain_name, idx)})
+            elif path == '/abort':
+                self._send_json(200, {'count': controller.abort(chain_name)})
+            elif path == '/extend':
+                seconds = float(query.get('seconds', '600'))
+                self._send_json(200, {'count': controller.extend_timeout(seconds, chain_name, idx)})
+            else:
+                self._send_json(404, {'error': f'未知的路径 {path}'})
+        except ValueError as e:
+            self._send_json(400, {'error': f'参数错误 {e}'})
+
+    def _check_control_auth(self) -> bool:
+        """
+        校验修改请求 不通过时直接返回401
+        """
+        error = verify_control_token(self.server.token, self.headers.get(CONTROL_TOKEN_HEADER))
+        if error is not None:
+            log.error(f'控制接口拒绝请求 {self.client_address[0]} {self.command} {self.path} {error}')
+            self._send_json(401, {'error': error})
+            return False
+        return True
+
+    def _parse_path(self) -> tuple[str, dict[str, str]]:
+        parsed = urllib.parse.urlsplit(self.path)
+        query = {k: v[-1] for k, v in urllib.parse.parse_qs(parsed.query).items()}
+        return parsed.path.rstrip('/') or '/', query
+
+    def _send_json(self, code: int, data: dict) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # 状态会被频繁读取 不写入日志
+        pass
+
+
+class ControlServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+    handler_class: type[ControlRequestHandler] = ControlRequestHandler  # 子类可以替换成增加了接口的处理类
+
+    def __init__(self, controller: RunController, port: int, host: str = '127.0.0.1',
+                 token: Optional[str] = None):
+        """
+        本地的状态和控制接口 默认只监听回环地址
+            GET  /status                          运行状态
+            POST /skip?chain=01&idx=2             跳过正在运行的脚本 不传参数时跳过全部
+            POST /abort?chain=01                  中止脚本链
+            POST /extend?seconds=600&chain=01&idx=2  延长超时时间
+        POST 请求需要带上 X-Chainer-Token 请求头 避免本机浏览器打开的网页跨站调用
+            curl -X POST -H "X-Chainer-Token: <密钥>" http://127.0.0.1:<端口>/skip
+        :param controller: 执行器的运行状态
+        :param port: 端口
+        :param host: 监听的地址
+        :param token: 控制接口的密钥 为None时请求头可以是任意值
+        """
+        ThreadingHTTPServer.__init__(self, (host, port), self.handler_class)
+        self.controller: RunController = controller
+        self.token: Optional[str] = token
+        self._thread: Optional[threading.Thread] = None
+
+    def get_status(self) -> dict:
+        """
+        当前快照加上运行时长
+        """
+        now = time.time()
+        snapshot = self.controller.get_snapshot()
+        return {
+            'time': now,
+            'chains': [
+                {
+                    **chain,
+                    'elapsed_seconds': now - chain['start_time'],
+                    'running': [
+                        {**script, 'elapsed_seconds': now - script['start_time']}
+                        for script in chain['running']
+                    ],
+                }
+                for chain in snapshot['chains']
+            ],
+        }
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.serve_forever, name='control_server', daemon=True)
+        self._thread.start()
+        log.info(f'控制接口已启动 http://{self.server_address[0]}:{self.server_address[1]}/status')
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self.shutdown()
+        self.server_close()
+        self._thread = None
@@ -0,0 +1,65 @@
+import threading
+import time
+from typing import Optional
+
+import psutil
+
+
+def _get_busy_and_total(cpu_times) -> tuple[float, float]:
+    """
+    按 psutil.cpu_percent 的方式计算 忙碌时间, 总时间
+    :param cpu_times: psutil.cpu_times() 的结果
+    """
+    total = sum(cpu_times)
+    # Linux 中 guest 已经计入 user 不重复计算
+    total -= getattr(cpu_times, 'guest', 0) + getattr(cpu_times, 'guest_nice', 0)
+    idle = cpu_times.idle + getattr(cpu_times, 'iowait', 0)
+    return total - idle, total
+
+
+class SystemCpuSampler:
+
+    def __init__(self, min_window_seconds: float = 0.1):
+        """
+        系统CPU占用 每个实例保存自己上一次的 cpu_times 用两次之间的差值计算占用
+        psutil.cpu_percent(interval=None) 的基准是整个进程共用的 探针 准入控制 代理状态都调用时会互相重置基准
+        得到的只是两次调用之间很短时间内的占用
+        :param min_window_seconds: 距离上一次基准至少经过这么久 才计算新的占用 太短的时间内系统的时间还没有变化
+        """
+        self.min_window_seconds: float = min_window_seconds
+        self._lock = threading.Lock()  # 代理的状态接口会在多个线程中调用
+        self._last_busy: float = 0
+        self._last_total: float = 0
+        self._last_time: float = 0
+        self._last_percent: Optional[float] = None
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        重新开始计算 之后的占用只统计从现在开始的时间 在经过一个最短时间前为未知
+        """
+        busy, total = _get_busy_and_total(psutil.cpu_times())
+        with self._lock:
+            self._last_busy, self._last_total = busy, total
+            self._last_time = time.monotonic()
+            self._last_percent = None
+
+    def get_percent(self) -> Optional[float]:
+        """
+        上一次计算之后的平均CPU占用 第一次计算时为创建或 reset 之后的平均占用
+        距离上一次计算不足 min_window_seconds 时 返回上一次的结果
+        :return: 0~100 还没有经过一个最短时间时为None 表示未知
+        """
+        now = time.monotonic()
+        busy, total = _get_busy_and_total(psutil.cpu_times())
+        with self._lock:
+            if now - self._last_time < self.min_window_seconds:
+                return self._last_percent
+            total_delta = total - self._last_total
+            if total_delta <= 0:
+                return self._last_percent
+            busy_delta = busy - self._last_busy
+            self._last_busy, self._last_total = busy, total
+            self._last_time = now
+            self._last_percent = min(100.0, max(0.0, busy_delta / total_delta * 100))
+            return self._last_percent
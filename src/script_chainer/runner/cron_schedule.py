@@ -0,0 +1,120 @@
+import datetime
+from typing import Optional
+
+# 常用的简写
+CRON_ALIASES: dict[str, str] = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+}
+
+# 分 时 日 月 星期 的取值范围
+CRON_FIELD_RANGES: list[tuple[int, int]] = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def parse_cron_field(text: str, min_value: int, max_value: int) -> set[int]:
+    """
+    解析cron表达式中的一个字段 支持 * 数字 范围a-b 步长/n 以及用逗号分隔的组合
+    :param text: 字段文本
+    :param min_value: 最小值
+    :param max_value: 最大值
+    :return: 字段允许的值
+    """
+    values: set[int] = set()
+    for part in text.split(','):
+        if '/' in part:
+            range_text, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f'步长必须大于0 {part}')
+        else:
+            range_text = part
+            step = 1
+
+        if range_text == '*':
+            start, end = min_value, max_value
+        elif '-' in range_text:
+            start_text, end_text = range_text.split('-', 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(range_text)
+            end = max_value if '/' in part else start
+
+        if start < min_value or end > max_value or start > end:
+            raise ValueError(f'超出范围 {part} 允许 {min_value}-{max_value}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+
+    def __init__(self, expression: str):
+        """
+        cron表达式 分 时 日 月 星期 星期中0和7都是周日
+        日和星期都不是*时 满足其中一个即可 与cron一致
+        :param expression: 表达式 例如 "30 4 * * *" 或 "@daily"
+        """
+        self.expression: str = expression.strip()
+        fields = CRON_ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f'cron表达式需要5个字段 {expression}')
+
+        try:
+            parsed = [parse_cron_field(text, *value_range) for text, value_range in zip(fields, CRON_FIELD_RANGES)]
+        except ValueError as e:
+            raise ValueError(f'cron表达式非法 {expression} {e}')
+
+        self.minutes: set[int] = parsed[0]
+        self.hours: set[int] = parsed[1]
+        self.days: set[int] = parsed[2]
+        self.months: set[int] = parsed[3]
+        self.weekdays: set[int] = {i % 7 for i in parsed[4]}  # 周日=0
+        self.day_any: bool = fields[2] == '*'
+        self.weekday_any: bool = fields[4] == '*'
+
+    def match_day(self, t: datetime.datetime) -> bool:
+        day_matched = t.day in self.days
+        weekday_matched = (t.weekday() + 1) % 7 in self.weekdays
+        if self.day_any or self.weekday_any:
+            return day_matched and weekday_matched
+        return day_matched or weekday_matched
+
+    def match(self, t: datetime.datetime) -> bool:
+        """
+        这一分钟是否满足表达式
+        """
+        return (t.minute in self.minutes
+                and t.hour in self.hours
+                and t.month in self.months
+                and self.match_day(t))
+
+    def get_next_time(self, after: datetime.datetime) -> Optional[datetime.datetime]:
+        """
+        在某个时间之后 下一次满足表达式的时间
+        不满足的月/日/小时会整体跳过 不需要逐分钟检查
+        :param after: 开始时间 不包括这一分钟
+        :return: 下一次的时间 5年内都没有时返回None (例如2月30日)
+        """
+        t = after.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        end_time = t + datetime.timedelta(days=366 * 5)
+        while t < end_time:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + datetime.timedelta(days=32)).replace(day=1)
+            elif not self.match_day(t):
+                t = t.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + datetime.timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t = t + datetime.timedelta(minutes=1)
+            else:
+                return t
+        return None
+
+
+def is_valid_cron(expression: str) -> bool:
+    try:
+        CronSchedule(expression)
+        return True
+    except ValueError:
+        return False
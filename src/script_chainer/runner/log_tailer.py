@@ -0,0 +1,177 @@
+import codecs
+import glob
+import os
+import re
+import threading
+import time
+from typing import Optional, Callable, Iterator
+
+
+class LogTailer:
+
+    def __init__(self, file_path: str, from_end: bool = True, max_read_bytes: int = 1024 * 1024):
+        """
+        增量读取日志文件的新内容
+        每次只用 stat 检查文件是否有变化 有新内容时才从上次的位置继续读取 不会重复读取整个文件
+        不一直打开文件 避免影响写日志的程序轮转或删除文件
+        轮转的判断
+            - 文件ID变化 (日志被重命名后创建了新文件)
+            - 文件变小 (日志被清空)
+            - 路径中有通配符时 最新修改的匹配文件发生变化 (按日期命名的日志)
+        轮转后从新文件的开头读取 旧文件在上次读取之后写入的内容会被忽略
+        :param file_path: 日志文件路径 可以使用通配符 此时跟踪最新修改的匹配文件
+        :param from_end: 是否从当前文件末尾开始 只读取之后写入的内容
+        :param max_read_bytes: 单次最多读取的字节数 避免日志突然变大时一次读入太多 没读完的内容由 iter_lines 继续读取
+        """
+        self.file_path: str = file_path
+        self.max_read_bytes: int = max_read_bytes
+
+        self.current_path: Optional[str] = None  # 当前跟踪的文件
+        self.offset: int = 0  # 已经读取的位置
+        self._file_id: Optional[tuple[int, int]] = None  # (st_dev, st_ino)
+        self._remainder: str = ''  # 上次读取到的不完整的最后一行
+        self._decoder: codecs.IncrementalDecoder = codecs.getincrementaldecoder('utf-8')(errors='replace')  # 保留分块处被截断的多字节字符
+        self.caught_up: bool = True  # 上次读取后 是否已经读到文件末尾
+
+        if from_end:
+            path, stat_result = self._stat()
+            if stat_result is not None:
+                self.current_path = path
+                self.offset = stat_result.st_size
+                self._file_id = (stat_result.st_dev, stat_result.st_ino)
+
+    def _resolve_path(self) -> Optional[str]:
+        """
+        路径中有通配符时 返回最新修改的匹配文件
+        """
+        if not glob.has_magic(self.file_path):
+            return self.file_path
+        latest_path: Optional[str] = None
+        latest_mtime: float = 0
+        for path in glob.glob(self.file_path):
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            if latest_path is None or mtime > latest_mtime:
+                latest_path = path
+                latest_mtime = mtime
+        return latest_path
+
+    def _stat(self) -> tuple[Optional[str], Optional[os.stat_result]]:
+        path = self._resolve_path()
+        if path is None:
+            return None, None
+        try:
+            return path, os.stat(path)
+        except OSError:
+            return path, None
+
+    def read_lines(self) -> list[str]:
+        """
+        读取上次之后新写入的完整行
+        :return: 新的行 没有变化时为空
+        """
+        path, stat_result = self._stat()
+        if stat_result is None:
+            return []
+
+        file_id = (stat_result.st_dev, stat_result.st_ino)
+        if path != self.current_path or file_id != self._file_id or stat_result.st_size < self.offset:
+            self.current_path = path
+            self._file_id = file_id
+            self.offset = 0
+            self._remainder = ''
+            self._decoder.reset()
+
+        self.caught_up = True
+        if stat_result.st_size == self.offset:
+            return []
+
+        try:
+            with open(path, 'rb') as file:
+                file.seek(self.offset)
+                content = file.read(min(stat_result.st_size - self.offset, self.max_read_bytes))
+        except OSError:
+            return []
+        self.offset += len(content)
+        self.caught_up = len(content) == 0 or self.offset >= stat_result.st_size
+
+        lines = (self._remainder + self._decoder.decode(content)).split('\n')
+        self._remainder = lines.pop()
+        return [i.rstrip('\r') for i in lines]
+
+    def iter_lines(self) -> Iterator[str]:
+        """
+        一直读取到文件当前的末尾 每次最多读取 max_read_bytes 字节
+        日志一次写入很多内容时 不需要等待多个检查间隔才读完
+        调用方找到需要的行后可以停止迭代
+        """
+        while True:
+            yield from self.read_lines()
+            if self.caught_up:
+                return
+
+
+class LogWatcher:
+
+    def __init__(self,
+                 file_path: str,
+                 pattern: str,
+                 changed_callback: Optional[Callable[[], None]] = None,
+                 poll_interval: float = 0.5,
+                 ):
+        """
+        在后台线程中跟踪日志文件 出现匹配正则的行时调用回调
+        只检查开始跟踪之后写入的内容
+        :param file_path: 日志文件路径 可以使用通配符
+        :param pattern: 需要匹配的正则
+        :param changed_callback: 匹配时 会在监听线程中调用这个回调
+        :param poll_interval: 检查文件变化的间隔
+        """
+        self.tailer: LogTailer = LogTailer(file_path)
+        self.pattern: re.Pattern = re.compile(pattern)
+        self.changed_callback: Optional[Callable[[], None]] = changed_callback
+        self.poll_interval: float = poll_interval
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._matched_line: Optional[str] = None  # 匹配的行
+        self._matched_time: Optional[float] = None  # 匹配的时间
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='log_watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    @property
+    def matched(self) -> bool:
+        with self._lock:
+            return self._matched_time is not None
+
+    @property
+    def matched_line(self) -> Optional[str]:
+        with self._lock:
+            return self._matched_line
+
+    @property
+    def matched_time(self) -> Optional[float]:
+        with self._lock:
+            return self._matched_time
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            for line in self.tailer.iter_lines():
+                if self.pattern.search(line):
+                    with self._lock:
+                        self._matched_line = line
+                        self._matched_time = time.time()
+                    if self.changed_callback is not None:
+                        self.changed_callback()
+                    return
+            self._stop_event.wait(self.poll_interval)
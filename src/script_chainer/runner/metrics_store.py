@@ -0,0 +1,152 @@
+import datetime
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+from one_dragon.utils import os_utils
+from one_dragon.utils.log_utils import log
+from script_chainer.runner.run_metrics import ScriptRunMetrics
+
+# 需要统计的指标 字段名 -> 显示名称, 单位换算
+METRIC_COLUMNS: dict[str, tuple[str, float]] = {
+    'total_seconds': ('总耗时(秒)', 1),
+    'create_seconds': ('创建子进程(秒)', 1),
+    'game_appear_seconds': ('游戏出现(秒)', 1),
+    'exit_detect_seconds': ('退出检测(秒)', 1),
+    'script_peak_rss': ('脚本内存峰值(MB)', 1024 * 1024),
+    'script_cpu_seconds': ('脚本CPU(秒)', 1),
+    'game_peak_rss': ('游戏内存峰值(MB)', 1024 * 1024),
+    'game_cpu_seconds': ('游戏CPU(秒)', 1),
+    'teardown_seconds': ('关闭进程(秒)', 1),
+}
+
+
+def percentile(values: list[float], p: float) -> Optional[float]:
+    """
+    线性插值的百分位数
+    :param values: 数值
+    :param p: 百分位 0~100
+    :return: 百分位数 没有数值时返回None
+    """
+    if len(values) == 0:
+        return None
+    sorted_values = sorted(values)
+    pos = (len(sorted_values) - 1) * p / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+
+
+class MetricsStore:
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        脚本运行指标的本地存储 使用SQLite
+        :param db_path: 数据库路径 默认为 .log/script_metrics.db
+        """
+        if db_path is None:
+            db_path = os.path.join(os_utils.get_path_under_work_dir('.log'), 'script_metrics.db')
+        self.db_path: str = db_path
+        self._lock = threading.Lock()
+        self._inited: bool = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        if not self._inited:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS script_run ('
+                'chain_name TEXT, script_idx INTEGER, script_path TEXT, start_time REAL, result TEXT, '
+                + ', '.join(f'{i} REAL' for i in METRIC_COLUMNS.keys())
+                + ')'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_script_run ON script_run (chain_name, script_path, start_time)')
+            # 旧版本的数据库 补充新增的指标
+            existed_columns = {i[1] for i in conn.execute('PRAGMA table_info(script_run)').fetchall()}
+            for column in METRIC_COLUMNS.keys():
+                if column not in existed_columns:
+                    conn.execute(f'ALTER TABLE script_run ADD COLUMN {column} REAL')
+            self._inited = True
+        return conn
+
+    def save(self, metrics: ScriptRunMetrics) -> None:
+        """
+        保存一次运行的指标
+        """
+        columns = ['chain_name', 'script_idx', 'script_path', 'start_time', 'result', *METRIC_COLUMNS.keys()]
+        values = [getattr(metrics, i) for i in columns]
+        with self._lock:
+            try:
+                conn = self._connect()
+                try:
+                    with conn:
+                        conn.execute(
+                            f'INSERT INTO script_run ({", ".join(columns)}) VALUES ({", ".join("?" for _ in columns)})',
+                            values
+                        )
+                finally:
+                    conn.close()
+            except Exception:
+                log.error('保存脚本运行指标失败', exc_info=True)
+
+    def load(self, chain_name: Optional[str] = None) -> list[dict]:
+        """
+        读取运行指标 按开始时间排序
+        :param chain_name: 脚本链名称 为空时读取全部
+        """
+        if not os.path.exists(self.db_path):
+            return []
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.row_factory = sqlite3.Row
+                if chain_name is None:
+                    rows = conn.execute('SELECT * FROM script_run ORDER BY start_time').fetchall()
+                else:
+                    rows = conn.execute('SELECT * FROM script_run WHERE chain_name = ? ORDER BY start_time',
+                                        (chain_name,)).fetchall()
+                return [dict(i) for i in rows]
+            finally:
+                conn.close()
+
+    def build_report(self, chain_name: Optional[str] = None, trend_size: int = 5) -> str:
+        """
+        按脚本统计各个指标的百分位数 以及最近几次的耗时趋势
+        :param chain_name: 脚本链名称 为空时统计全部
+        :param trend_size: 用最近多少次运行 与再之前同样次数的运行比较
+        :return: 报告文本
+        """
+        groups: dict[tuple[str, str], list[dict]] = {}
+        for row in self.load(chain_name):
+            groups.setdefault((row['chain_name'], row['script_path']), []).append(row)
+
+        if len(groups) == 0:
+            return '没有脚本运行记录'
+
+        lines: list[str] = []
+        for (group_chain, script_path), rows in groups.items():
+            last_time = datetime.datetime.fromtimestamp(rows[-1]['start_time']).strftime('%Y-%m-%d %H:%M')
+            lines.append(f'脚本链 {group_chain} | {os.path.basename(script_path)} | 运行 {len(rows)} 次 | 最近 {last_time}')
+            lines.append(f'    {"指标":<16}{"p50":>10}{"p90":>10}{"max":>10}')
+            for column, (display_name, unit) in METRIC_COLUMNS.items():
+                values = [i[column] / unit for i in rows if i[column] is not None]
+                if len(values) == 0:
+                    continue
+                lines.append(f'    {display_name:<16}'
+                             f'{percentile(values, 50):>10.2f}{percentile(values, 90):>10.2f}{max(values):>10.2f}')
+
+            totals = [i['total_seconds'] for i in rows if i['total_seconds'] is not None]
+            if len(totals) >= trend_size * 2:
+                recent = sum(totals[-trend_size:]) / trend_size
+                before = sum(totals[-trend_size * 2:-trend_size]) / trend_size
+                if before > 0:
+                    lines.append(f'    耗时趋势 最近{trend_size}次平均 {recent:.1f}秒 之前{trend_size}次平均 {before:.1f}秒 '
+                                 f'变化 {(recent - before) / before * 100:+.1f}%')
+
+            results: dict[str, int] = {}
+            for row in rows:
+                results[row['result']] = results.get(row['result'], 0) + 1
+            lines.append(f'    运行结果 {" ".join(f"{k}={v}" for k, v in results.items())}')
+            lines.append('')
+
+        return '\n'.join(lines)
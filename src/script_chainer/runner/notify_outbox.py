@@ -0,0 +1,262 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Optional, Any
+
+from one_dragon.utils import os_utils
+from one_dragon.utils.log_utils import log
+
+
+class NotifyOutbox:
+
+    def __init__(self,
+                 push_factory: Callable[[], Optional[Any]],
+                 db_path: Optional[str] = None,
+                 digest_seconds: float = 0,
+                 max_attempts: int = 5,
+                 retry_seconds: float = 10,
+                 lease_seconds: float = 300,
+                 ):
+        """
+        通知的发件箱 脚本链只负责把消息放入队列 由后台线程发送 不会等待网络
+        消息先写入SQLite 执行器异常退出后 下次启动时会继续发送
+        默认立刻发送 发送时已经在队列中的消息合并成一条
+        设置了 digest_seconds 时 第一条消息进入队列后 等待这段时间 期间的消息合并成一条发送
+        每个推送渠道单独重试 只有发送失败(抛出异常或返回非成功的响应)的渠道会重新发送 等待时间每次翻倍
+        多个执行器进程共用同一个数据库 发送前先认领消息 只有认领成功的进程发送 避免重复通知
+        :param push_factory: 获取Push实例 会在后台线程中调用 返回None时认为没有推送渠道
+        :param db_path: 数据库路径 默认为 .log/notify_outbox.db
+        :param digest_seconds: 合并消息的时间窗口 0为不等待
+        :param max_attempts: 每条消息最多的发送次数 超过后放弃
+        :param retry_seconds: 第一次重试前的等待时间
+        :param lease_seconds: 认领后的有效时间 认领的进程异常退出后 超过该时间其它进程可以重新认领
+        """
+        if db_path is None:
+            db_path = os.path.join(os_utils.get_path_under_work_dir('.log'), 'notify_outbox.db')
+        self.db_path: str = db_path
+        self.push_factory: Callable[[], Optional[Any]] = push_factory
+        self.digest_seconds: float = digest_seconds
+        self.max_attempts: int = max_attempts
+        self.retry_seconds: float = retry_seconds
+        self.lease_seconds: float = lease_seconds
+        self.owner_id: str = f'{os.getpid()}_{uuid.uuid4().hex[:8]}'  # 区分共用数据库的进程
+
+        self._db_lock = threading.Lock()
+        self._inited: bool = False
+        self._wake_event = threading.Event()
+        self._flush_all: bool = False  # 关闭时不再等待合并和重试的时间
+        self._thread: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        if not self._inited:
+            # merged=0 等待合并的消息 merged=1 可以发送的消息
+            # channels 还需要发送的渠道 为空时发送到全部渠道
+            # producer 放入消息的进程 owner 正在发送的进程 lease_until 认领的有效时间
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS outbox ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, create_time REAL, content TEXT, '
+                'merged INTEGER, channels TEXT, attempts INTEGER, next_time REAL, '
+                'producer TEXT, owner TEXT, lease_until REAL)'
+            )
+            # 旧版本的数据库 补充新增的列
+            existed_columns = {i[1] for i in conn.execute('PRAGMA table_info(outbox)').fetchall()}
+            for column, column_type in [('producer', 'TEXT'), ('owner', 'TEXT'), ('lease_until', 'REAL')]:
+                if column not in existed_columns:
+                    conn.execute(f'ALTER TABLE outbox ADD COLUMN {column} {column_type}')
+            conn.commit()
+            self._inited = True
+        return conn
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='notify_outbox', daemon=True)
+        self._thread.start()
+
+    def put(self, content: str) -> None:
+        """
+        放入一条消息 只写入本地数据库 立刻返回
+        """
+        now = time.time()
+        with self._db_lock:
+            try:
+                conn = self._connect()
+                try:
+                    with conn:
+                        conn.execute(
+                            'INSERT INTO outbox (create_time, content, merged, channels, attempts, next_time, producer) '
+                            'VALUES (?, ?, 0, NULL, 0, ?, ?)',
+                            (now, content, now, self.owner_id)
+                        )
+                finally:
+                    conn.close()
+            except Exception:
+                log.error('通知放入队列失败', exc_info=True)
+                return
+        self.start()
+        self._wake_event.set()
+
+    def close(self, timeout: float = 30) -> None:
+        """
+        立刻发送本进程放入的消息 最多等待 timeout 秒 没有发送完的消息留到下次启动
+        其它进程的消息由它们自己发送
+        """
+        if self._thread is None:
+            return
+        self._flush_all = True
+        self._wake_event.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            log.error('等待通知发送超时 剩余的通知下次启动时发送')
+
+    def _run(self) -> None:
+        while True:
+            flush_all = self._flush_all
+            try:
+                self._merge(flush_all)
+                wait_seconds = self._deliver_due(flush_all)
+            except Exception:
+                log.error('发送通知失败', exc_info=True)
+                wait_seconds = self.retry_seconds
+
+            if flush_all:  # 关闭时每条消息只再发送一次
+                return
+            self._wake_event.wait(wait_seconds)
+            self._wake_event.clear()
+
+    def _merge(self, flush_all: bool) -> None:
+        """
+        窗口结束后 把等待合并的消息合成一条
+        使用写事务读取 其它进程不会同时合并同一批消息
+        :param flush_all: 只合并本进程的消息 不等待窗口结束
+        """
+        now = time.time()
+        with self._db_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute('BEGIN IMMEDIATE')
+                    if flush_all:
+                        rows = conn.execute(
+                            'SELECT id, create_time, content FROM outbox WHERE merged = 0 AND producer = ? ORDER BY id',
+                            (self.owner_id,)
+                        ).fetchall()
+                    else:
+                        rows = conn.execute(
+                            'SELECT id, create_time, content FROM outbox WHERE merged = 0 ORDER BY id'
+                        ).fetchall()
+                    if len(rows) == 0:
+                        return
+                    if not flush_all and rows[0][1] + self.digest_seconds > now:
+                        return
+                    if len(rows) == 1:
+                        conn.execute('UPDATE outbox SET merged = 1, next_time = ? WHERE id = ?', (now, rows[0][0]))
+                        return
+                    content = '\n'.join(i[2] for i in rows)
+                    conn.execute(
+                        'INSERT INTO outbox (create_time, content, merged, channels, attempts, next_time, producer) '
+                        'VALUES (?, ?, 1, NULL, 0, ?, ?)',
+                        (rows[0][1], content, now, self.owner_id)
+                    )
+                    conn.executemany('DELETE FROM outbox WHERE id = ?', [(i[0],) for i in rows])
+            finally:
+                conn.close()
+
+    def _deliver_due(self, flush_all: bool) -> Optional[float]:
+        """
+        发送已经到时间的消息 每条消息先认领 认领成功才发送
+        :param flush_all: 只发送本进程的消息 不等待重试的时间
+        :return: 距离下一条消息需要处理的秒数 队列为空时返回None
+        """
+        now = time.time()
+        with self._db_lock:
+            conn = self._connect()
+            try:
+                if flush_all:
+                    rows = conn.execute(
+                        'SELECT id, content, channels, attempts FROM outbox WHERE merged = 1 AND producer = ? '
+                        'AND (owner IS NULL OR lease_until < ?) ORDER BY id', (self.owner_id, now)
+                    ).fetchall()
+                else:
+                    rows = conn.execute(
+                        'SELECT id, content, channels, attempts FROM outbox WHERE merged = 1 AND next_time <= ? '
+                        'AND (owner IS NULL OR lease_until < ?) ORDER BY id', (now, now)
+                    ).fetchall()
+            finally:
+                conn.close()
+
+        for row_id, content, channels_text, attempts in rows:
+            if not self._claim(row_id):  # 已经被其它进程认领
+                continue
+            channels: Optional[list[str]] = None if channels_text is None else json.loads(channels_text)
+            failed = self._send(content, channels)
+            attempts += 1
+            with self._db_lock:
+                conn = self._connect()
+                try:
+                    with conn:
+                        if len(failed) == 0:
+                            conn.execute('DELETE FROM outbox WHERE id = ?', (row_id,))
+                        elif attempts >= self.max_attempts:
+                            log.error(f'通知发送失败 已重试{attempts}次 放弃发送 渠道 {failed}')
+                            conn.execute('DELETE FROM outbox WHERE id = ?', (row_id,))
+                        else:
+                            retry_seconds = self.retry_seconds * (2 ** (attempts - 1))
+                            log.error(f'通知发送失败 {retry_seconds:g}秒后重试 渠道 {failed}')
+                            conn.execute(
+                                'UPDATE outbox SET channels = ?, attempts = ?, next_time = ?, owner = NULL, '
+                                'lease_until = NULL WHERE id = ?',
+                                (json.dumps(failed), attempts, time.time() + retry_seconds, row_id)
+                            )
+                finally:
+                    conn.close()
+
+        with self._db_lock:
+            conn = self._connect()
+            try:
+                # 被其它进程认领的消息 等到认领过期再检查
+                row = conn.execute(
+                    'SELECT MIN(CASE WHEN merged = 1 THEN MAX(next_time, COALESCE(lease_until, 0)) '
+                    'ELSE create_time + ? END) FROM outbox',
+                    (self.digest_seconds,)
+                ).fetchone()
+            finally:
+                conn.close()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def _claim(self, row_id: int) -> bool:
+        """
+        认领一条消息 只有一个进程能认领成功
+        :return: 是否认领成功
+        """
+        now = time.time()
+        with self._db_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    cursor = conn.execute(
+                        'UPDATE outbox SET owner = ?, lease_until = ? '
+                        'WHERE id = ? AND (owner IS NULL OR lease_until < ?)',
+                        (self.owner_id, now + self.lease_seconds, row_id, now)
+                    )
+                    return cursor.rowcount == 1
+            finally:
+                conn.close()
+
+    def _send(self, content: str, channels: Optional[list[str]]) -> list[str]:
+        """
+        发送到各个渠道 见 Push.send_channels 推送失败的渠道之后重试
+        :param content: 消息内容
+        :param channels: 需要发送的渠道 为None时发送到全部渠道
+        :return: 发送失败的渠道
+        """
+        push = self.push_factory()
+        if push is None:
+            return []
+        return push.send_channels(content, channels)
@@ -0,0 +1,220 @@
+import collections
+import locale
+import logging
+import os
+import re
+import threading
+from logging.handlers import RotatingFileHandler
+from typing import Optional, BinaryIO, TYPE_CHECKING
+
+from one_dragon.utils import os_utils
+from script_chainer.config.script_plan import ScriptPlan
+from script_chainer.runner.script_run_result import ScriptRunResult
+
+if TYPE_CHECKING:  # asyncio 只在协程执行器中使用 启动时不导入
+    import asyncio
+
+
+def get_output_log_path(chain_name: str, script_config: ScriptPlan) -> str:
+    """
+    脚本输出日志的路径 .log/script_output/<脚本链>_<下标>_<脚本名称>.log
+    """
+    script_name = re.sub(r'[\\/:*?"<>|\s]', '_', os.path.splitext(script_config.script_display_name)[0])
+    log_dir = os_utils.get_path_under_work_dir('.log', 'script_output')
+    return os.path.join(log_dir, f'{chain_name}_{script_config.idx:02d}_{script_name}.log')
+
+
+class ScriptOutputCapture:
+
+    def __init__(self,
+                 log_path: str,
+                 max_bytes: int = 5 * 1024 * 1024,
+                 backup_count: int = 3,
+                 tail_lines: int = 20,
+                 encoding: Optional[str] = None,
+                 ):
+        """
+        捕获脚本子进程的 stdout 和 stderr
+        每个管道由单独的线程或协程持续读取 子进程不会因为管道写满而卡住
+        输出按大小轮转写入日志文件 并在内存中保留最后若干行 用于失败时的通知
+        :param log_path: 日志文件路径
+        :param max_bytes: 单个日志文件的最大字节数
+        :param backup_count: 轮转保留的旧日志数量
+        :param tail_lines: 内存中保留的最后几行
+        :param encoding: 子进程输出的编码 默认为系统编码
+        """
+        self.log_path: str = log_path
+        self.encoding: str = encoding if encoding is not None else locale.getpreferredencoding(False)
+
+        self._lock = threading.Lock()
+        self._tail: collections.deque[str] = collections.deque(maxlen=tail_lines)
+        self._threads: list[threading.Thread] = []
+        self._tasks: list['asyncio.Task'] = []
+        self._reader_count: int = 0  # 还没有读完的管道数量
+        self._closing: bool = False  # 已经调用过 close 最后一个管道读完时关闭日志文件
+        self._handler_closed: bool = False
+
+        # 不注册到 logging 中 避免和执行器自身的日志互相影响
+        self._handler: RotatingFileHandler = RotatingFileHandler(
+            log_path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+        )
+        self._handler.setFormatter(logging.Formatter('[%(asctime)s] [%(stream)s] %(message)s', '%Y-%m-%d %H:%M:%S'))
+        self._logger: logging.Logger = logging.Logger(f'script_output_{log_path}')
+        self._logger.addHandler(self._handler)
+
+    def get_tail(self) -> list[str]:
+        """
+        最后捕获的几行输出
+        """
+        with self._lock:
+            return list(self._tail)
+
+    def attach(self, stdout: Optional[BinaryIO], stderr: Optional[BinaryIO]) -> None:
+        """
+        开始在后台线程中读取 subprocess.Popen 的管道
+        """
+        for stream, name in [(stdout, 'stdout'), (stderr, 'stderr')]:
+            if stream is None:
+                continue
+            with self._lock:
+                self._reader_count += 1
+            thread = threading.Thread(target=self._read_pipe, args=(stream, name),
+                                      name=f'script_output_{name}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def attach_async(self, stdout: Optional['asyncio.StreamReader'], stderr: Optional['asyncio.StreamReader']) -> None:
+        """
+        开始在协程中读取 asyncio 子进程的管道
+        """
+        import asyncio
+        for stream, name in [(stdout, 'stdout'), (stderr, 'stderr')]:
+            if stream is None:
+                continue
+            with self._lock:
+                self._reader_count += 1
+            self._tasks.append(asyncio.get_running_loop().create_task(self._read_stream(stream, name)))
+
+    def close(self, timeout: float = 1) -> None:
+        """
+        等待已经读到的输出写完
+        脚本启动的其它进程可能继承了管道 一直不结束 因此只等待一小段时间 之后的输出会继续写入日志
+        还有管道没有读完时 由最后一个读完的线程或协程关闭日志文件
+        """
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = [i for i in self._threads if i.is_alive()]
+        with self._lock:
+            self._closing = True
+            self._close_handler_if_done()
+
+    async def close_async(self, timeout: float = 1) -> None:
+        """
+        close 的协程版本
+        """
+        import asyncio
+        if len(self._tasks) > 0:
+            await asyncio.wait(self._tasks, timeout=timeout)
+        self._tasks = [i for i in self._tasks if not i.done()]
+        self.close(0)
+
+    def _read_pipe(self, stream: BinaryIO, name: str) -> None:
+        remainder = b''
+        try:
+            while True:
+                data = stream.read1(65536) if hasattr(stream, 'read1') else stream.read(65536)
+                if not data:
+                    break
+                remainder = self._feed(remainder + data, name)
+        except (OSError, ValueError):  # 管道被关闭
+            pass
+        finally:
+            self._flush(remainder, name)
+            try:
+                stream.close()
+            except OSError:
+                pass
+            self._on_reader_done()
+
+    async def _read_stream(self, stream: 'asyncio.StreamReader', name: str) -> None:
+        remainder = b''
+        try:
+            while True:
+                data = await stream.read(65536)
+                if not data:
+                    break
+                remainder = self._feed(remainder + data, name)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._flush(remainder, name)
+            self._on_reader_done()
+
+    def _on_reader_done(self) -> None:
+        """
+        一个管道读完 已经调用过 close 且全部管道都读完时 关闭日志文件
+        """
+        with self._lock:
+            self._reader_count -= 1
+            self._close_handler_if_done()
+
+    def _close_handler_if_done(self) -> None:
+        """
+        需要在 _lock 中调用
+        """
+        if self._closing and self._reader_count <= 0 and not self._handler_closed:
+            self._handler_closed = True
+            self._handler.close()
+
+    def _feed(self, data: bytes, name: str) -> bytes:
+        """
+        写入完整的行
+        :return: 剩余不完整的行
+        """
+        lines = data.split(b'\n')
+        remainder = lines.pop()
+        if len(remainder) > 65536:  # 很长的行不等待换行 直接写入
+            lines.append(remainder)
+            remainder = b''
+        for line in lines:
+            self._write(line, name)
+        return remainder
+
+    def _flush(self, remainder: bytes, name: str) -> None:
+        if len(remainder) > 0:
+            self._write(remainder, name)
+
+    def _write(self, line: bytes, name: str) -> None:
+        text = line.decode(self.encoding, errors='replace').rstrip('\r')
+        with self._lock:
+            self._tail.append(text)
+        self._logger.info(text, extra={'stream': name})
+
+
+def create_output_capture(chain_name: str, script_config: ScriptPlan) -> Optional[ScriptOutputCapture]:
+    """
+    按脚本配置创建输出捕获 没有开启时返回None
+    """
+    if not script_config.capture_output:
+        return None
+    return ScriptOutputCapture(
+        get_output_log_path(chain_name, script_config),
+        max_bytes=int(script_config.output_max_mb * 1024 * 1024),
+        backup_count=script_config.output_backup_count,
+    )
+
+
+def get_done_notify_content(chain_name: str, script_config: ScriptPlan, result: ScriptRunResult,
+                            output_capture: Optional[ScriptOutputCapture] = None) -> str:
+    """
+    脚本结束时的通知内容 没有正常结束时附上运行结果和最后几行输出
+    """
+    content = f'脚本链 {chain_name} 运行结束: {script_config.script_display_name}'
+    if result == ScriptRunResult.SUCCESS:
+        return content
+    content += f' 结果: {result.value}'
+    if output_capture is not None:
+        tail = output_capture.get_tail()
+        if len(tail) > 0:
+            content += '\n最后的输出:\n' + '\n'.join(tail)
+    return content
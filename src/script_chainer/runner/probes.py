@@ -0,0 +1,202 @@
+import re
+import socket
+import time
+
+from script_chainer.config.script_plan import ScriptPlan
+from script_chainer.runner.cpu_sampler import SystemCpuSampler
+from script_chainer.runner.log_tailer import LogTailer
+from script_chainer.runner.process_table import ProcessTable
+
+
+class Probe:
+
+    def __init__(self, display_name: str):
+        """
+        就绪探针 满足条件时 执行器可以提前进入下一步
+        :param display_name: 显示名称
+        """
+        self.display_name: str = display_name
+
+    def check(self) -> bool:
+        """
+        当前是否满足条件
+        """
+        return False
+
+
+class ProcessAppearedProbe(Probe):
+
+    def __init__(self, process_table: ProcessTable, process_name: str):
+        Probe.__init__(self, f'进程已出现 {process_name}')
+        self.process_table: ProcessTable = process_table
+        self.process_name: str = process_name
+
+    def check(self) -> bool:
+        self.process_table.refresh(max_age=0.1)
+        return self.process_table.is_existed(self.process_name)
+
+
+class ProcessGoneProbe(Probe):
+
+    def __init__(self, process_table: ProcessTable, process_name: str):
+        Probe.__init__(self, f'进程已退出 {process_name}')
+        self.process_table: ProcessTable = process_table
+        self.process_name: str = process_name
+
+    def check(self) -> bool:
+        self.process_table.refresh(max_age=0.1)
+        return not self.process_table.is_existed(self.process_name)
+
+
+class CpuBelowProbe(Probe):
+
+    def __init__(self, cpu_percent: float):
+        Probe.__init__(self, f'CPU占用低于 {cpu_percent:g}%')
+        self.cpu_percent: float = cpu_percent
+        self.cpu_sampler: SystemCpuSampler = SystemCpuSampler()  # 从创建探针开始计算
+
+    def check(self) -> bool:
+        cpu_percent = self.cpu_sampler.get_percent()
+        return cpu_percent is not None and cpu_percent < self.cpu_percent  # 刚创建时还没有统计到占用 不满足
+
+
+class LogRegexProbe(Probe):
+
+    def __init__(self, file_path: str, pattern: str):
+        """
+        日志文件中出现匹配正则的内容
+        只检查探针创建之后写入的内容 文件没有变化时不读取
+        """
+        Probe.__init__(self, f'日志出现 {pattern}')
+        self.tailer: LogTailer = LogTailer(file_path)
+        self.pattern: re.Pattern = re.compile(pattern)
+        self.matched: bool = False
+
+    def check(self) -> bool:
+        if not self.matched:
+            self.matched = any(self.pattern.search(line) for line in self.tailer.iter_lines())
+        return self.matched
+
+
+class TcpPortOpenProbe(Probe):
+
+    def __init__(self, port: int, host: str = '127.0.0.1'):
+        """
+        本地TCP端口可以连接
+        """
+        Probe.__init__(self, f'端口已打开 {port}')
+        self.host: str = host
+        self.port: int = port
+
+    def check(self) -> bool:
+        try:
+            with socket.create_connection((self.host, self.port), timeout=0.1):
+                return True
+        except OSError:
+            return False
+
+
+class AdaptiveInterval:
+
+    def __init__(self, min_interval: float = 0.05, max_interval: float = 0.5, factor: float = 1.5):
+        """
+        自适应的检查间隔 刚开始时频繁检查 之后逐渐放慢
+        :param min_interval: 最短间隔
+        :param max_interval: 最长间隔
+        :param factor: 每次放慢的倍数
+        """
+        self.min_interval: float = min_interval
+        self.max_interval: float = max_interval
+        self.factor: float = factor
+        self._current: float = min_interval
+
+    def reset(self) -> None:
+        self._current = self.min_interval
+
+    def next(self) -> float:
+        """
+        :return: 这一次的间隔
+        """
+        interval = self._current
+        self._current = min(self._current * self.factor, self.max_interval)
+        return interval
+
+
+def get_ready_probes(script_config: ScriptPlan, process_table: ProcessTable) -> list[Probe]:
+    """
+    脚本启动后的就绪探针 满足任意一个时认为子进程创建成功
+    需要在创建子进程之前获取 日志探针只检查之后写入的内容
+    """
+    probes: list[Probe] = []
+    if script_config.ready_process_name:
+        probes.append(ProcessAppearedProbe(process_table, script_config.ready_process_name))
+    if script_config.ready_log_file and script_config.ready_log_regex:
+        probes.append(LogRegexProbe(script_config.ready_log_path,
+                                    script_config.ready_log_regex))
+    if script_config.ready_tcp_port > 0:
+        probes.append(TcpPortOpenProbe(script_config.ready_tcp_port))
+    return probes
+
+
+def get_teardown_probes(script_config: ScriptPlan, process_table: ProcessTable) -> list[Probe]:
+    """
+    脚本结束后的收尾探针 全部满足时可以开始下一个脚本
+    """
+    probes: list[Probe] = []
+    if script_config.teardown_wait_game_closed and script_config.game_process_name:
+        probes.append(ProcessGoneProbe(process_table, script_config.game_process_name))
+    if script_config.teardown_cpu_percent > 0:
+        probes.append(CpuBelowProbe(script_config.teardown_cpu_percent))
+    return probes
+
+
+def check_probes(probes: list[Probe]) -> bool:
+    """
+    探针是否全部满足 没有探针时认为不满足 需要等到时间上限
+    """
+    return len(probes) > 0 and all(i.check() for i in probes)
+
+
+def check_probe_results(probes: list[Probe]) -> dict[str, bool]:
+    """
+    检查全部探针 用于显示每个探针的结果
+    :return: 探针显示名称 -> 是否满足
+    """
+    return {i.display_name: i.check() for i in probes}
+
+
+def wait_probes(probes: list[Probe], max_seconds: float, interval: float = 0.2) -> bool:
+    """
+    等待探针全部满足
+    :param probes: 探针
+    :param max_seconds: 最长等待时间
+    :param interval: 检查间隔
+    :return: 是否在时间上限前满足
+    """
+    deadline = time.time() + max_seconds
+    while True:
+        if check_probes(probes):
+            return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+
+
+async def wait_probes_async(probes: list[Probe], max_seconds: float, interval: float = 0.2) -> bool:
+    """
+    等待探针全部满足 协程版本
+    :param probes: 探针
+    :param max_seconds: 最长等待时间
+    :param interval: 检查间隔
+    :return: 是否在时间上限前满足
+    """
+    import asyncio  # 只在协程执行器中使用 启动时不导入
+    deadline = time.time() + max_seconds
+    while True:
+        if check_probes(probes):
+            return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        await asyncio.sleep(min(interval, remaining))
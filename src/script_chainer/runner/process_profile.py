@@ -0,0 +1,138 @@
+import os
+import sys
+import threading
+from typing import Optional
+
+import psutil
+
+from one_dragon.utils.log_utils import log
+from script_chainer.config.script_config import ProcessPriority, str_to_cpu_list
+
+
+def get_priority_value(priority: str) -> Optional[int]:
+    """
+    优先级配置 转化成 psutil.Process.nice 的参数
+    Windows下为优先级类别 其它系统为nice值
+    :param priority: 优先级配置 ProcessPriority 的值
+    :return: 为空或非法时返回None 表示不修改
+    """
+    if sys.platform == 'win32':
+        mapping = {
+            ProcessPriority.IDLE.value.value: psutil.IDLE_PRIORITY_CLASS,
+            ProcessPriority.BELOW_NORMAL.value.value: psutil.BELOW_NORMAL_PRIORITY_CLASS,
+            ProcessPriority.NORMAL.value.value: psutil.NORMAL_PRIORITY_CLASS,
+            ProcessPriority.ABOVE_NORMAL.value.value: psutil.ABOVE_NORMAL_PRIORITY_CLASS,
+            ProcessPriority.HIGH.value.value: psutil.HIGH_PRIORITY_CLASS,
+        }
+    else:
+        mapping = {
+            ProcessPriority.IDLE.value.value: 19,
+            ProcessPriority.BELOW_NORMAL.value.value: 10,
+            ProcessPriority.NORMAL.value.value: 0,
+            ProcessPriority.ABOVE_NORMAL.value.value: -5,
+            ProcessPriority.HIGH.value.value: -10,
+        }
+    return mapping.get(priority)
+
+
+class ProcessProfile:
+
+    def __init__(self, name: str, priority: Optional[int], affinity: Optional[list[int]],
+                 by_name: bool = False,
+                 existing_keys: Optional[set[tuple[int, float]]] = None,
+                 skip_process_name: Optional[str] = None):
+        """
+        进程树的调度设置 优先级和可以使用的CPU
+        每个进程只设置一次 之后出现的子进程在被发现时设置
+        多个跟踪共用同一个设置 同一个进程不会重复设置
+        :param name: 显示名称 用于日志
+        :param priority: psutil.Process.nice 的参数 为None时不修改
+        :param affinity: 可以使用的CPU下标 为None时不修改
+        :param by_name: 是否可以用于按名称找到的进程 为False时只用于执行器创建的进程树 避免修改同名的无关进程
+        :param existing_keys: 开始运行前已经存在的同名进程 (pid, 创建时间) 不设置这些进程
+        :param skip_process_name: 不设置这个名称的进程 脚本启动的游戏进程使用游戏的设置
+        """
+        self.name: str = name
+        self.priority: Optional[int] = priority
+        self.affinity: Optional[list[int]] = affinity
+        self.by_name: bool = by_name
+        self.existing_keys: set[tuple[int, float]] = existing_keys if existing_keys is not None else set()
+        self.skip_process_name: Optional[str] = skip_process_name
+        self._lock = threading.Lock()
+        self._applied: set[tuple[int, float]] = set()  # 已经设置过的进程 (pid, 创建时间)
+        self._error_logged: bool = False  # 设置失败只记录一次日志 避免每次采样都输出
+
+    def apply(self, proc: psutil.Process, key: tuple[int, float]) -> None:
+        """
+        对新发现的进程设置优先级和CPU
+        :param proc: 进程
+        :param key: (pid, 创建时间) 用于区分复用的PID
+        """
+        if key in self.existing_keys:
+            return
+        with self._lock:
+            if key in self._applied:
+                return
+            self._applied.add(key)
+        try:
+            if self.skip_process_name and proc.name() == self.skip_process_name:
+                return
+            if self.priority is not None:
+                proc.nice(self.priority)
+            if self.affinity is not None and hasattr(proc, 'cpu_affinity'):  # macOS 不支持
+                proc.cpu_affinity(self.affinity)
+        except psutil.NoSuchProcess:
+            pass
+        except psutil.Error:
+            if not self._error_logged:
+                log.error(f'设置{self.name}进程的优先级或CPU失败 {proc.pid}', exc_info=True)
+                self._error_logged = True
+
+
+def get_available_cpu_list(name: str, affinity: str) -> Optional[list[int]]:
+    """
+    CPU列表的文本 转化成本机存在的CPU下标
+    配置可能在核心更多的机器上编辑 本机不存在的CPU忽略并记录日志 不影响脚本运行
+    :param name: 显示名称 用于日志
+    :param affinity: CPU列表的文本
+    :return: 没有配置或本机一个都不存在时返回None 表示不修改
+    """
+    if not affinity:
+        return None
+    try:
+        cpu_list = str_to_cpu_list(affinity)
+    except ValueError:
+        log.error(f'{name}进程的CPU配置非法 不设置CPU {affinity}')
+        return None
+    cpu_count = os.cpu_count()
+    if cpu_count is None:
+        return cpu_list if cpu_list else None
+    available = [i for i in cpu_list if i < cpu_count]
+    if len(available) < len(cpu_list):
+        if len(available) == 0:
+            log.error(f'{name}进程配置的CPU在本机都不存在 不设置CPU {affinity} 本机CPU数量 {cpu_count}')
+        else:
+            log.error(f'{name}进程配置的部分CPU在本机不存在 只使用 {available} 本机CPU数量 {cpu_count}')
+    return available if available else None
+
+
+def create_process_profile(name: str, priority: str, affinity: str,
+                           by_name: bool = False,
+                           existing_keys: Optional[set[tuple[int, float]]] = None,
+                           skip_process_name: Optional[str] = None) -> Optional[ProcessProfile]:
+    """
+    按脚本配置创建进程树的调度设置
+    :param name: 显示名称 用于日志
+    :param priority: 优先级配置
+    :param affinity: CPU列表的文本
+    :param by_name: 是否可以用于按名称找到的进程
+    :param existing_keys: 开始运行前已经存在的同名进程 不设置这些进程
+    :param skip_process_name: 不设置这个名称的进程
+    :return: 都没有配置时返回None
+    """
+    priority_value = get_priority_value(priority)
+    cpu_list = get_available_cpu_list(name, affinity)
+    if priority_value is None and cpu_list is None:
+        return None
+    return ProcessProfile(name, priority_value, cpu_list,
+                          by_name=by_name, existing_keys=existing_keys, skip_process_name=skip_process_name)
@@ -0,0 +1,109 @@
+import threading
+import time
+from typing import Optional
+
+import psutil
+
+
+class ProcessTable:
+
+    def __init__(self):
+        """
+        系统进程表的快照 维护 进程名称 -> PID 的索引
+        第一次刷新时扫描全部进程 之后只对比PID集合 仅读取新增进程的名称
+        所有需要判断进程是否存在的地方共用同一份快照 避免重复扫描
+        """
+        self._lock = threading.RLock()
+        self._pid_to_proc: dict[int, psutil.Process] = {}
+        self._pid_to_name: dict[int, Optional[str]] = {}  # 无法读取名称的进程 记录为None 避免反复读取
+        self._name_to_pids: dict[str, set[int]] = {}
+        self.refresh_time: float = 0  # 上次刷新的时间
+
+    def refresh(self, max_age: float = 0) -> None:
+        """
+        刷新快照
+        :param max_age: 快照的最长有效时间 快照比这个时间新的话 不进行刷新
+        """
+        with self._lock:
+            now = time.time()
+            if max_age > 0 and now - self.refresh_time < max_age:
+                return
+
+            current_pids = set(psutil.pids())
+            known_pids = set(self._pid_to_name.keys())
+
+            for pid in known_pids - current_pids:
+                self._remove(pid)
+
+            for pid in current_pids - known_pids:
+                self._add(pid)
+
+            self.refresh_time = now
+
+    def _add(self, pid: int) -> None:
+        try:
+            proc = psutil.Process(pid)
+            name = proc.name()
+        except (psutil.AccessDenied, psutil.ZombieProcess):  # ZombieProcess 是 NoSuchProcess 的子类 需要先捕获
+            self._pid_to_name[pid] = None
+            return
+        except psutil.NoSuchProcess:
+            return
+
+        self._pid_to_proc[pid] = proc
+        self._pid_to_name[pid] = name
+        if name not in self._name_to_pids:
+            self._name_to_pids[name] = set()
+        self._name_to_pids[name].add(pid)
+
+    def _remove(self, pid: int) -> None:
+        name = self._pid_to_name.pop(pid, None)
+        self._pid_to_proc.pop(pid, None)
+        if name is None:
+            return
+        pids = self._name_to_pids.get(name)
+        if pids is None:
+            return
+        pids.discard(pid)
+        if len(pids) == 0:
+            del self._name_to_pids[name]
+
+    def get_processes(self, process_name: str) -> list[psutil.Process]:
+        """
+        获取快照中名称匹配的进程
+        会排除已经结束 或PID被复用的进程
+        :param process_name: 进程名称
+        :return: 匹配的进程
+        """
+        result: list[psutil.Process] = []
+        if process_name is None or len(process_name) == 0:
+            return result
+
+        with self._lock:
+            for pid in list(self._name_to_pids.get(process_name, [])):
+                proc = self._pid_to_proc[pid]
+                if proc.is_running():
+                    result.append(proc)
+                else:
+                    self._remove(pid)
+
+        return result
+
+    def is_existed(self, process_name: str) -> bool:
+        """
+        判断快照中进程是否存在
+        :param process_name: 进程名称
+        :return: 是否存在
+        """
+        return len(self.get_processes(process_name)) > 0
+
+    def kill(self, process_name: str) -> None:
+        """
+        关闭快照中名称匹配的进程
+        :param process_name: 进程名称
+        """
+        for proc in self.get_processes(process_name):
+            try:
+                proc.kill()
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                pass
@@ -0,0 +1,195 @@
+import time
+from typing import Optional
+
+import psutil
+
+from one_dragon.utils.log_utils import log
+from script_chainer.config.script_plan import ScriptPlan
+from script_chainer.runner.process_tree_watcher import ProcessTreeWatcher
+from script_chainer.runner.process_watcher import is_process_alive
+from script_chainer.runner.run_metrics import ScriptRunMetrics
+from script_chainer.runner.script_run_result import ScriptRunResult
+
+# 这些结果需要关闭整个进程树 不论配置是否在结束后关闭
+FORCE_TEARDOWN_RESULTS: list[ScriptRunResult] = [
+    ScriptRunResult.OVER_LIMIT,
+    ScriptRunResult.HUNG,
+    ScriptRunResult.SKIPPED,
+]
+
+
+class TeardownReport:
+
+    def __init__(self):
+        """
+        一次关闭进程的结果
+        """
+        self.total: int = 0  # 需要关闭的进程数量
+        self.terminated: int = 0  # 收到结束信号后自行退出的数量
+        self.killed: int = 0  # 强制关闭的数量
+        self.remaining: list[int] = []  # 强制关闭后仍在运行的进程
+        self.seconds: float = 0  # 关闭的耗时
+
+    @property
+    def message(self) -> str:
+        message = (f'关闭进程 {self.total}个 用时 {self.seconds:.2f}秒 '
+                   f'正常退出 {self.terminated}个 强制关闭 {self.killed}个')
+        if len(self.remaining) > 0:
+            message += f' 仍在运行 {self.remaining}'
+        return message
+
+
+def _signal_all(processes: list[psutil.Process], kill: bool) -> None:
+    """
+    先向全部进程发出信号 再统一等待 不逐个等待
+    """
+    for proc in processes:
+        try:
+            if kill:
+                proc.kill()
+            else:
+                proc.terminate()
+        except psutil.NoSuchProcess:
+            pass
+        except Exception:
+            log.error(f'关闭进程失败 {proc.pid}', exc_info=True)
+
+
+def _wait_all(processes: list[psutil.Process], timeout: float) -> list[psutil.Process]:
+    """
+    等待进程退出 已退出但未被回收的进程也算退出
+    没有使用 psutil.wait_procs 它会把父进程还未回收的进程当作仍在运行 需要等到init回收
+    :return: 超时后仍在运行的进程
+    """
+    deadline = time.time() + timeout
+    interval = 0.01
+    alive = [i for i in processes if is_process_alive(i)]
+    while len(alive) > 0 and time.time() < deadline:
+        time.sleep(min(interval, max(0.0, deadline - time.time())))
+        interval = min(interval * 2, 0.2)
+        alive = [i for i in alive if is_process_alive(i)]
+    return alive
+
+
+def teardown_processes(processes: list[psutil.Process],
+                       terminate_timeout: float = 10,
+                       kill_timeout: float = 5) -> TeardownReport:
+    """
+    关闭一组进程 并确认它们已经退出
+    先向全部进程发出结束信号 等待 terminate_timeout 秒 仍未退出的进程再强制关闭
+    Windows下结束信号与强制关闭相同
+    :param processes: 需要关闭的进程 一般是脚本和游戏的进程树
+    :param terminate_timeout: 发出结束信号后等待退出的时间
+    :param kill_timeout: 强制关闭后等待退出的时间
+    :return: 关闭的结果
+    """
+    start_time = time.time()
+    report = TeardownReport()
+
+    targets: dict[int, psutil.Process] = {}
+    for proc in processes:
+        if proc.pid not in targets and is_process_alive(proc):
+            targets[proc.pid] = proc
+    target_list = list(targets.values())
+    report.total = len(target_list)
+
+    if report.total > 0:
+        _signal_all(target_list, kill=False)
+        alive = _wait_all(target_list, terminate_timeout)
+        report.terminated = report.total - len(alive)
+
+        if len(alive) > 0:
+            _signal_all(alive, kill=True)
+            remaining = _wait_all(alive, kill_timeout)
+            report.killed = len(alive) - len(remaining)
+            report.remaining = [i.pid for i in remaining]
+
+    report.seconds = time.time() - start_time
+    return report
+
+
+def get_tree_watcher_processes(tree_watcher: Optional[ProcessTreeWatcher]) -> list[psutil.Process]:
+    """
+    进程树跟踪中仍在运行的进程 以及它们的子进程
+    包括已经被收养 不再是子进程后代的孤儿进程
+    """
+    if tree_watcher is None:
+        return []
+    result: dict[int, psutil.Process] = {}
+    for proc in tree_watcher.refresh():
+        result.setdefault(proc.pid, proc)
+        try:
+            for child in proc.children(recursive=True):
+                result.setdefault(child.pid, child)
+        except psutil.Error:
+            pass
+    return list(result.values())
+
+
+def get_teardown_processes(script_config: ScriptPlan, metrics: ScriptRunMetrics,
+                           result: ScriptRunResult,
+                           tree_watcher: Optional[ProcessTreeWatcher] = None) -> list[psutil.Process]:
+    """
+    脚本结束后需要关闭的进程 使用运行中跟踪的进程树 不按名称扫描全部进程
+    被强制结束的脚本 关闭脚本和游戏的整个进程树
+    正常结束时 按配置关闭脚本或游戏的进程树 只关闭脚本时 保留脚本启动的游戏进程
+    :param script_config: 脚本配置
+    :param metrics: 运行指标 包含脚本和游戏的进程树 还没有开始采样时只使用进程树跟踪
+    :param result: 运行结果
+    :param tree_watcher: 脚本子进程的进程树跟踪 与采样的进程树合并 包括被收养的孤儿进程
+    :return: 需要关闭的进程
+    """
+    force = result in FORCE_TEARDOWN_RESULTS
+    kill_script = force or script_config.kill_script_after_done
+    kill_game = force or script_config.kill_game_after_done
+
+    game_processes: list[psutil.Process] = []
+    if metrics.game_sampler is not None and (kill_game or kill_script):
+        # 配置了结束后关闭游戏时 包括开始运行前已经打开的游戏 只是被强制结束时 只关闭开始运行后出现的游戏
+        game_processes = metrics.game_sampler.get_tree_processes(
+            force_refresh=True, include_existing=script_config.kill_game_after_done,
+        )
+    game_pids = {i.pid for i in game_processes}
+
+    processes: list[psutil.Process] = []
+    if kill_script:
+        script_processes = get_tree_watcher_processes(tree_watcher)
+        if metrics.script_sampler is not None:
+            script_processes.extend(metrics.script_sampler.get_tree_processes(force_refresh=True))
+        processes.extend(i for i in script_processes if kill_game or i.pid not in game_pids)
+    if kill_game:
+        processes.extend(game_processes)
+    return processes
+
+
+def teardown_script(script_config: ScriptPlan, metrics: ScriptRunMetrics,
+                    result: ScriptRunResult,
+                    tree_watcher: Optional[ProcessTreeWatcher] = None) -> Optional[TeardownReport]:
+    """
+    脚本结束后关闭需要关闭的进程 返回前确认进程已经退出 避免下一个游戏启动时 上一个游戏仍占用显卡和硬盘
+    :param tree_watcher: 脚本子进程的进程树跟踪
+    :return: 关闭的结果 没有仍在运行的进程需要关闭时返回None
+    """
+    report = teardown_processes(get_teardown_processes(script_config, metrics, result, tree_watcher))
+    return report if report.total > 0 else None
+
+
+def teardown_startup_tree(root_pid: Optional[int],
+                          tree_watcher: Optional[ProcessTreeWatcher]) -> Optional[TeardownReport]:
+    """
+    启动阶段被跳过 启动超时 或子进程异常退出需要重新创建时 关闭这次创建的整个进程树
+    只关闭子进程会留下它启动的进程 重新创建后会同时运行多份
+    :param root_pid: 仍在运行的子进程 已经退出并被回收时为None 避免按复用的PID关闭其它进程
+    :param tree_watcher: 子进程的进程树跟踪 包括被收养的孤儿进程
+    :return: 关闭的结果 没有仍在运行的进程需要关闭时返回None
+    """
+    processes = get_tree_watcher_processes(tree_watcher)
+    if root_pid is not None:  # 进程树跟踪可能还没有开始检查 子进程和它的后代需要单独加入
+        try:
+            root = psutil.Process(root_pid)
+            processes.append(root)
+            processes.extend(root.children(recursive=True))
+        except psutil.Error:
+            pass
+    report = teardown_processes(processes)
+    return report if report.total > 0 else None
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+from typing import Optional, Callable
+
+import psutil
+
+from script_chainer.runner.process_table import ProcessTable
+from script_chainer.runner.process_watcher import ProcessWatcher, is_process_alive
+
+
+class ProcessTreeWatcher(ProcessWatcher):
+
+    def __init__(self,
+                 process_table: ProcessTable,
+                 root_pid: int,
+                 changed_callback: Optional[Callable[[], None]] = None,
+                 poll_interval: float = 0.5,
+                 fast_poll_interval: float = 0.05,
+                 fast_poll_seconds: float = 3,
+                 root_create_time: Optional[float] = None,
+                 joined_callback: Optional[Callable[[psutil.Process, tuple[int, float]], None]] = None,
+                 ):
+        """
+        在后台线程中跟踪执行器创建的子进程及其全部后代进程 不需要进程名称
+        每次只检查新出现的PID 父进程属于进程树 且创建时间不早于父进程时 加入进程树
+        父进程已经退出的孤儿进程 只要父进程ID仍指向进程树中的进程 也能通过创建时间识别出来
+        Linux下孤儿进程会被init或subreaper收养 父进程ID不再指向进程树
+        因此子进程是会话首进程时(创建时使用 start_new_session) 同一会话中创建时间不早于子进程的进程也加入进程树
+        自己调用 setsid 离开会话的后代进程仍然无法识别
+        进程树中的进程全部退出时 认为进程树为空
+        :param process_table: 共用的进程表快照
+        :param root_pid: 执行器创建的子进程
+        :param changed_callback: 进程树出现或全部退出时 会在监听线程中调用这个回调
+        :param poll_interval: 检查新进程的间隔
+        :param fast_poll_interval: 加快检查时的间隔
+        :param fast_poll_seconds: 开始跟踪和有新进程加入后 加快检查的时间
+        :param root_create_time: 创建子进程前的时间 子进程在开始跟踪前已经被回收时代替它的创建时间
+            为None且子进程已经被回收时 不知道子进程的创建时间 不接受任何进程 避免把复用了PID的进程当作后代
+        :param joined_callback: 进程加入进程树时 在监听线程中调用 参数为 进程, (pid, 创建时间) 用于立刻设置调度
+        """
+        ProcessWatcher.__init__(self, process_table, f'pid_{root_pid}', changed_callback=changed_callback,
+                                scan_interval=poll_interval, wait_interval=poll_interval)
+        self.root_pid: int = root_pid
+        self.fast_poll_interval: float = fast_poll_interval
+        self.fast_poll_seconds: float = fast_poll_seconds
+        self.root_create_time: Optional[float] = root_create_time
+        self.joined_callback: Optional[Callable[[psutil.Process, tuple[int, float]], None]] = joined_callback
+        self._fast_poll_until: float = 0  # 在这个时间之前加快检查
+
+        self._members: dict[int, float] = {}  # 曾经属于进程树的进程 PID -> 创建时间
+        self._alive: dict[int, psutil.Process] = {}  # 进程树中仍在运行的进程
+        self._known_pids: set[int] = set()  # 上次检查时系统中的PID
+        self._scan_lock = threading.Lock()  # 监听线程和 refresh 都会检查新进程
+        self._session_id: Optional[int] = None  # 子进程是会话首进程时的会话ID 用于识别被收养的孤儿进程
+        self._session_create_time: float = 0  # 会话中的进程创建时间不早于这个时间才加入
+
+    def start(self) -> None:
+        """
+        开始跟踪 应该在子进程创建后尽快调用 避免错过很快退出的中间进程
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=f'process_tree_watcher_{self.root_pid}', daemon=True)
+        self._thread.start()
+
+    def get_processes(self) -> list[psutil.Process]:
+        """
+        进程树中仍在运行的进程
+        """
+        with self._lock:
+            return list(self._alive.values())
+
+    def refresh(self) -> list[psutil.Process]:
+        """
+        立刻检查一次新出现的进程 停止跟踪后也可以调用
+        关闭进程树前调用 避免漏掉监听线程还没有检查到的进程
+        :return: 进程树中仍在运行的进程
+        """
+        self._scan_new_processes()
+        return self.get_processes()
+
+    def _run(self) -> None:
+        root: Optional[psutil.Process] = None
+        root_create_time: Optional[float] = None
+        try:
+            root = psutil.Process(self.root_pid)
+            root_create_time = root.create_time()
+        except psutil.Error:  # 子进程已经退出并被回收 只能按PID匹配它的子进程
+            root = None
+            if self.root_create_time is not None:
+                # psutil 的创建时间按开机时间换算 开机时间只精确到秒 与 time.time() 可能相差1秒
+                root_create_time = self.root_create_time - 1
+
+        if root_create_time is not None:
+            with self._lock:
+                self._members[self.root_pid] = root_create_time
+                if root is not None:
+                    self._alive[self.root_pid] = root
+            if root is not None and self.joined_callback is not None:
+                self.joined_callback(root, (self.root_pid, root_create_time))
+            if hasattr(os, 'getsid'):
+                try:
+                    # 会话ID等于子进程的PID 说明子进程是会话首进程 会话中的进程都来自子进程
+                    # 子进程已经被回收时 会话仍然以它的PID为ID
+                    if root is None or os.getsid(self.root_pid) == self.root_pid:
+                        self._session_id = self.root_pid
+                        self._session_create_time = root_create_time
+                except OSError:
+                    pass
+        self._fast_poll_until = time.time() + self.fast_poll_seconds
+        self._scan_new_processes()
+        self._update_existed(True)
+
+        while not self._stop_event.is_set():
+            interval = self.fast_poll_interval if time.time() < self._fast_poll_until else self.wait_interval
+            self._wait_processes(self.get_processes(), interval)
+            self._scan_new_processes()
+
+            with self._lock:
+                for pid, proc in list(self._alive.items()):
+                    if not is_process_alive(proc):
+                        del self._alive[pid]
+                empty = len(self._alive) == 0
+
+            if empty:  # 进程树不会再出现新的进程 结束跟踪
+                self._update_existed(False)
+                self._stop_event.set()
+
+    def _scan_new_processes(self) -> None:
+        """
+        检查新出现的进程是否属于进程树
+        新进程之间也可能是父子关系 因此重复检查直到没有新加入的进程
+        """
+        with self._scan_lock:
+            self._scan_new_processes_locked()
+
+    def _scan_new_processes_locked(self) -> None:
+        current_pids = set(psutil.pids())
+        new_pids = current_pids - self._known_pids
+        self._known_pids = current_pids
+
+        if len(self._members) == 0:  # 不知道子进程的创建时间 不接受任何进程
+            return
+
+        candidates: dict[int, tuple[int, float, psutil.Process]] = {}
+        orphans: set[int] = set()  # 同一会话中 被收养的孤儿进程
+        for pid in new_pids:
+            if pid in self._members:
+                continue
+            try:
+                proc = psutil.Process(pid)
+                with proc.oneshot():
+                    candidates[pid] = (proc.ppid(), proc.create_time(), proc)
+            except psutil.Error:
+                continue
+            if self._session_id is not None:
+                try:
+                    if os.getsid(pid) == self._session_id and candidates[pid][1] >= self._session_create_time - 0.01:
+                        orphans.add(pid)
+                except OSError:
+                    pass
+
+        with self._lock:
+            while True:
+                joined = [
+                    pid
+                    for pid, (ppid, create_time, _) in candidates.items()
+                    if pid in orphans or (ppid in self._members and create_time >= self._members[ppid] - 0.01)
+                ]
+                if len(joined) == 0:
+                    break
+                for pid in joined:
+                    _, create_time, proc = candidates.pop(pid)
+                    self._members[pid] = create_time
+                    self._alive[pid] = proc
+                    if self.joined_callback is not None:
+                        self.joined_callback(proc, (pid, create_time))
+                self._fast_poll_until = time.time() + self.fast_poll_seconds
@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+from typing import Optional, Callable
+
+import psutil
+
+from script_chainer.runner.process_profile import ProcessProfile
+from script_chainer.runner.process_table import ProcessTable
+
+
+def is_process_alive(proc: psutil.Process) -> bool:
+    """
+    进程是否仍在运行 已退出但未被回收的进程也算退出
+    """
+    try:
+        return proc.is_running() and proc.status() != psutil.STATUS_ZOMBIE
+    except psutil.Error:
+        return False
+
+
+def is_own_child(proc: psutil.Process) -> bool:
+    """
+    是否执行器自己创建的子进程
+    """
+    try:
+        return proc.ppid() == os.getpid()
+    except psutil.Error:
+        return False
+
+
+class ProcessWatcher:
+
+    def __init__(self,
+                 process_table: ProcessTable,
+                 process_name: str,
+                 changed_callback: Optional[Callable[[], None]] = None,
+                 scan_interval: float = 1,
+                 wait_interval: float = 1,
+                 profile: Optional[ProcessProfile] = None,
+                 ):
+        """
+        在后台线程中监听一个进程名称对应的进程
+        进程出现之前按间隔扫描 找到进程之后阻塞等待它们退出
+        只有在已知进程全部退出之后 才重新扫描一次确认是否有新的同名进程
+        :param process_table: 共用的进程表快照
+        :param process_name: 进程名称
+        :param changed_callback: 进程出现或全部退出时 会在监听线程中调用这个回调
+        :param scan_interval: 未找到进程时 重新扫描的间隔
+        :param wait_interval: 等待进程退出时 单次阻塞的最长时间 用于及时响应停止
+        :param profile: 进程的调度设置 找到进程时立刻设置
+        """
+        self.process_table: ProcessTable = process_table
+        self.process_name: str = process_name
+        self.changed_callback: Optional[Callable[[], None]] = changed_callback
+        self.scan_interval: float = scan_interval
+        self.wait_interval: float = wait_interval
+        self.profile: Optional[ProcessProfile] = profile
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._processes: list[psutil.Process] = []  # 当前跟踪的进程
+        self._current_existed: bool = False  # 进程当前是否存在
+        self._ever_existed: bool = False  # 进程是否曾经存在
+        self._closed_time: Optional[float] = None  # 进程全部退出的时间
+        self._first_existed_time: Optional[float] = None  # 进程第一次出现的时间
+
+    def start(self) -> None:
+        """
+        开始监听
+        """
+        if self._thread is not None:
+            return
+        if self.process_name is None or len(self.process_name) == 0:
+            return
+        self._thread = threading.Thread(target=self._run, name=f'process_watcher_{self.process_name}', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        停止监听 不等待后台线程结束
+        """
+        self._stop_event.set()
+
+    @property
+    def current_existed(self) -> bool:
+        with self._lock:
+            return self._current_existed
+
+    @property
+    def ever_existed(self) -> bool:
+        with self._lock:
+            return self._ever_existed
+
+    @property
+    def closed(self) -> bool:
+        """
+        进程曾经存在 但现在已经全部退出
+        """
+        with self._lock:
+            return self._ever_existed and not self._current_existed
+
+    @property
+    def closed_time(self) -> Optional[float]:
+        with self._lock:
+            return self._closed_time
+
+    @property
+    def first_existed_time(self) -> Optional[float]:
+        with self._lock:
+            return self._first_existed_time
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            if len(self._processes) == 0:
+                # 多个监听共用快照 避免同一时间重复扫描
+                self.process_table.refresh(max_age=self.scan_interval / 2)
+                processes = self._get_alive_processes()
+                if len(processes) == 0:
+                    self._stop_event.wait(self.scan_interval)
+                    continue
+                self._processes = processes
+                self._update_existed(True)
+
+            alive = self._wait_processes(self._processes, self.wait_interval)
+            if len(alive) > 0:
+                self._processes = alive
+                continue
+
+            # 已知进程全部退出 重新扫描一次 确认期间没有启动新的同名进程
+            self.process_table.refresh()
+            self._processes = self._get_alive_processes()
+            if len(self._processes) == 0:
+                self._update_existed(False)
+
+    def _get_alive_processes(self) -> list[psutil.Process]:
+        processes = [i for i in self.process_table.get_processes(self.process_name) if is_process_alive(i)]
+        if self.profile is not None:
+            for proc in processes:
+                try:
+                    self.profile.apply(proc, (proc.pid, proc.create_time()))
+                except psutil.Error:
+                    pass
+        return processes
+
+    def _wait_processes(self, processes: list[psutil.Process], timeout: float) -> list[psutil.Process]:
+        """
+        等待进程退出
+        执行器自己创建的子进程由执行器回收 这里只检查状态 不能等待 否则会抢先回收导致执行器拿不到退出码
+        :return: 仍在运行的进程
+        """
+        own_children: list[psutil.Process] = []
+        others: list[psutil.Process] = []
+        for proc in processes:
+            if is_own_child(proc):
+                own_children.append(proc)
+            else:
+                others.append(proc)
+
+        if len(own_children) > 0:
+            timeout = min(timeout, 0.2)
+        if len(others) > 0:
+            _, alive = psutil.wait_procs(others, timeout=timeout)
+        else:
+            alive = []
+            self._stop_event.wait(timeout)
+
+        return alive + [i for i in own_children if is_process_alive(i)]
+
+    def _update_existed(self, existed: bool) -> None:
+        with self._lock:
+            if self._current_existed == existed:
+                return
+            self._current_existed = existed
+            if existed:
+                if not self._ever_existed:
+                    self._first_existed_time = time.time()
+                self._ever_existed = True
+                self._closed_time = None
+            else:
+                self._closed_time = time.time()
+
+        if self.changed_callback is not None:
+            self.changed_callback()
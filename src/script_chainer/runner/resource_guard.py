@@ -0,0 +1,211 @@
+import threading
+import time
+from typing import Optional, Callable
+
+import psutil
+
+from script_chainer.config.script_plan import ScriptPlan
+from script_chainer.runner.cpu_sampler import SystemCpuSampler
+from script_chainer.runner.run_metrics import ScriptRunMetrics
+
+
+class AdmissionController:
+
+    def __init__(self,
+                 min_available_memory_mb: float = 0,
+                 max_cpu_percent: float = 0,
+                 max_wait_seconds: float = 600,
+                 check_interval: float = 2,
+                 ):
+        """
+        准入控制 系统剩余资源足够时才开始下一个脚本
+        :param min_available_memory_mb: 系统可用内存需要不少于该值 0为不检查
+        :param max_cpu_percent: 系统CPU占用需要低于该值 0为不检查
+        :param max_wait_seconds: 最长等待时间 超过后不再等待 直接开始运行
+        :param check_interval: 检查间隔
+        """
+        self.min_available_memory_mb: float = min_available_memory_mb
+        self.max_cpu_percent: float = max_cpu_percent
+        self.max_wait_seconds: float = max_wait_seconds
+        self.check_interval: float = check_interval
+
+        # 同时运行多个脚本时 逐个准入 避免同一时刻的剩余资源被重复计算
+        self._lock = threading.Lock()
+        # 每次等待时重新开始统计 至少统计这么久才判断 不使用上一个脚本运行期间的平均占用
+        self._cpu_sampler: Optional[SystemCpuSampler] = (
+            SystemCpuSampler(min_window_seconds=min(check_interval, 1)) if self.max_cpu_percent > 0 else None
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.min_available_memory_mb > 0 or self.max_cpu_percent > 0
+
+    def get_blocked_message(self) -> Optional[str]:
+        """
+        检查当前的系统资源
+        :return: 资源不足时返回原因 足够时返回None
+        """
+        if self.min_available_memory_mb > 0:
+            available_mb = psutil.virtual_memory().available / 1024 / 1024
+            if available_mb < self.min_available_memory_mb:
+                return f'系统可用内存不足 {available_mb:.0f}MB < {self.min_available_memory_mb:g}MB'
+        if self._cpu_sampler is not None:
+            cpu_percent = self._cpu_sampler.get_percent()
+            if cpu_percent is None:
+                return '正在统计系统CPU占用'
+            if cpu_percent >= self.max_cpu_percent:
+                return f'系统CPU占用过高 {cpu_percent:.0f}% >= {self.max_cpu_percent:g}%'
+        return None
+
+    def wait(self, message_callback: Optional[Callable[[str, str], None]] = None) -> bool:
+        """
+        等待系统资源足够
+        :param message_callback: 输出信息的回调 参数为 信息, 日志级别
+        :return: 是否在时间上限前满足
+        """
+        if not self.enabled:
+            return True
+        with self._lock:
+            deadline = time.time() + self.max_wait_seconds
+            last_message: Optional[str] = None
+            if self._cpu_sampler is not None:  # 只统计当前的占用 先等待一个统计窗口
+                self._cpu_sampler.reset()
+                time.sleep(self._cpu_sampler.min_window_seconds)
+            while True:
+                message = self.get_blocked_message()
+                if message is None:
+                    return True
+                if message_callback is not None and message != last_message:
+                    message_callback(f'等待系统资源 {message}', 'INFO')
+                    last_message = message
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    if message_callback is not None:
+                        message_callback(f'等待系统资源超时 直接开始运行 {message}', 'ERROR')
+                    return False
+                time.sleep(min(self.check_interval, remaining))
+
+    async def wait_async(self, message_callback: Optional[Callable[[str, str], None]] = None) -> bool:
+        """
+        等待系统资源足够 协程版本 在线程中等待
+        """
+        import asyncio  # 只在协程执行器中使用 启动时不导入
+        if not self.enabled:
+            return True
+        return await asyncio.to_thread(self.wait, message_callback)
+
+
+def get_over_limit_message(script_config: ScriptPlan, metrics: ScriptRunMetrics) -> Optional[str]:
+    """
+    按最近一次采样 检查脚本和游戏进程树合计的资源是否超过脚本的上限
+    游戏可能由脚本启动 两个进程树中重复的进程只计算一次
+    :return: 超过时返回原因 未超过时返回None
+    """
+    if script_config.max_rss_mb > 0:
+        rss_by_pid: dict[int, int] = {}
+        for sampler in [metrics.script_sampler, metrics.game_sampler]:
+            if sampler is not None:
+                rss_by_pid.update(sampler.last_rss_by_pid)
+        rss_mb = sum(rss_by_pid.values()) / 1024 / 1024
+        if rss_mb > script_config.max_rss_mb:
+            return f'内存占用超过上限 {rss_mb:.0f}MB > {script_config.max_rss_mb:g}MB'
+    if script_config.max_cpu_seconds > 0:
+        cpu_seconds_by_process: dict[tuple[int, float], float] = {}
+        for sampler in [metrics.script_sampler, metrics.game_sampler]:
+            if sampler is not None:
+                cpu_seconds_by_process.update(sampler.cpu_seconds_by_process)
+        cpu_seconds = sum(cpu_seconds_by_process.values())
+        if cpu_seconds > script_config.max_cpu_seconds:
+            return f'CPU时间超过上限 {cpu_seconds:.0f}秒 > {script_config.max_cpu_seconds:g}秒'
+    return None
+
+
+class HangDetector:
+
+    def __init__(self, hang_seconds: float, idle_cpu_percent: float = 1, min_cpu_seconds: float = 0.05):
+        """
+        按进程树的活动判断脚本是否卡住 不需要了解具体的游戏
+        脚本和游戏进程树的CPU时间 读写字节数 以及进程列表在 hang_seconds 内都没有变化时 认为卡住
+        空闲的进程仍会有少量CPU时间 平均占用不超过 idle_cpu_percent 时也视为没有变化
+        进程树为空时不计入空闲时间 从跟踪到进程后重新开始计时
+        :param hang_seconds: 没有活动多久认为卡住 0为不检查
+        :param idle_cpu_percent: 视为没有活动的平均CPU占用 单个核心的百分比
+        :param min_cpu_seconds: 视为没有活动的最小CPU时间 避免计时精度带来的误判
+        """
+        self.hang_seconds: float = hang_seconds
+        self.idle_cpu_percent: float = idle_cpu_percent
+        self.min_cpu_seconds: float = min_cpu_seconds
+
+        self.hung: bool = False  # 当前是否卡住 恢复活动后重置
+        self._base_time: Optional[float] = None  # 最后一次有活动的时间
+        self._base_cpu_seconds: float = 0
+        self._base_io_bytes: int = 0
+        self._base_pids: frozenset[int] = frozenset()
+
+    @property
+    def enabled(self) -> bool:
+        return self.hang_seconds > 0
+
+    @property
+    def idle_seconds(self) -> float:
+        """
+        距离最后一次有活动的时间
+        """
+        if self._base_time is None:
+            return 0
+        return time.time() - self._base_time
+
+    def update(self, metrics: ScriptRunMetrics) -> bool:
+        """
+        按最近一次采样更新活动状态 在监控循环中调用
+        :return: 是否刚刚判断为卡住 每次卡住只返回一次True
+        """
+        if not self.enabled:
+            return False
+
+        cpu_seconds_by_process: dict[tuple[int, float], float] = {}
+        io_bytes_by_process: dict[tuple[int, float], int] = {}
+        pids: set[int] = set()
+        for sampler in [metrics.script_sampler, metrics.game_sampler]:
+            if sampler is not None:
+                cpu_seconds_by_process.update(sampler.cpu_seconds_by_process)
+                io_bytes_by_process.update(sampler.io_bytes_by_process)
+                pids.update(sampler.last_rss_by_pid.keys())
+        cpu_seconds = sum(cpu_seconds_by_process.values())
+        io_bytes = sum(io_bytes_by_process.values())
+
+        now = time.time()
+        if self._base_time is None or len(pids) == 0:
+            # 没有跟踪到任何进程时不计时 例如启动器已经退出 游戏还没有启动
+            active = True
+        else:
+            idle_cpu_seconds = max(self.min_cpu_seconds, (now - self._base_time) * self.idle_cpu_percent / 100)
+            active = (
+                    cpu_seconds - self._base_cpu_seconds > idle_cpu_seconds
+                    or io_bytes != self._base_io_bytes
+                    or pids != self._base_pids
+            )
+
+        if active:
+            self._base_time = now
+            self._base_cpu_seconds = cpu_seconds
+            self._base_io_bytes = io_bytes
+            self._base_pids = frozenset(pids)
+            self.hung = False
+            return False
+
+        if not self.hung and now - self._base_time >= self.hang_seconds:
+            self.hung = True
+            return True
+        return False
+
+    def get_hang_message(self) -> str:
+        return f'进程树 {self.idle_seconds:.0f}秒 没有CPU和读写活动 判断为卡住'
+
+
+def get_hang_notify_content(chain_name: str, script_config: ScriptPlan, hang_message: str) -> str:
+    """
+    脚本卡住时的通知内容
+    """
+    action = '强制关闭' if script_config.hang_kill else '继续等待'
+    return f'脚本链 {chain_name} 脚本卡住: {script_config.script_display_name}\n{hang_message} {action}'
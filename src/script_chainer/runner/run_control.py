@@ -0,0 +1,251 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from one_dragon.utils.log_utils import log
+from script_chainer.config.script_plan import ScriptPlan
+
+
+class ScriptRunState:
+
+    def __init__(self, chain_name: str, script_config: ScriptPlan):
+        """
+        一个正在运行的脚本的状态和控制命令
+        状态由监控循环写入 控制命令由控制接口写入 都通过 RunController 修改
+        :param chain_name: 脚本链名称
+        :param script_config: 脚本配置
+        """
+        self.chain_name: str = chain_name
+        self.idx: int = script_config.idx
+        self.script_name: str = script_config.script_display_name
+        self.start_time: float = time.time()
+        self.timeout_seconds: float = script_config.run_timeout_seconds
+        self.phase: str = 'waiting'  # waiting=等待资源 starting=启动中 running=运行中
+        self.status: str = ''  # 最后一次的状态信息
+        self.probe_results: dict[str, bool] = {}  # 最后一次检查的就绪探针结果
+
+        self.skip_requested: bool = False  # 需要跳过
+        self.extra_timeout_seconds: float = 0  # 延长的超时时间
+        self.wake_callback: Optional[Callable[[], None]] = None  # 收到命令时唤醒监控循环
+
+    @property
+    def deadline_seconds(self) -> float:
+        """
+        包括延长后的超时时间
+        """
+        return self.timeout_seconds + self.extra_timeout_seconds
+
+    def to_dict(self) -> dict:
+        return {
+            'idx': self.idx,
+            'script': self.script_name,
+            'phase': self.phase,
+            'start_time': self.start_time,
+            'timeout_seconds': self.deadline_seconds,
+            'status': self.status,
+            'probes': dict(self.probe_results),
+            'skip_requested': self.skip_requested,
+        }
+
+
+class ChainRunState:
+
+    def __init__(self, chain_name: str, script_count: int):
+        """
+        一个正在运行的脚本链
+        """
+        self.chain_name: str = chain_name
+        self.script_count: int = script_count
+        self.start_time: float = time.time()
+        self.done_results: dict[int, str] = {}  # 已经结束的脚本下标 -> 结果
+        self.abort_requested: bool = False
+        self.running: dict[int, ScriptRunState] = {}
+
+
+class RunController:
+
+    def __init__(self):
+        """
+        执行器的运行状态和控制命令
+        每次状态变化时生成新的快照 读取状态只需要返回当前快照 不需要加锁 不影响监控循环
+        """
+        self._lock = threading.Lock()
+        self._chains: dict[str, ChainRunState] = {}
+        self._snapshot: dict = {'chains': []}
+        self._listeners: list[Callable[[dict], None]] = []
+
+    def add_listener(self, callback: Callable[[dict], None]) -> None:
+        """
+        监听脚本链和脚本的开始与结束 用于把结果转发给其它机器
+        回调在持有锁时调用 按事件发生的顺序 需要尽快返回
+        :param callback: 参数为事件 包含 type 和 chain
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def _emit(self, event: dict) -> None:
+        """
+        通知监听者 需要在持有锁时调用
+        """
+        for callback in self._listeners:
+            try:
+                callback(event)
+            except Exception:
+                log.error(f'运行状态监听异常 {event}', exc_info=True)
+
+    def get_snapshot(self) -> dict:
+        """
+        当前状态的快照 不要修改返回的内容
+        """
+        return self._snapshot
+
+    def _rebuild(self) -> None:
+        """
+        重新生成快照 需要在持有锁时调用
+        """
+        self._snapshot = {
+            'chains': [
+                {
+                    'chain': chain.chain_name,
+                    'start_time': chain.start_time,
+                    'script_count': chain.script_count,
+                    'done': {str(k): v for k, v in chain.done_results.items()},
+                    'abort_requested': chain.abort_requested,
+                    'running': [i.to_dict() for i in chain.running.values()],
+                }
+                for chain in self._chains.values()
+            ]
+        }
+
+    def chain_started(self, chain_name: str, script_count: int) -> None:
+        with self._lock:
+            self._chains[chain_name] = ChainRunState(chain_name, script_count)
+            self._rebuild()
+            self._emit({'type': 'chain_started', 'chain': chain_name, 'script_count': script_count})
+
+    def chain_done(self, chain_name: str) -> None:
+        with self._lock:
+            chain = self._chains.pop(chain_name, None)
+            self._rebuild()
+            self._emit({
+                'type': 'chain_done',
+                'chain': chain_name,
+                'done': {} if chain is None else {str(k): v for k, v in chain.done_results.items()},
+                'aborted': chain is not None and chain.abort_requested,
+            })
+
+    def is_aborted(self, chain_name: str) -> bool:
+        with self._lock:
+            chain = self._chains.get(chain_name)
+            return chain is not None and chain.abort_requested
+
+    def script_started(self, chain_name: str, script_config: ScriptPlan) -> ScriptRunState:
+        state = ScriptRunState(chain_name, script_config)
+        with self._lock:
+            chain = self._chains.get(chain_name)
+            if chain is not None:
+                chain.running[state.idx] = state
+                state.skip_requested = chain.abort_requested
+            self._rebuild()
+            self._emit({'type': 'script_started', 'chain': chain_name, 'idx': state.idx, 'script': state.script_name})
+        return state
+
+    def script_done(self, state: ScriptRunState, result: str) -> None:
+        with self._lock:
+            chain = self._chains.get(state.chain_name)
+            if chain is not None:
+                chain.running.pop(state.idx, None)
+                chain.done_results[state.idx] = result
+            self._rebuild()
+            self._emit({
+                'type': 'script_done',
+                'chain': state.chain_name,
+                'idx': state.idx,
+                'script': state.script_name,
+                'result': result,
+                'seconds': time.time() - state.start_time,
+            })
+
+    def update(self, state: ScriptRunState,
+               phase: Optional[str] = None,
+               status: Optional[str] = None,
+               probe_results: Optional[dict[str, bool]] = None,
+               ) -> None:
+        """
+        监控循环更新状态 没有变化时不重新生成快照
+        """
+        with self._lock:
+            changed = False
+            if phase is not None and phase != state.phase:
+                state.phase = phase
+                changed = True
+            if status is not None and status != state.status:
+                state.status = status
+                changed = True
+            if probe_results is not None and probe_results != state.probe_results:
+                state.probe_results = probe_results
+                changed = True
+            if changed:
+                self._rebuild()
+
+    def _find_running(self, chain_name: Optional[str], idx: Optional[int]) -> list[ScriptRunState]:
+        return [
+            state
+            for chain in self._chains.values()
+            if chain_name is None or chain.chain_name == chain_name
+            for state in chain.running.values()
+            if idx is None or state.idx == idx
+        ]
+
+    def skip(self, chain_name: Optional[str] = None, idx: Optional[int] = None) -> int:
+        """
+        跳过正在运行的脚本 脚本链继续运行后续脚本
+        :param chain_name: 脚本链名称 为空时匹配全部脚本链
+        :param idx: 脚本下标 为空时匹配全部正在运行的脚本
+        :return: 跳过的脚本数量
+        """
+        with self._lock:
+            states = self._find_running(chain_name, idx)
+            for state in states:
+                state.skip_requested = True
+            self._rebuild()
+        self._wake(states)
+        return len(states)
+
+    def abort(self, chain_name: Optional[str] = None) -> int:
+        """
+        中止脚本链 跳过正在运行的脚本 不再开始后续脚本
+        :param chain_name: 脚本链名称 为空时中止全部脚本链
+        :return: 中止的脚本链数量
+        """
+        with self._lock:
+            chains = [i for i in self._chains.values() if chain_name is None or i.chain_name == chain_name]
+            for chain in chains:
+                chain.abort_requested = True
+            states = self._find_running(chain_name, None)
+            for state in states:
+                state.skip_requested = True
+            self._rebuild()
+        self._wake(states)
+        return len(chains)
+
+    def extend_timeout(self, seconds: float, chain_name: Optional[str] = None, idx: Optional[int] = None) -> int:
+        """
+        延长正在运行的脚本的超时时间
+        :param seconds: 延长的秒数
+        :param chain_name: 脚本链名称 为空时匹配全部脚本链
+        :param idx: 脚本下标 为空时匹配全部正在运行的脚本
+        :return: 延长的脚本数量
+        """
+        with self._lock:
+            states = self._find_running(chain_name, idx)
+            for state in states:
+                state.extra_timeout_seconds += seconds
+            self._rebuild()
+        self._wake(states)
+        return len(states)
+
+    def _wake(self, states: list[ScriptRunState]) -> None:
+        for state in states:
+            if state.wake_callback is not None:
+                state.wake_callback()
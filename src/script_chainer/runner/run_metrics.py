@@ -0,0 +1,271 @@
+import time
+from typing import Optional
+
+import psutil
+
+from script_chainer.config.script_plan import ScriptPlan
+from script_chainer.runner.process_profile import ProcessProfile, create_process_profile
+from script_chainer.runner.process_table import ProcessTable
+from script_chainer.runner.process_tree_watcher import ProcessTreeWatcher
+from script_chainer.runner.script_monitor import ScriptMonitor
+
+
+class ProcessTreeSampler:
+
+    def __init__(self,
+                 process_table: ProcessTable,
+                 process_name: Optional[str] = None,
+                 root_pid: Optional[int] = None,
+                 sample_interval: float = 2,
+                 profile: Optional[ProcessProfile] = None,
+                 tree_watcher: Optional[ProcessTreeWatcher] = None,
+                 existing_keys: Optional[set[tuple[int, float]]] = None,
+                 ):
+        """
+        采样一个进程树的内存 CPU时间和读写字节数 资源上限和卡住检测都使用这个进程树
+        有根进程时 进程树 = 根进程 + 进程树跟踪中的进程 以及它们的全部子进程 不按名称匹配
+        没有根进程时 进程树 = 开始运行后出现的名称匹配的进程 以及它们的全部子进程 不包括同名的无关进程
+        :param process_table: 共用的进程表快照
+        :param process_name: 进程名称 只在没有根进程时使用
+        :param root_pid: 根进程 一般是执行器创建的子进程
+        :param sample_interval: 最短采样间隔
+        :param profile: 进程树的调度设置 采样时对新发现的进程设置
+        :param tree_watcher: 根进程的进程树跟踪 包括被收养的孤儿进程
+        :param existing_keys: 开始运行前已经存在的同名进程 (pid, 创建时间) 不属于进程树
+        """
+        self.process_table: ProcessTable = process_table
+        self.process_name: Optional[str] = process_name
+        self.root_pid: Optional[int] = root_pid
+        self.sample_interval: float = sample_interval
+        self.profile: Optional[ProcessProfile] = profile
+        self.tree_watcher: Optional[ProcessTreeWatcher] = tree_watcher
+        self.existing_keys: set[tuple[int, float]] = existing_keys if existing_keys is not None else set()
+
+        self.last_sample_time: float = 0
+        self.last_rss: Optional[int] = None  # 最近一次采样的进程树内存之和
+        self.last_rss_by_pid: dict[int, int] = {}  # 最近一次采样的各进程内存
+        self.peak_rss: Optional[int] = None  # 进程树内存之和的峰值
+        self.cpu_seconds_by_process: dict[tuple[int, float], float] = {}  # (pid, 创建时间) -> 最后一次采样的CPU时间
+        self.io_bytes_by_process: dict[tuple[int, float], int] = {}  # (pid, 创建时间) -> 最后一次采样的读写字节数
+
+    @property
+    def cpu_seconds(self) -> Optional[float]:
+        """
+        进程树中所有出现过的进程的CPU时间之和
+        """
+        if len(self.cpu_seconds_by_process) == 0:
+            return None
+        return sum(self.cpu_seconds_by_process.values())
+
+    def get_tree_processes(self, force_refresh: bool = False, include_existing: bool = False) -> list[psutil.Process]:
+        """
+        获取当前进程树中的进程
+        :param force_refresh: 是否忽略采样间隔 重新刷新进程表快照
+        :param include_existing: 按名称匹配时 是否包括开始运行前已经存在的同名进程 关闭游戏时使用
+        """
+        roots: list[psutil.Process] = []
+        if self.root_pid is not None:
+            try:
+                roots.append(psutil.Process(self.root_pid))
+            except psutil.Error:
+                pass
+            if self.tree_watcher is not None:
+                roots.extend(self.tree_watcher.get_processes())
+        elif self.process_name:
+            self.process_table.refresh(max_age=0 if force_refresh else self.sample_interval)
+            for proc in self.process_table.get_processes(self.process_name):
+                if not include_existing:
+                    try:
+                        if (proc.pid, proc.create_time()) in self.existing_keys:
+                            continue
+                    except psutil.Error:
+                        continue
+                roots.append(proc)
+
+        result: dict[int, psutil.Process] = {}
+        for root in roots:
+            result.setdefault(root.pid, root)
+            try:
+                for child in root.children(recursive=True):
+                    result.setdefault(child.pid, child)
+            except psutil.Error:
+                pass
+        return list(result.values())
+
+    def sample(self, force: bool = False) -> None:
+        """
+        采样一次
+        :param force: 是否忽略采样间隔
+        """
+        now = time.time()
+        if not force and now - self.last_sample_time < self.sample_interval:
+            return
+        self.last_sample_time = now
+
+        rss_by_pid: dict[int, int] = {}
+        for proc in self.get_tree_processes():
+            try:
+                with proc.oneshot():
+                    rss = proc.memory_info().rss
+                    cpu_times = proc.cpu_times()
+                    key = (proc.pid, proc.create_time())
+                    io_bytes = get_io_bytes(proc)
+            except psutil.Error:
+                continue
+            rss_by_pid[proc.pid] = rss
+            self.cpu_seconds_by_process[key] = cpu_times.user + cpu_times.system
+            if io_bytes is not None:
+                self.io_bytes_by_process[key] = io_bytes
+            if self.profile is not None:
+                self.profile.apply(proc, key)
+
+        self.last_rss_by_pid = rss_by_pid
+        if len(rss_by_pid) == 0:
+            self.last_rss = None
+            return
+        self.last_rss = sum(rss_by_pid.values())
+        if self.peak_rss is None or self.last_rss > self.peak_rss:
+            self.peak_rss = self.last_rss
+
+
+def get_io_bytes(proc: psutil.Process) -> Optional[int]:
+    """
+    进程累计的读写字节数 平台不支持或没有权限时返回None
+    """
+    if not hasattr(proc, 'io_counters'):  # macOS 不支持
+        return None
+    try:
+        io = proc.io_counters()
+    except psutil.AccessDenied:
+        return None
+    return io.read_bytes + io.write_bytes
+
+
+class ScriptRunMetrics:
+
+    def __init__(self, chain_name: str, script_idx: int, script_path: str):
+        """
+        一次脚本运行的性能指标 时间单位为秒 内存单位为字节
+        """
+        self.chain_name: str = chain_name
+        self.script_idx: int = script_idx
+        self.script_path: str = script_path
+        self.start_time: float = time.time()  # 开始运行的时间
+        self.result: str = ''  # 运行结果
+
+        self.create_seconds: Optional[float] = None  # 创建子进程的耗时
+        self.game_appear_seconds: Optional[float] = None  # 开始运行到游戏进程出现的时间
+        self.total_seconds: Optional[float] = None  # 总运行时间
+        self.exit_detect_seconds: Optional[float] = None  # 进程退出到判断为运行完毕的延迟
+
+        self.script_peak_rss: Optional[int] = None  # 脚本进程树的内存峰值
+        self.script_cpu_seconds: Optional[float] = None  # 脚本进程树的CPU时间
+        self.game_peak_rss: Optional[int] = None  # 游戏进程树的内存峰值
+        self.game_cpu_seconds: Optional[float] = None  # 游戏进程树的CPU时间
+        self.teardown_seconds: Optional[float] = None  # 结束后关闭进程的耗时
+
+        self.script_sampler: Optional[ProcessTreeSampler] = None
+        self.game_sampler: Optional[ProcessTreeSampler] = None
+        self.script_profile: Optional[ProcessProfile] = None  # 脚本进程树的调度设置 只用于执行器创建的子进程及其后代
+        self.game_profile: Optional[ProcessProfile] = None  # 游戏进程的调度设置 只用于开始运行后创建的游戏进程
+        self._game_process_name: str = ''
+        self._existing_game_keys: set[tuple[int, float]] = set()  # 开始运行前已经存在的游戏进程
+
+    def create_profiles(self, script_config: ScriptPlan, process_table: ProcessTable) -> None:
+        """
+        记录已经存在的游戏进程 并创建脚本和游戏进程树的调度设置 需要在创建子进程前调用
+        进程树跟踪 游戏进程监听和采样共用这两个设置 进程被任意一个发现时就设置
+        游戏的设置和资源上限只用于之后出现的游戏进程 不包括已经在运行的同名进程
+        :param script_config: 脚本配置
+        :param process_table: 共用的进程表快照
+        """
+        self._game_process_name = script_config.game_process_name
+        self._existing_game_keys = set()
+        if script_config.game_process_name:
+            process_table.refresh()
+            for proc in process_table.get_processes(script_config.game_process_name):
+                try:
+                    self._existing_game_keys.add((proc.pid, proc.create_time()))
+                except psutil.Error:
+                    pass
+        self.game_profile = create_process_profile('游戏', script_config.game_priority, script_config.game_affinity,
+                                                   by_name=True, existing_keys=self._existing_game_keys)
+        # 脚本启动的游戏进程也在脚本进程树中 有游戏的设置时以游戏的设置为准
+        self.script_profile = create_process_profile(
+            '脚本', script_config.script_priority, script_config.script_affinity,
+            skip_process_name=script_config.game_process_name if self.game_profile is not None else None,
+        )
+
+    @property
+    def has_profiles(self) -> bool:
+        return self.script_profile is not None or self.game_profile is not None
+
+    def apply_tree_profile(self, proc: psutil.Process, key: tuple[int, float]) -> None:
+        """
+        对脚本进程树中新发现的进程设置调度 脚本启动的游戏进程使用游戏的设置
+        在进程树跟踪的线程中调用
+        :param proc: 进程
+        :param key: (pid, 创建时间)
+        """
+        if self.game_profile is not None:
+            try:
+                is_game = proc.name() == self._game_process_name
+            except psutil.Error:
+                return
+            if is_game:
+                self.game_profile.apply(proc, key)
+                return
+        if self.script_profile is not None:
+            self.script_profile.apply(proc, key)
+
+    def start_sampling(self, script_config: ScriptPlan, process_table: ProcessTable, root_pid: Optional[int],
+                       tree_watcher: Optional[ProcessTreeWatcher] = None) -> None:
+        """
+        子进程创建成功后 开始采样脚本和游戏的进程树 并对之后出现的进程设置优先级和CPU
+        游戏进程同时属于脚本进程树时 以游戏的设置为准
+        :param script_config: 脚本配置
+        :param process_table: 共用的进程表快照
+        :param root_pid: 执行器创建的子进程
+        :param tree_watcher: 子进程的进程树跟踪 包括被收养的孤儿进程
+        """
+        self.script_sampler = ProcessTreeSampler(
+            process_table, script_config.script_process_name, root_pid, profile=self.script_profile,
+            tree_watcher=tree_watcher,
+        )
+        self.game_sampler = ProcessTreeSampler(
+            process_table, script_config.game_process_name, profile=self.game_profile,
+            existing_keys=self._existing_game_keys,
+        )
+
+    def sample(self) -> None:
+        """
+        按采样间隔采样一次进程树 在监控循环中调用
+        """
+        for sampler in [self.script_sampler, self.game_sampler]:
+            if sampler is not None:
+                sampler.sample()
+
+    def finish(self, result: str, monitor: Optional[ScriptMonitor] = None) -> None:
+        """
+        脚本运行结束 汇总指标
+        :param result: 运行结果
+        :param monitor: 脚本的监控 用于获取游戏出现和进程退出的时间
+        """
+        now = time.time()
+        self.result = result
+        self.total_seconds = now - self.start_time
+
+        if monitor is not None:
+            first_existed_time = monitor.game_watcher.first_existed_time
+            if first_existed_time is not None:
+                self.game_appear_seconds = first_existed_time - self.start_time
+            closed_time = monitor.get_closed_time()
+            if closed_time is not None:
+                self.exit_detect_seconds = max(now - closed_time, 0)
+
+        if self.script_sampler is not None:
+            self.script_peak_rss = self.script_sampler.peak_rss
+            self.script_cpu_seconds = self.script_sampler.cpu_seconds
+        if self.game_sampler is not None:
+            self.game_peak_rss = self.game_sampler.peak_rss
+            self.game_cpu_seconds = self.game_sampler.cpu_seconds
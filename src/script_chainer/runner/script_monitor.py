@@ -0,0 +1,174 @@
+from typing import Optional, Callable
+
+import psutil
+
+from script_chainer.config.script_plan import ScriptPlan
+from script_chainer.runner.log_tailer import LogWatcher
+from script_chainer.runner.process_profile import ProcessProfile
+from script_chainer.runner.process_table import ProcessTable
+from script_chainer.runner.process_tree_watcher import ProcessTreeWatcher
+from script_chainer.runner.process_watcher import ProcessWatcher
+
+
+class ScriptMonitor:
+
+    def __init__(self,
+                 script_config: ScriptPlan,
+                 process_table: ProcessTable,
+                 changed_callback: Optional[Callable[[], None]] = None,
+                 tree_watcher: Optional[ProcessTreeWatcher] = None,
+                 log_watcher: Optional[LogWatcher] = None,
+                 game_profile: Optional[ProcessProfile] = None,
+                 ):
+        """
+        监控一个脚本的游戏进程和脚本进程 判断脚本是否已经运行完毕
+        同步和异步的执行器共用这部分判断
+        :param script_config: 脚本配置
+        :param process_table: 共用的进程表快照
+        :param changed_callback: 进程状态变化时的回调 会在监听线程中调用
+        :param tree_watcher: 脚本子进程的进程树跟踪 创建子进程后就已经开始跟踪
+        :param log_watcher: 完成日志的跟踪 检查完成方式为日志出现完成标记时使用 需要在创建子进程前创建
+        :param game_profile: 游戏进程的调度设置 找到游戏进程时立刻设置
+        """
+        self.script_config: ScriptPlan = script_config
+        self.game_watcher: ProcessWatcher = ProcessWatcher(
+            process_table, script_config.game_process_name, changed_callback=changed_callback, profile=game_profile
+        )
+        self.script_watcher: ProcessWatcher = ProcessWatcher(
+            process_table, script_config.script_process_name, changed_callback=changed_callback
+        )
+        self.tree_watcher: Optional[ProcessTreeWatcher] = tree_watcher
+        if self.tree_watcher is not None:
+            self.tree_watcher.changed_callback = changed_callback
+        self.log_watcher: Optional[LogWatcher] = log_watcher
+        if self.log_watcher is not None:
+            self.log_watcher.changed_callback = changed_callback
+
+    def start(self) -> None:
+        self.game_watcher.start()
+        self.script_watcher.start()
+        if self.tree_watcher is not None:
+            self.tree_watcher.start()
+        if self.log_watcher is not None:
+            self.log_watcher.start()
+
+    def stop(self) -> None:
+        self.game_watcher.stop()
+        self.script_watcher.stop()
+        if self.tree_watcher is not None:
+            self.tree_watcher.stop()
+        if self.log_watcher is not None:
+            self.log_watcher.stop()
+
+    def get_status_message(self) -> tuple[str, str]:
+        """
+        当前运行状态的信息
+        :return: 信息, 日志级别
+        """
+        script_config = self.script_config
+        if len(script_config.game_display_name) > 0:
+            if not self.game_watcher.ever_existed:
+                return f'等待打开 {script_config.game_display_name}', 'INFO'
+            elif self.game_watcher.current_existed:
+                return f'正在运行 {script_config.game_display_name}', 'PASS'
+            else:
+                return f'运行结束 {script_config.game_display_name}', 'PASS'
+        else:
+            return f'等待 {script_config.check_done_display_name}', 'INFO'
+
+    def get_done_message(self) -> Optional[tuple[str, str]]:
+        """
+        按检查完成方式 判断脚本是否已经运行完毕
+        :return: 运行完毕时返回 信息, 日志级别 未完毕时返回None
+        """
+        script_config = self.script_config
+        game_closed = self.game_watcher.closed
+        script_closed = self.script_watcher.closed
+
+        if script_config.done_by_game_closed and script_config.done_by_script_closed:
+            if game_closed or script_closed:
+                return f'游戏或脚本被关闭 {script_config.game_display_name}', 'PASS'
+        elif script_config.done_by_game_closed:
+            if game_closed:
+                return f'游戏被关闭 {script_config.game_display_name}', 'PASS'
+        elif script_config.done_by_script_closed:
+            if script_closed:
+                return f'脚本被关闭 {script_config.script_display_name}', 'PASS'
+        elif script_config.done_by_tree_empty:
+            if self.tree_watcher is None:
+                return f'没有跟踪脚本进程树 {script_config.script_display_name}', 'ERROR'
+            elif self.tree_watcher.closed:
+                return f'脚本进程树全部退出 {script_config.script_display_name}', 'PASS'
+        elif script_config.done_by_log_matched:
+            if self.log_watcher is None:
+                return f'没有跟踪完成日志 {script_config.script_display_name}', 'ERROR'
+            elif self.log_watcher.matched:
+                return f'日志出现完成标记 {self.log_watcher.matched_line.strip()}', 'PASS'
+        else:
+            return f'未知的检查结束方式 {script_config.check_done}', 'ERROR'
+
+        return None
+
+    def get_closed_time(self) -> Optional[float]:
+        """
+        按检查完成方式 触发运行完毕的进程退出时间 用于统计退出检测的延迟
+        :return: 进程退出的时间 未退出时返回None
+        """
+        script_config = self.script_config
+        game_closed_time = self.game_watcher.closed_time if self.game_watcher.closed else None
+        script_closed_time = self.script_watcher.closed_time if self.script_watcher.closed else None
+
+        if script_config.done_by_game_closed and script_config.done_by_script_closed:
+            times = [i for i in [game_closed_time, script_closed_time] if i is not None]
+            return min(times) if len(times) > 0 else None
+        elif script_config.done_by_game_closed:
+            return game_closed_time
+        elif script_config.done_by_script_closed:
+            return script_closed_time
+        elif script_config.done_by_tree_empty:
+            return self.tree_watcher.closed_time if self.tree_watcher is not None else None
+        elif script_config.done_by_log_matched:
+            return self.log_watcher.matched_time if self.log_watcher is not None else None
+
+        return None
+
+
+def get_subprocess_kwargs(script_config: ScriptPlan) -> dict:
+    """
+    创建脚本子进程的额外参数
+    检查完成方式为进程树全部退出时 子进程在新的会话中运行 被init收养的孤儿进程可以按会话识别 Windows下忽略
+    """
+    if script_config.done_by_tree_empty:
+        return {'start_new_session': True}
+    return {}
+
+
+def start_tree_watcher(process_table: ProcessTable,
+                       root_pid: int, root_create_time: Optional[float] = None,
+                       joined_callback: Optional[Callable[[psutil.Process, tuple[int, float]], None]] = None,
+                       ) -> ProcessTreeWatcher:
+    """
+    在子进程创建后立刻开始跟踪进程树 包括被收养的孤儿进程
+    用于检查进程树全部退出 资源上限 以及结束后关闭进程 任何脚本被跳过或强制结束时都需要
+    调度在进程加入进程树时就设置 不需要等到子进程就绪后开始采样
+    :param process_table: 共用的进程表快照
+    :param root_pid: 执行器创建的子进程
+    :param root_create_time: 创建子进程前的时间
+    :param joined_callback: 进程加入进程树时的回调 用于设置调度 为None时不需要设置
+    :return: 已开始的进程树跟踪
+    """
+    tree_watcher = ProcessTreeWatcher(process_table, root_pid, root_create_time=root_create_time,
+                                      joined_callback=joined_callback)
+    tree_watcher.start()
+    return tree_watcher
+
+
+def create_log_watcher(script_config: ScriptPlan) -> Optional[LogWatcher]:
+    """
+    检查完成方式为日志出现完成标记时 在创建子进程前创建日志跟踪 只检查之后写入的内容
+    :param script_config: 脚本配置
+    :return: 未开始的日志跟踪 不需要时返回None
+    """
+    if not script_config.done_by_log_matched:
+        return None
+    return LogWatcher(script_config.done_log_path, script_config.done_log_regex)
@@ -0,0 +1,13 @@
+from enum import Enum
+
+
+class ScriptRunResult(Enum):
+
+    SUCCESS = 'success'  # 按检查完成方式正常结束
+    TIMEOUT = 'timeout'  # 运行超时
+    INVALID = 'invalid'  # 配置不合法 没有运行
+    CREATE_FAILED = 'create_failed'  # 子进程创建失败
+    OVER_LIMIT = 'over_limit'  # 资源占用超过上限 被强制关闭
+    HUNG = 'hung'  # 进程树长时间没有活动 被判断为卡住并强制关闭
+    SKIPPED = 'skipped'  # 通过控制接口跳过
+    ERROR = 'error'  # 运行异常
@@ -1,28 +1,52 @@
 import argparse
-import datetime
 import logging
 import os
 import subprocess
+import threading
 import time
 from logging.handlers import TimedRotatingFileHandler
+from typing import Optional
 
-import psutil
-from colorama import init, Fore, Style
+from colorama import init
 
-from one_dragon.base.notify.push import Push
 from one_dragon.utils import cmd_utils
 from one_dragon.utils import os_utils
-from script_chainer.config.script_config import ScriptConfig, ScriptChainConfig, CheckDoneMethods
-from script_chainer.context.script_chainer_context import ScriptChainerContext
+from script_chainer.config.script_config import ScriptChainConfig
+from script_chainer.config.script_plan import ScriptPlan
+from script_chainer.runner.chain_daemon import ChainDaemon
+from script_chainer.runner.chain_journal import ChainJournal, get_chain_fingerprint
+from script_chainer.runner.chain_scheduler import ChainScheduler
+from script_chainer.runner.console_writer import ConsoleWriter
+from script_chainer.runner.metrics_store import MetricsStore
+from script_chainer.runner.notify_outbox import NotifyOutbox
+from script_chainer.runner.output_capture import ScriptOutputCapture, create_output_capture, get_done_notify_content
+from script_chainer.runner.probes import get_ready_probes, get_teardown_probes, check_probe_results, wait_probes, \
+    AdaptiveInterval
+from script_chainer.runner.process_table import ProcessTable
+from script_chainer.runner.process_tree_watcher import ProcessTreeWatcher
+from script_chainer.runner.process_teardown import teardown_script, teardown_startup_tree
+from script_chainer.runner.resource_guard import AdmissionController, get_over_limit_message, HangDetector, \
+    get_hang_notify_content
+from script_chainer.runner.run_control import RunController, ScriptRunState
+from script_chainer.runner.run_metrics import ScriptRunMetrics
+from script_chainer.runner.script_monitor import ScriptMonitor, start_tree_watcher, create_log_watcher, \
+    get_subprocess_kwargs
+from script_chainer.runner.script_run_result import ScriptRunResult
 
 # 全局变量用于Push实例
+# Push 会导入 requests smtplib 和全部通知配置 只在第一次发送通知时才导入和初始化
 _push_instance = None
+_push_lock = threading.Lock()
 
 def get_push_instance():
     """获取Push实例，延迟初始化"""
     global _push_instance
-    if _push_instance is None:
+    with _push_lock:
+        if _push_instance is not None:
+            return _push_instance
         try:
+            from one_dragon.base.notify.push import Push
+            from script_chainer.context.script_chainer_context import ScriptChainerContext
             ctx = ScriptChainerContext()
             _push_instance = Push(ctx)
         except Exception as e:
@@ -30,6 +54,18 @@ def get_push_instance():
             _push_instance = None
     return _push_instance
 
+
+# 通知由后台线程发送 脚本链不等待网络
+notify_outbox = NotifyOutbox(get_push_instance)
+
+
+def send_notify(content: str) -> None:
+    """
+    发送通知 只放入发件箱 立刻返回
+    """
+    notify_outbox.put(content)
+
+
 def get_logger():
     logger = logging.getLogger('OneDragon')
     logger.handlers.clear()
@@ -47,90 +83,134 @@ def get_logger():
 
 
 log = get_logger()
+console_writer = ConsoleWriter(log)
 
+# 全部进程检查共用的进程表快照
+process_table = ProcessTable()
 
-def is_process_existed(process_name) -> bool:
-    """
-    判断进程是否存在
-    """
-    if process_name is None or len(process_name) == 0:
-        return False
-
-    for proc in psutil.process_iter(['pid', 'name']):
-        try:
-            if proc.info['name'] == process_name:
-                return True
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
-
-    return False
-
-
-def kill_process(process_name):
-    """
-    关闭一个进程
-    """
-    if process_name is None or len(process_name) == 0:
-        return
+# 脚本运行的性能记录
+metrics_store = MetricsStore()
 
-    for proc in psutil.process_iter(['pid', 'name']):
-        try:
-            if proc.info['name'] == process_name:
-                proc.kill()
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
+# 运行状态 供控制接口读取
+run_controller = RunController()
 
 
 def parse_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--chain', type=str, default='01', help='脚本链名称')
+    parser.add_argument('--chain', type=str, default=None, help='脚本链名称 默认为01')
     parser.add_argument('--shutdown', action='store_true', help='结束后关机')
+    parser.add_argument('--resume', action='store_true', help='断点续跑 跳过今天已经完成的脚本')
+    parser.add_argument('--status-throttle', type=float, default=0, help='相同的状态信息 间隔多少秒才重复输出 0为不节流')
+    parser.add_argument('--engine', type=str, default='thread', choices=['thread', 'asyncio'], help='执行器 thread=线程 asyncio=协程')
+    parser.add_argument('--max-concurrency', type=int, default=None, help='最多同时运行的脚本数量 不传入时使用脚本链配置')
+    parser.add_argument('--min-free-memory-mb', type=float, default=None, help='系统可用内存不少于该值时才开始下一个脚本 不传入时使用脚本链配置')
+    parser.add_argument('--max-cpu-percent', type=float, default=None, help='系统CPU占用低于该值时才开始下一个脚本 不传入时使用脚本链配置')
+    parser.add_argument('--metrics-db', type=str, default=None, help='性能记录的数据库路径 不传入时使用默认路径')
+    parser.add_argument('--report', action='store_true', help='输出脚本运行的性能统计后退出 传入--chain时只统计该脚本链')
+    parser.add_argument('--notify-digest-seconds', type=float, default=0, help='这段时间内的通知合并成一条发送 默认为0 立刻发送')
+    parser.add_argument('--control-port', type=int, default=0, help='在本机该端口开启状态和控制接口 0为不开启')
+    parser.add_argument('--control-token', type=str, default=None, help='控制接口的密钥 POST请求需要在请求头X-Chainer-Token中带上 不传入时读取环境变量 SCRIPT_CHAINER_CONTROL_TOKEN')
+    parser.add_argument('--daemon', action='store_true', help='常驻模式 按脚本链配置中的schedule定时运行 Ctrl+C退出')
+    parser.add_argument('--agent-port', type=int, default=0, help='代理模式 在该端口接收协调器的运行请求 Ctrl+C退出 0为不开启')
+    parser.add_argument('--agent-host', type=str, default='0.0.0.0', help='代理模式监听的地址')
+    parser.add_argument('--agent-capacity', type=int, default=1, help='代理模式最多同时运行的脚本链数量')
+    parser.add_argument('--agent-token', type=str, default=None, help='代理和协调器共用的密钥 不传入时读取环境变量 SCRIPT_CHAINER_AGENT_TOKEN')
+    parser.add_argument('--agents', type=str, default=None, help='协调器模式 代理地址 用逗号分隔 例如 http://192.168.1.2:8601 --chain 可以传入多个脚本链 用逗号分隔')
 
     return parser.parse_args()
 
 
-def print_message(message: str, level="INFO"):
-    # 打印消息，带有时间戳和日志级别
-    time.sleep(0.1)
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S,%f")[:-3]
-    colors = {"INFO": Fore.CYAN, "ERROR": Fore.YELLOW + Style.BRIGHT, "PASS": Fore.GREEN}
-    color = colors.get(level, Fore.WHITE)
-    print(f"{timestamp} | {color}{level}{Style.RESET_ALL} | {message}")
-    log.info(message)
+def print_message(message: str, level="INFO", status: bool = False):
+    # 打印消息，带有时间戳和日志级别 实际输出在后台线程中进行
+    console_writer.write(message, level=level, status=status)
 
 
-def run_script(script_config: ScriptConfig) -> None:
+def stop_startup_tree(process: Optional[subprocess.Popen], tree_watcher: Optional[ProcessTreeWatcher]) -> None:
+    """
+    启动阶段失败或被跳过时 停止跟踪并关闭这次创建的进程树
+    :param process: 执行器创建的子进程
+    :param tree_watcher: 子进程的进程树跟踪
+    """
+    if tree_watcher is not None:
+        tree_watcher.stop()
+    root_pid = process.pid if process is not None and process.poll() is None else None
+    try:
+        report = teardown_startup_tree(root_pid, tree_watcher)
+    except Exception:
+        log.error('关闭脚本子进程失败', exc_info=True)
+        report = None
+    if report is not None:
+        print_message(report.message, level='ERROR' if len(report.remaining) > 0 else 'INFO')
+    if process is not None:
+        process.poll()  # 回收执行器创建的子进程
+
+
+def run_script(script_config: ScriptPlan, metrics: Optional[ScriptRunMetrics] = None,
+               output_capture: Optional[ScriptOutputCapture] = None,
+               run_state: Optional[ScriptRunState] = None) -> ScriptRunResult:
     """
     运行脚本
+    :param script_config: 脚本配置
+    :param metrics: 记录性能指标 不需要保存时为None
+    :param output_capture: 捕获脚本的输出 为None时输出到执行器的控制台
+    :param run_state: 控制接口中的运行状态 为None时不更新状态 也不响应控制命令
+    :return: 运行结果
     """
+    if metrics is None:  # 资源上限的检查依赖进程树采样 不保存也需要记录
+        metrics = ScriptRunMetrics('', script_config.idx, script_config.script_path)
     script_path = script_config.script_path
-    args = script_config.script_arguments
 
     invalid_message = script_config.invalid_message
     if invalid_message is not None:
         print_message(f'脚本配置不合法 跳过运行 {invalid_message}')
-        return
+        return ScriptRunResult.INVALID
 
-    command = [script_path]
-    if args and args.strip():
-        command.extend(args.split())
+    command = list(script_config.command)
+    metrics.create_profiles(script_config, process_table)
 
     start_time = time.time()
 
     subprocess_created: bool = False
     subprocess_create_time: float = start_time  # 子进程创建的时间
+    next_create_time: float = start_time  # 下一次可以创建子进程的时间
+    retry_seconds: float = script_config.create_retry_seconds  # 子进程异常退出后 重新创建前的等待时间
+    last_result_display: Optional[str] = None
     process = None
+    tree_watcher: Optional[ProcessTreeWatcher] = None
+    ready_probes = get_ready_probes(script_config, process_table)
+    log_watcher = create_log_watcher(script_config)
+    poll_interval = AdaptiveInterval()
+    if run_state is not None:
+        run_controller.update(run_state, phase='starting')
 
     while True:
         now = time.time()
+        if run_state is not None and run_state.skip_requested:
+            break
         if process is None:
-            try:
-                subprocess_create_time = now
-                process = subprocess.Popen(command, cwd=os.path.dirname(script_path))
-                print_message(f'创建脚本子进程 {script_path}')
-            except Exception:
-                print_message(f'创建子进程失败 {script_path}')
-                log.error(f'创建子进程失败 {script_path}', exc_info=True)
+            if now >= next_create_time:
+                try:
+                    subprocess_create_time = now
+                    popen_kwargs = get_subprocess_kwargs(script_config)
+                    if output_capture is None:
+                        process = subprocess.Popen(command, cwd=os.path.dirname(script_path), **popen_kwargs)
+                    else:
+                        process = subprocess.Popen(command, cwd=os.path.dirname(script_path),
+                                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, **popen_kwargs)
+                        output_capture.attach(process.stdout, process.stderr)
+                    metrics.create_seconds = time.time() - subprocess_create_time
+                    tree_watcher = start_tree_watcher(
+                        process_table, process.pid, subprocess_create_time,
+                        joined_callback=metrics.apply_tree_profile if metrics.has_profiles else None,
+                    )
+                    print_message(f'创建脚本子进程 {script_path}')
+                    last_result_display = None
+                    poll_interval.reset()
+                except Exception:
+                    print_message(f'创建子进程失败 {script_path}')
+                    log.error(f'创建子进程失败 {script_path}', exc_info=True)
+                    next_create_time = now + retry_seconds
+                    retry_seconds *= script_config.create_retry_backoff
         else:
             process_result = process.poll()
             if process_result is None:
@@ -140,129 +220,365 @@ def run_script(script_config: ScriptConfig) -> None:
             else:
                 process_result_display = '运行失败'
 
-            print_message(f'检测脚本子进程运行 {process_result_display}')
+            if process_result_display != last_result_display:  # 检查间隔很短 只在状态变化时输出
+                print_message(f'检测脚本子进程运行 {process_result_display}')
+                last_result_display = process_result_display
             # None = 子进程正在运行中 未返回结果
             # 0 = 子进程运行结束 可能脚本的启动器自身启动了其它进程
             if process_result is None or process_result == 0:
-                if now - subprocess_create_time >= 5:  # 已经运行超过5秒
+                if now - subprocess_create_time >= script_config.ready_max_seconds:  # 已经运行足够长的时间
                     subprocess_created = True
-            else:  # 子进程运行结束 返回异常 尝试重新调用
+                else:
+                    probe_results = check_probe_results(ready_probes)
+                    if run_state is not None:
+                        run_controller.update(run_state, probe_results=probe_results)
+                    if any(probe_results.values()):  # 满足任意一个就绪条件 不需要继续等待
+                        subprocess_created = True
+            else:  # 子进程运行结束 返回异常 关闭它留下的进程后 等待后尝试重新调用
+                stop_startup_tree(process, tree_watcher)
                 process = None
+                tree_watcher = None
+                print_message(f'{retry_seconds:g}秒后重新创建脚本子进程')
+                next_create_time = now + retry_seconds
+                retry_seconds *= script_config.create_retry_backoff
 
         if subprocess_created:  # 子进程正常
             break
 
-        if now - start_time > 20:  # 超时
+        ready_deadline = start_time + script_config.ready_timeout_seconds
+        if now >= ready_deadline:  # 超时
             break
 
-        time.sleep(1)
+        wait_seconds = poll_interval.next()
+        if process is None:
+            wait_seconds = max(wait_seconds, next_create_time - now)
+        time.sleep(max(0.0, min(wait_seconds, ready_deadline - now)))
 
     if not subprocess_created:
+        stop_startup_tree(process, tree_watcher)
+        if run_state is not None and run_state.skip_requested:
+            print_message(f'脚本已跳过 {script_config.script_display_name}', level='ERROR')
+            return ScriptRunResult.SKIPPED
         print_message(f'子进程创建失败 {script_path}')
-        return
+        return ScriptRunResult.CREATE_FAILED
     else:
         print_message(f'脚本子进程创建成功 {script_path}', level='PASS')
 
-    script_ever_existed: bool = False  # 脚本进程是否存在
-    game_ever_existed: bool = False  # 游戏进程是否存在
-    while True:
-        is_done: bool = False
+    # 进程出现或退出时 监听线程会立刻唤醒主循环 不需要等到下一次轮询
+    result: ScriptRunResult = ScriptRunResult.SUCCESS
+    changed_event = threading.Event()
+    monitor = ScriptMonitor(script_config, process_table, changed_callback=changed_event.set,
+                            tree_watcher=tree_watcher, log_watcher=log_watcher, game_profile=metrics.game_profile)
+    monitor.start()
+    metrics.start_sampling(script_config, process_table, process.pid, tree_watcher)
+    hang_detector = HangDetector(script_config.hang_seconds)
+    if run_state is not None:
+        run_state.wake_callback = changed_event.set
+        run_controller.update(run_state, phase='running')
+    try:
+        while True:
+            is_done: bool = False
 
-        game_current_existed: bool = is_process_existed(script_config.game_process_name)
-        game_closed = game_ever_existed and not game_current_existed
-        game_ever_existed = game_ever_existed or game_current_existed
+            metrics.sample()
 
-        if len(script_config.game_display_name) > 0:
-            if not game_ever_existed:
-                print_message(f'等待打开 {script_config.game_display_name}')
-            elif game_current_existed:
-                print_message(f'正在运行 {script_config.game_display_name}', level='PASS')
-            else:
-                print_message(f'运行结束 {script_config.game_display_name}', level='PASS')
-        else:
-            print_message(f'等待 {script_config.check_done_display_name}')
+            status_message, status_level = monitor.get_status_message()
+            print_message(status_message, level=status_level, status=True)
+            if run_state is not None:
+                run_controller.update(run_state, status=status_message)
+
+            done_message = monitor.get_done_message()
+            if done_message is not None:
+                is_done = True
+                print_message(done_message[0], level=done_message[1])
+                if done_message[1] == 'ERROR':
+                    result = ScriptRunResult.ERROR
 
-        script_current_existed: bool = is_process_existed(script_config.script_process_name)
-        script_closed = script_ever_existed and not script_current_existed
-        script_ever_existed = script_ever_existed or script_current_existed
+            now = time.time()
 
-        if script_config.check_done == CheckDoneMethods.GAME_OR_SCRIPT_CLOSED.value.value:
-            if game_closed or script_closed:
+            timeout_seconds = script_config.run_timeout_seconds if run_state is None else run_state.deadline_seconds
+            if now - start_time > timeout_seconds:
                 is_done = True
-                print_message(f'游戏或脚本被关闭 {script_config.game_display_name}', level='PASS')
-        elif script_config.check_done == CheckDoneMethods.GAME_CLOSED.value.value:
-            if game_closed:
+                result = ScriptRunResult.TIMEOUT
+                print_message(f'脚本运行超时 {script_config.script_display_name}', level='ERROR')
+
+            over_limit_message = get_over_limit_message(script_config, metrics)
+            if not is_done and over_limit_message is not None:
                 is_done = True
-                print_message(f'游戏被关闭 {script_config.game_display_name}', level='PASS')
-        elif script_config.check_done == CheckDoneMethods.SCRIPT_CLOSED.value.value:
-            if script_closed:
+                result = ScriptRunResult.OVER_LIMIT
+                print_message(f'{over_limit_message} 强制关闭 {script_config.script_display_name}', level='ERROR')
+
+            if not is_done and hang_detector.update(metrics):
+                hang_message = hang_detector.get_hang_message()
+                if script_config.hang_notify:
+                    send_notify(get_hang_notify_content(metrics.chain_name, script_config, hang_message))
+                if script_config.hang_kill:
+                    is_done = True
+                    result = ScriptRunResult.HUNG
+                    print_message(f'{hang_message} 强制关闭 {script_config.script_display_name}', level='ERROR')
+                else:
+                    print_message(f'{hang_message} {script_config.script_display_name}', level='ERROR')
+
+            if not is_done and run_state is not None and run_state.skip_requested:
                 is_done = True
-                print_message(f'脚本被关闭 {script_config.script_display_name}', level='PASS')
+                result = ScriptRunResult.SKIPPED
+                print_message(f'脚本已跳过 强制关闭 {script_config.script_display_name}', level='ERROR')
+
+            if is_done:
+                break
+
+            changed_event.wait(1)
+            changed_event.clear()
+    finally:
+        monitor.stop()
+        if run_state is not None:
+            run_state.wake_callback = None
+
+    metrics.finish(result.value, monitor)
+
+    # 关闭跟踪到的脚本和游戏进程树 确认退出后才开始下一个脚本
+    try:
+        teardown_report = teardown_script(script_config, metrics, result, tree_watcher)
+    except Exception:
+        log.error('关闭进程失败', exc_info=True)
+        teardown_report = None
+    if teardown_report is not None:
+        metrics.teardown_seconds = teardown_report.seconds
+        print_message(teardown_report.message, level='ERROR' if len(teardown_report.remaining) > 0 else 'INFO')
+    process.poll()  # 回收执行器创建的子进程
+
+    return result
+
+
+def wait_teardown(script_config: ScriptPlan) -> None:
+    """
+    脚本结束后 等待收尾探针全部满足再开始下一个脚本
+    没有配置探针时 等待固定的时间
+    """
+    probes = get_teardown_probes(script_config, process_table)
+    if len(probes) == 0:
+        print_message(f'{script_config.teardown_max_seconds:g}秒后开始下一个脚本')
+        time.sleep(script_config.teardown_max_seconds)
+        return
+
+    print_message(f'等待开始下一个脚本 {", ".join(i.display_name for i in probes)}')
+    if wait_probes(probes, script_config.teardown_max_seconds):
+        print_message('收尾检查通过 开始下一个脚本', level='PASS')
+    else:
+        print_message('收尾检查超时 开始下一个脚本')
+
+
+def run_chain_script(module_name: str, script_config: ScriptPlan,
+                     journal: Optional[ChainJournal] = None,
+                     admission: Optional[AdmissionController] = None) -> None:
+    """
+    运行脚本链中的一个脚本 包括准入控制 开始和结束的通知 以及进度记录
+    """
+    run_state = run_controller.script_started(module_name, script_config)
+    if admission is not None:
+        admission.wait(print_message)
+    if script_config.notify_start:
+        send_notify(f'脚本链 {module_name} 开始运行: {script_config.script_display_name}')
+    if journal is not None:
+        journal.script_started(script_config.idx)
+    metrics = ScriptRunMetrics(module_name, script_config.idx, script_config.script_path)
+    output_capture = create_output_capture(module_name, script_config)
+    try:
+        result = run_script(script_config, metrics, output_capture, run_state)
+    except Exception:
+        log.error(f'脚本运行异常 {script_config.script_display_name}', exc_info=True)
+        result = ScriptRunResult.ERROR
+    run_controller.script_done(run_state, result.value)
+    if output_capture is not None:
+        output_capture.close()
+    if journal is not None:
+        journal.script_done(script_config.idx, result)
+    if result != ScriptRunResult.INVALID:
+        if metrics.total_seconds is None:  # 创建失败或异常时 没有经过监控
+            metrics.finish(result.value)
+        metrics_store.save(metrics)
+    if script_config.notify_done:
+        send_notify(get_done_notify_content(module_name, script_config, result, output_capture))
+
+
+def run_chain(module_name: str, chain_config: ScriptChainConfig, args) -> None:
+    """
+    运行一个脚本链
+    :param module_name: 脚本链名称
+    :param chain_config: 脚本链配置
+    :param args: 命令行参数
+    """
+    plan = chain_config.compile()
+    script_list = list(plan.scripts)
+    journal = ChainJournal(module_name)
+    run_controller.chain_started(module_name, len(script_list))
+    try:
+        max_concurrency = args.max_concurrency if args.max_concurrency is not None else plan.max_concurrency
+        fingerprint = get_chain_fingerprint(script_list)
+        done_idx: Optional[set[int]] = journal.get_resume_done_idx(fingerprint) if args.resume else None
+        if args.resume and done_idx is None:
+            print_message('没有可以续跑的进度 从头开始运行')
+        elif done_idx is not None:
+            print_message(f'断点续跑 跳过已完成的脚本 {sorted(done_idx)}')
+        journal.begin(fingerprint, resume=done_idx is not None)
+
+        admission = AdmissionController(
+            min_available_memory_mb=args.min_free_memory_mb if args.min_free_memory_mb is not None else plan.admission_min_memory_mb,
+            max_cpu_percent=args.max_cpu_percent if args.max_cpu_percent is not None else plan.admission_max_cpu_percent,
+            max_wait_seconds=plan.admission_max_wait_seconds,
+        )
+
+        if args.engine == 'asyncio':
+            # 只有协程执行器需要 asyncio 启动时不导入
+            import asyncio
+            from script_chainer.runner.async_supervisor import AsyncSupervisor
+            supervisor = AsyncSupervisor(
+                process_table,
+                message_callback=print_message,
+                notify_callback=send_notify,
+                max_concurrency=max_concurrency,
+                journal=journal,
+                metrics_store=metrics_store,
+                admission=admission,
+                controller=run_controller,
+            )
+            asyncio.run(supervisor.run_chain(module_name, script_list, done_idx=done_idx))
+        else:
+            scheduler = ChainScheduler(
+                script_list,
+                run_script=lambda script_config: run_chain_script(module_name, script_config, journal, admission),
+                max_concurrency=max_concurrency,
+                teardown=wait_teardown,
+                message_callback=print_message,
+                done_idx=done_idx,
+                should_stop=lambda: run_controller.is_aborted(module_name),
+            )
+            scheduler.run()
+
+        if run_controller.is_aborted(module_name):  # 不记录结束 之后可以断点续跑
+            print_message(f'脚本链已中止 {module_name}', 'ERROR')
         else:
-            print_message(f'未知的检查结束方式 {script_config.check_done}', level='ERROR')
-            is_done = True
+            journal.chain_done()
+            print_message(f'已完成全部脚本 {module_name}')
+    finally:
+        run_controller.chain_done(module_name)
+        journal.close()
 
-        now = time.time()
 
-        if now - start_time > script_config.run_timeout_seconds:
-            is_done = True
-            print_message(f'脚本运行超时 {script_config.script_display_name}', level='ERROR')
+def run_daemon(args) -> None:
+    """
+    常驻模式 进程内的配置和通知只初始化一次
+    """
+    get_push_instance()  # 常驻时提前初始化 之后发送通知不需要等待
+    daemon = ChainDaemon(
+        os_utils.get_path_under_work_dir('config', 'script_chain'),
+        run_chain=lambda module_name, chain_config: run_chain(module_name, chain_config, args),
+        message_callback=print_message,
+    )
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        print_message('收到退出信号 不再开始新的脚本链')
+        daemon.stop()
+        daemon.wait_running()
 
-        if is_done:
-            break
 
-        time.sleep(1)
+def run_agent(args) -> None:
+    """
+    代理模式 接收协调器的运行请求 直到Ctrl+C
+    """
+    from script_chainer.runner.agent_auth import get_agent_token
+    from script_chainer.runner.agent_server import AgentServer  # 不开启时不导入 http.server
+    token = get_agent_token(args.agent_token)
+    if token is None:
+        print_message('代理模式需要密钥 请传入 --agent-token 或设置环境变量 SCRIPT_CHAINER_AGENT_TOKEN', 'ERROR')
+        return
+    get_push_instance()  # 常驻时提前初始化 之后发送通知不需要等待
 
-    if script_config.kill_script_after_done:
-        print_message(f'尝试关闭脚本进程 {script_config.script_process_name}')
-        try:
-            process.kill()
-        except Exception:
-            log.error('关闭脚本子进程失败', exc_info=True)
+    def run_agent_chain(module_name: str, chain_config: ScriptChainConfig, resume: bool) -> None:
+        chain_args = argparse.Namespace(**{**vars(args), 'resume': resume})
+        run_chain(module_name, chain_config, chain_args)
 
-        try:
-            if script_config.script_process_name is not None and len(script_config.script_process_name) > 0:
-                kill_process(script_config.script_process_name)
-        except Exception:
-            log.error('关闭脚本进程失败', exc_info=True)
+    try:
+        agent_server = AgentServer(run_controller, run_agent_chain, token, args.agent_port,
+                                   host=args.agent_host, capacity=args.agent_capacity)
+    except OSError:
+        log.error(f'代理模式启动失败 端口 {args.agent_port}', exc_info=True)
+        print_message(f'代理模式启动失败 端口 {args.agent_port}', 'ERROR')
+        return
+    agent_server.start()
+    print_message(f'代理模式启动 {args.agent_host}:{args.agent_port} 最多同时运行 {agent_server.capacity}个脚本链')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print_message('收到退出信号 不再接收新的脚本链')
+        agent_server.stop()
+        agent_server.wait_running()
 
-    if script_config.kill_game_after_done:
-        print_message(f'尝试关闭游戏进程 {script_config.game_process_name}')
-        try:
-            if script_config.game_process_name is not None and len(script_config.game_process_name) > 0:
-                kill_process(script_config.game_process_name)
-        except Exception:
-            log.error('关闭游戏进程失败', exc_info=True)
+
+def run_coordinator(args) -> None:
+    """
+    协调器模式 把 --chain 中的脚本链分配到 --agents 中的代理运行 全部结束后返回
+    """
+    from script_chainer.runner.agent_auth import get_agent_token
+    from script_chainer.runner.agent_coordinator import AgentClient, ChainCoordinator
+    token = get_agent_token(args.agent_token)
+    if token is None:
+        print_message('协调器模式需要密钥 请传入 --agent-token 或设置环境变量 SCRIPT_CHAINER_AGENT_TOKEN', 'ERROR')
+        return
+    urls = [i.strip() for i in args.agents.split(',') if i.strip()]
+    chain_names = [i.strip() for i in (args.chain or '01').split(',') if i.strip()]
+    coordinator = ChainCoordinator([AgentClient(i, token) for i in urls], print_message, resume=args.resume)
+    runs = coordinator.run(chain_names)
+    failed = [i for i in runs if i.error is not None or i.aborted]
+    if len(failed) > 0:
+        print_message(f'有脚本链没有完成 {", ".join(i.chain_name for i in failed)}', 'ERROR')
+    else:
+        print_message(f'已完成全部脚本链 {", ".join(chain_names)}')
 
 
 def run():
     init(autoreset=True)
     args = parse_args()
-    module_name: str = args.chain
-    chain_config: ScriptChainConfig = ScriptChainConfig(module_name)
-    push_instance = get_push_instance()
+    if args.metrics_db is not None:
+        metrics_store.db_path = args.metrics_db
+    if args.report:
+        print(metrics_store.build_report(args.chain))
+        return
+    console_writer.set_status_throttle(args.status_throttle)
+    console_writer.start()
+    notify_outbox.digest_seconds = args.notify_digest_seconds
+    notify_outbox.start()  # 发送上次没有发送完的通知
+    control_server = None
+    if args.control_port > 0:
+        from script_chainer.runner.control_server import ControlServer  # 不开启时不导入 http.server
+        from script_chainer.runner.agent_auth import get_agent_token, CONTROL_TOKEN_ENV
+        try:
+            control_server = ControlServer(run_controller, args.control_port,
+                                           token=get_agent_token(args.control_token, CONTROL_TOKEN_ENV))
+            control_server.start()
+            print_message(f'控制接口 http://127.0.0.1:{args.control_port}/status')
+        except OSError:
+            log.error(f'控制接口启动失败 端口 {args.control_port}', exc_info=True)
+            print_message(f'控制接口启动失败 端口 {args.control_port}', 'ERROR')
+            control_server = None
     try:
+        if args.daemon:
+            run_daemon(args)
+            return
+        if args.agent_port > 0:
+            run_agent(args)
+            return
+        if args.agents:
+            run_coordinator(args)
+            return
+
+        module_name: str = args.chain if args.chain is not None else '01'
+        chain_config: ScriptChainConfig = ScriptChainConfig(module_name)
         if not chain_config.is_file_exists():
             print_message(f'脚本链配置不存在 {module_name}', "ERROR")
         else:
-            for i in range(len(chain_config.script_list)):
-                script_config = chain_config.script_list[i]
-                if script_config.notify_start:
-                    if push_instance is not None:
-                        push_instance.send(
-                            content=f'脚本链 {module_name} 开始运行: {script_config.script_display_name}'
-                        )
-                run_script(script_config)
-                if script_config.notify_done:
-                    if push_instance is not None:
-                        push_instance.send(
-                            content=f'脚本链 {module_name} 运行结束: {script_config.script_display_name}'
-                        )
-                if i < len(chain_config.script_list) - 1:
-                    print_message('10秒后开始下一个脚本')
-                    time.sleep(10)
-
-            print_message('已完成全部脚本')
+            run_chain(module_name, chain_config, args)
 
         if args.shutdown:
             cmd_utils.shutdown_sys(60)
@@ -271,6 +587,9 @@ def run():
         print_message('5秒后关闭本窗口')
         time.sleep(5)
     finally:
+        if control_server is not None:
+            control_server.stop()
+        notify_outbox.close()
         # 清理Push资源
         global _push_instance
         if _push_instance is not None:
@@ -278,6 +597,7 @@ def run():
                 _push_instance.ctx.after_app_shutdown()
             except Exception as e:
                 log.error(f'清理Push资源失败: {e}')
+        console_writer.stop()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 与运行时一样 从 src 导入
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
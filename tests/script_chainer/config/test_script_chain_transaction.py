@@ -0,0 +1,78 @@
+import pytest
+
+from script_chainer.config import script_config
+from script_chainer.config.script_config import ScriptChainConfig
+
+
+@pytest.fixture
+def chain_config(tmp_path) -> ScriptChainConfig:
+    """
+    写入临时文件的脚本链配置 包含3个脚本 第3个依赖第1个
+    """
+    config = ScriptChainConfig('test_chain', is_mock=True)
+    config.file_path = str(tmp_path / 'test_chain.yml')
+    for i in range(3):
+        config.add_one().script_path = f'script_{i}'
+    config.script_list[2].depends_on = [0]
+    config.save()
+    return config
+
+
+@pytest.fixture
+def writes(chain_config, monkeypatch) -> list[dict]:
+    """
+    脚本链配置创建后 每次写入文件的内容
+    """
+    result: list[dict] = []
+    original = script_config.save_yaml_atomic
+
+    def record_write(file_path: str, data: dict) -> None:
+        result.append(data)
+        original(file_path, data)
+
+    monkeypatch.setattr(script_config, 'save_yaml_atomic', record_write)
+    return result
+
+
+def test_transaction_writes_once(chain_config: ScriptChainConfig, writes: list[dict]):
+    with chain_config.transaction():
+        chain_config.move_up(1)
+        chain_config.delete_one(2)
+        chain_config.add_one()
+
+    assert len(writes) == 1
+    assert [i.script_path for i in chain_config.script_list] == ['script_1', 'script_0', '']
+    assert [i['script_path'] for i in writes[0]['script_list']] == ['script_1', 'script_0', '']
+
+
+def test_transaction_rollback_on_exception(chain_config: ScriptChainConfig, writes: list[dict]):
+    data_before = chain_config.data
+
+    with pytest.raises(RuntimeError):
+        with chain_config.transaction():
+            chain_config.move_up(1)
+            chain_config.delete_one(0)
+            raise RuntimeError('edit failed')
+
+    assert len(writes) == 0
+    assert chain_config.data == data_before
+    assert [i.script_path for i in chain_config.script_list] == ['script_0', 'script_1', 'script_2']
+    assert [i.idx for i in chain_config.script_list] == [0, 1, 2]
+    assert chain_config.script_list[2].depends_on == [0]
+
+    # 恢复后可以继续正常保存
+    chain_config.move_up(2)
+    assert len(writes) == 1
+    assert chain_config.script_list[1].depends_on == [0]
+
+
+def test_nested_transaction_rolls_back_outermost(chain_config: ScriptChainConfig, writes: list[dict]):
+    with pytest.raises(RuntimeError):
+        with chain_config.transaction():
+            chain_config.move_up(1)
+            with chain_config.transaction():
+                chain_config.delete_one(0)
+            raise RuntimeError('edit failed')
+
+    assert len(writes) == 0
+    assert [i.script_path for i in chain_config.script_list] == ['script_0', 'script_1', 'script_2']
@@ -0,0 +1,98 @@
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from script_chainer.runner import agent_auth
+from script_chainer.runner.agent_auth import NonceCache, get_auth_headers, verify_request, TIMESTAMP_HEADER, \
+    NONCE_HEADER, SIGNATURE_HEADER
+from script_chainer.runner.agent_coordinator import AgentClient
+from script_chainer.runner.agent_server import AgentServer
+from script_chainer.runner.run_control import RunController
+
+TOKEN = 'secret'
+
+
+def verify(headers: dict[str, str], body: bytes = b'{}', nonce_cache: NonceCache = None,
+           token: str = TOKEN, path: str = '/run'):
+    return verify_request(token, 'POST', path, headers.get(TIMESTAMP_HEADER), headers.get(NONCE_HEADER),
+                          headers.get(SIGNATURE_HEADER), body, nonce_cache)
+
+
+def test_signed_request_passes():
+    headers = get_auth_headers(TOKEN, 'POST', '/run', b'{}')
+    assert verify(headers, nonce_cache=NonceCache()) is None
+
+
+def test_tampered_request_rejected():
+    headers = get_auth_headers(TOKEN, 'POST', '/run', b'{}')
+    assert verify(headers, body=b'{"chain": "01"}') == '签名错误'
+    assert verify(headers, path='/skip') == '签名错误'
+    assert verify(headers, token='other') == '签名错误'
+    assert verify({**headers, NONCE_HEADER: 'other'}) == '签名错误'
+    assert verify({TIMESTAMP_HEADER: headers[TIMESTAMP_HEADER], SIGNATURE_HEADER: headers[SIGNATURE_HEADER]}) \
+        == '缺少认证信息'
+
+
+def test_replayed_request_rejected():
+    nonce_cache = NonceCache()
+    headers = get_auth_headers(TOKEN, 'POST', '/run', b'{}')
+    assert verify(headers, nonce_cache=nonce_cache) is None
+    assert verify(headers, nonce_cache=nonce_cache) == '请求重复'
+    # 新的请求有新的随机数
+    assert verify(get_auth_headers(TOKEN, 'POST', '/run', b'{}'), nonce_cache=nonce_cache) is None
+
+
+def test_bad_signature_not_recorded():
+    nonce_cache = NonceCache()
+    headers = get_auth_headers(TOKEN, 'POST', '/run', b'{}')
+    assert verify(headers, token='other', nonce_cache=nonce_cache) == '签名错误'
+    assert verify(headers, nonce_cache=nonce_cache) is None
+
+
+def test_old_request_rejected_by_time():
+    old_time = time.time() - agent_auth.MAX_CLOCK_SKEW_SECONDS - 1
+    timestamp = f'{old_time:.3f}'
+    headers = {
+        TIMESTAMP_HEADER: timestamp,
+        NONCE_HEADER: 'n',
+        SIGNATURE_HEADER: agent_auth.sign_request(TOKEN, 'POST', '/run', timestamp, 'n', b'{}'),
+    }
+    assert verify(headers, nonce_cache=NonceCache()) == '请求时间与本机相差过大'
+
+
+def test_nonce_cache_expires_and_bounded(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(agent_auth.time, 'time', lambda: now[0])
+    nonce_cache = NonceCache(max_size=2)
+    assert nonce_cache.add('a', now[0]) is None
+    assert nonce_cache.add('b', now[0]) is None
+    assert nonce_cache.add('c', now[0]) == '最近的请求过多'
+    assert nonce_cache.add('a', now[0]) == '请求重复'
+
+    # 超出时间范围后 请求会因为时间被拒绝 随机数不需要继续保存
+    now[0] += agent_auth.MAX_CLOCK_SKEW_SECONDS + 1
+    assert nonce_cache.add('c', now[0]) is None
+    assert nonce_cache.add('a', now[0]) is None
+
+
+@pytest.fixture
+def agent_server():
+    server = AgentServer(RunController(), lambda *args: None, TOKEN, 0, host='127.0.0.1')
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_agent_rejects_replayed_request(agent_server):
+    url = f'http://127.0.0.1:{agent_server.server_address[1]}'
+    client = AgentClient(url, TOKEN)
+    assert client.request('GET', '/status')[0] == 200
+
+    headers = get_auth_headers(TOKEN, 'GET', '/status', b'')
+    with urllib.request.urlopen(urllib.request.Request(url + '/status', headers=headers)) as response:
+        assert response.status == 200
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(urllib.request.Request(url + '/status', headers=headers))
+    assert e.value.code == 401
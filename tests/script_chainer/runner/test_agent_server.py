@@ -0,0 +1,100 @@
+import threading
+
+import pytest
+
+from script_chainer.runner import agent_server as agent_server_module
+from script_chainer.runner.agent_server import AgentServer
+from script_chainer.runner.run_control import RunController
+
+# 脚本链名称 -> 使用的游戏
+CHAIN_GAMES: dict[str, set[str]] = {
+    'a': {'game_1.exe'},
+    'b': {'game_1.exe', 'game_2.exe'},
+    'c': {'game_3.exe'},
+    'd': {'game_4.exe'},
+}
+
+
+class FakeChainConfig:
+
+    def __init__(self, module_name: str):
+        self.module_name: str = module_name
+
+    def is_file_exists(self) -> bool:
+        return self.module_name in CHAIN_GAMES
+
+
+class BlockingRunner:
+
+    def __init__(self):
+        """
+        运行脚本链时一直等待 直到 finish 该脚本链
+        """
+        self.events: dict[str, threading.Event] = {name: threading.Event() for name in CHAIN_GAMES}
+
+    def run_chain(self, chain_name: str, chain_config: FakeChainConfig, resume: bool) -> None:
+        self.events[chain_name].wait(5)
+
+    def finish(self, server: AgentServer, chain_name: str) -> None:
+        run_id = server._run_ids[chain_name]
+        thread = server._run_threads[run_id]
+        self.events[chain_name].set()
+        thread.join(5)
+
+
+@pytest.fixture
+def runner(monkeypatch):
+    monkeypatch.setattr(agent_server_module, 'ScriptChainConfig', FakeChainConfig)
+    monkeypatch.setattr(agent_server_module, 'get_chain_games', lambda config: CHAIN_GAMES[config.module_name])
+    runner = BlockingRunner()
+    yield runner
+    for event in runner.events.values():
+        event.set()
+
+
+def create_server(runner: BlockingRunner, capacity: int) -> AgentServer:
+    server = AgentServer(RunController(), runner.run_chain, 'secret', 0, host='127.0.0.1', capacity=capacity)
+    server.server_close()  # 只调用 start_run 不需要监听端口
+    return server
+
+
+def test_invalid_chain(runner):
+    server = create_server(runner, 1)
+    assert server.start_run('../a', False)[0] == 400
+    assert server.start_run('.a', False)[0] == 400
+    assert server.start_run('missing', False)[0] == 404
+
+
+def test_running_chain_conflict(runner):
+    server = create_server(runner, 2)
+    code, data = server.start_run('a', False)
+    assert code == 200
+    code, conflict = server.start_run('a', False)
+    assert code == 409
+    assert conflict['run_id'] == data['run_id']
+
+
+def test_busy_game_conflict(runner):
+    server = create_server(runner, 3)
+    assert server.start_run('a', False)[0] == 200
+    code, data = server.start_run('b', False)
+    assert code == 409
+    assert data['game'] == 'game_1.exe'
+    assert server.start_run('c', False)[0] == 200
+
+    runner.finish(server, 'a')
+    assert server.start_run('b', False)[0] == 200
+
+
+def test_capacity_full(runner):
+    server = create_server(runner, 2)
+    assert server.start_run('a', False)[0] == 200
+    assert server.start_run('c', False)[0] == 200
+    assert server.start_run('d', False)[0] == 503
+
+    runner.finish(server, 'c')
+    assert server.start_run('d', False)[0] == 200
+    events = server.event_log.get_events(0)['events']
+    assert [(i['type'], i['chain']) for i in events] == [
+        ('run_accepted', 'a'), ('run_accepted', 'c'), ('run_done', 'c'), ('run_accepted', 'd'),
+    ]
@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+from typing import Optional
+
+import pytest
+
+from script_chainer.runner import chain_journal
+from script_chainer.runner.chain_journal import ChainJournal, get_chain_fingerprint
+from script_chainer.runner.script_run_result import ScriptRunResult
+
+FINGERPRINT = 'fp'
+
+
+@pytest.fixture
+def journal(tmp_path) -> ChainJournal:
+    journal = ChainJournal('01', journal_dir=str(tmp_path))
+    yield journal
+    journal.close()
+
+
+def run_scripts(journal: ChainJournal, results: dict[int, ScriptRunResult], resume: bool = False,
+                running_idx: Optional[int] = None) -> None:
+    """
+    记录一次没有结束的运行
+    :param running_idx: 开始后运行中断 没有结束记录的脚本
+    """
+    journal.begin(FINGERPRINT, resume)
+    for idx, result in results.items():
+        journal.script_started(idx)
+        journal.script_done(idx, result)
+    if running_idx is not None:
+        journal.script_started(running_idx)
+    journal.close()
+
+
+def test_no_journal(journal: ChainJournal):
+    assert journal.get_resume_done_idx(FINGERPRINT) is None
+
+
+def test_resume_skips_only_done_scripts(journal: ChainJournal):
+    run_scripts(journal, {
+        0: ScriptRunResult.SUCCESS,
+        1: ScriptRunResult.TIMEOUT,
+        2: ScriptRunResult.INVALID,
+        3: ScriptRunResult.SKIPPED,
+        4: ScriptRunResult.CREATE_FAILED,
+    }, running_idx=5)
+    # 正常结束和配置不合法的脚本不需要重新运行 其它结果的脚本续跑时重新运行
+    assert journal.get_resume_done_idx(FINGERPRINT) == {0, 2}
+
+
+def test_resume_appends(journal: ChainJournal):
+    run_scripts(journal, {0: ScriptRunResult.SUCCESS, 1: ScriptRunResult.ERROR})
+    run_scripts(journal, {1: ScriptRunResult.SUCCESS}, resume=True)
+    assert journal.get_resume_done_idx(FINGERPRINT) == {0, 1}
+
+
+def test_new_run_clears_progress(journal: ChainJournal):
+    run_scripts(journal, {0: ScriptRunResult.SUCCESS})
+    run_scripts(journal, {1: ScriptRunResult.SUCCESS})
+    assert journal.get_resume_done_idx(FINGERPRINT) == {1}
+
+
+def test_finished_chain_not_resumed(journal: ChainJournal):
+    journal.begin(FINGERPRINT, False)
+    journal.script_done(0, ScriptRunResult.SUCCESS)
+    journal.chain_done()
+    journal.close()
+    assert journal.get_resume_done_idx(FINGERPRINT) is None
+
+
+def test_changed_chain_not_resumed(journal: ChainJournal):
+    run_scripts(journal, {0: ScriptRunResult.SUCCESS})
+    assert journal.get_resume_done_idx('other') is None
+
+
+def test_other_day_not_resumed(journal: ChainJournal, monkeypatch):
+    run_scripts(journal, {0: ScriptRunResult.SUCCESS})
+    monkeypatch.setattr(chain_journal.os_utils, 'get_dt', lambda: '20000101')
+    assert journal.get_resume_done_idx(FINGERPRINT) is None
+
+
+def test_interrupted_write_ignored(journal: ChainJournal):
+    run_scripts(journal, {0: ScriptRunResult.SUCCESS})
+    with open(journal.file_path, 'a', encoding='utf-8') as file:
+        file.write('{"e":"done","i":1,"r":"succ')  # 写入中断 留下不完整的行
+    assert journal.get_resume_done_idx(FINGERPRINT) == {0}
+
+    run_scripts(journal, {2: ScriptRunResult.SUCCESS}, resume=True)
+    assert journal.get_resume_done_idx(FINGERPRINT) == {0, 2}
+
+
+def test_fingerprint():
+    scripts = [SimpleNamespace(idx=0, script_path='/a.exe', script_arguments=''),
+               SimpleNamespace(idx=1, script_path='/b.exe', script_arguments='-x')]
+    fingerprint = get_chain_fingerprint(scripts)
+    assert fingerprint == get_chain_fingerprint(list(scripts))
+    scripts[1].script_arguments = '-y'
+    assert get_chain_fingerprint(scripts) != fingerprint
@@ -0,0 +1,161 @@
+import threading
+from types import SimpleNamespace
+from typing import Optional
+
+from script_chainer.runner.chain_scheduler import ChainScheduler, get_script_dependencies, get_blocked_scripts
+
+
+def create_script(idx: int, parallel_group: str = '', depends_on: Optional[list[int]] = None) -> SimpleNamespace:
+    return SimpleNamespace(idx=idx, parallel_group=parallel_group, depends_on=depends_on,
+                           script_display_name=f'script_{idx}')
+
+
+class Recorder:
+
+    def __init__(self, fail_idx: Optional[set[int]] = None):
+        """
+        记录脚本开始和结束的顺序
+        :param fail_idx: 运行时抛出异常的脚本
+        """
+        self.fail_idx: set[int] = set() if fail_idx is None else fail_idx
+        self.lock = threading.Lock()
+        self.events: list[tuple[str, int]] = []
+        self.messages: list[str] = []
+
+    def run_script(self, script: SimpleNamespace) -> None:
+        with self.lock:
+            self.events.append(('start', script.idx))
+        try:
+            if script.idx in self.fail_idx:
+                raise RuntimeError('fail')
+        finally:
+            with self.lock:
+                self.events.append(('end', script.idx))
+
+    def get_started(self) -> list[int]:
+        return [idx for event, idx in self.events if event == 'start']
+
+    def assert_dependencies(self, dependencies: dict[int, set[int]]) -> None:
+        """
+        每个脚本开始时 依赖的脚本都已经结束
+        """
+        ended: set[int] = set()
+        for event, idx in self.events:
+            if event == 'start':
+                assert dependencies[idx].issubset(ended), f'{idx} 在依赖 {dependencies[idx] - ended} 结束前开始'
+            else:
+                ended.add(idx)
+
+
+def test_dependencies_sequential():
+    scripts = [create_script(i) for i in range(3)]
+    assert get_script_dependencies(scripts) == {0: set(), 1: {0}, 2: {1}}
+
+
+def test_dependencies_parallel_group():
+    scripts = [create_script(0), create_script(1, 'a'), create_script(2, 'a'), create_script(3),
+               create_script(4, 'b'), create_script(5, 'a')]
+    assert get_script_dependencies(scripts) == {
+        0: set(),
+        1: {0},
+        2: {0},
+        3: {1, 2},
+        4: {3},
+        5: {4},  # 不相邻的同名分组是新的一组
+    }
+
+
+def test_dependencies_depends_on():
+    scripts = [create_script(0), create_script(1, depends_on=[]), create_script(2, depends_on=[0, 2, 9]),
+               create_script(3)]
+    # 依赖自己和不存在的脚本会被忽略 没有配置的脚本仍然依赖前一组
+    assert get_script_dependencies(scripts) == {0: set(), 1: set(), 2: {0}, 3: {2}}
+
+
+def test_blocked_scripts():
+    dependencies = {0: set(), 1: {2}, 2: {1}, 3: {2}, 4: {0}, 5: {3, 4}}
+    assert get_blocked_scripts(dependencies) == {1, 2, 3, 5}
+    assert get_blocked_scripts({0: set(), 1: {0}, 2: {1}}) == set()
+
+
+def test_run_sequential():
+    scripts = [create_script(i) for i in range(4)]
+    recorder = Recorder()
+    ChainScheduler(scripts, recorder.run_script, max_concurrency=4).run()
+    assert recorder.events == [('start', 0), ('end', 0), ('start', 1), ('end', 1),
+                               ('start', 2), ('end', 2), ('start', 3), ('end', 3)]
+
+
+def test_run_by_dependencies():
+    scripts = [create_script(0), create_script(1, depends_on=[0]), create_script(2, depends_on=[]),
+               create_script(3, depends_on=[1, 2]), create_script(4, depends_on=[2])]
+    recorder = Recorder()
+    ChainScheduler(scripts, recorder.run_script, max_concurrency=2).run()
+    assert sorted(recorder.get_started()) == [0, 1, 2, 3, 4]
+    recorder.assert_dependencies(get_script_dependencies(scripts))
+
+
+def test_parallel_group_runs_together():
+    scripts = [create_script(0, 'a'), create_script(1, 'a'), create_script(2)]
+    barrier = threading.Barrier(2, timeout=5)  # 两个脚本同时运行才能通过
+    recorder = Recorder()
+
+    def run_script(script: SimpleNamespace) -> None:
+        if script.idx in (0, 1):
+            barrier.wait()
+        recorder.run_script(script)
+
+    ChainScheduler(scripts, run_script, max_concurrency=2).run()
+    assert not barrier.broken
+    assert recorder.get_started()[-1] == 2
+    recorder.assert_dependencies(get_script_dependencies(scripts))
+
+
+def test_cyclic_scripts_not_run():
+    scripts = [create_script(0), create_script(1, depends_on=[2]), create_script(2, depends_on=[1]),
+               create_script(3, depends_on=[0])]
+    recorder = Recorder()
+    ChainScheduler(scripts, recorder.run_script, max_concurrency=2, message_callback=recorder.messages.append).run()
+    assert sorted(recorder.get_started()) == [0, 3]
+    assert recorder.messages == ['脚本依赖无法满足 跳过运行 [1, 2]']
+
+
+def test_blocked_by_cycle_not_run():
+    scripts = [create_script(0, depends_on=[1]), create_script(1, depends_on=[0]), create_script(2),
+               create_script(3, depends_on=[])]
+    recorder = Recorder()
+    ChainScheduler(scripts, recorder.run_script, message_callback=recorder.messages.append).run()
+    assert recorder.get_started() == [3]
+    assert recorder.messages == ['脚本依赖无法满足 跳过运行 [0, 1, 2]']
+
+
+def test_failed_script_does_not_stop_chain():
+    scripts = [create_script(i) for i in range(3)]
+    recorder = Recorder(fail_idx={1})
+    ChainScheduler(scripts, recorder.run_script).run()
+    assert recorder.get_started() == [0, 1, 2]
+
+
+def test_resume_skips_done():
+    scripts = [create_script(i) for i in range(4)]
+    recorder = Recorder()
+    ChainScheduler(scripts, recorder.run_script, done_idx={0, 2}).run()
+    assert recorder.get_started() == [1, 3]
+
+
+def test_should_stop():
+    scripts = [create_script(i) for i in range(3)]
+    recorder = Recorder()
+    ChainScheduler(scripts, recorder.run_script, message_callback=recorder.messages.append,
+                   should_stop=lambda: len(recorder.events) > 0).run()
+    assert recorder.get_started() == [0]
+    assert recorder.messages == ['脚本链已中止 跳过运行 [1, 2]']
+
+
+def test_teardown_only_before_dependents():
+    scripts = [create_script(0), create_script(1, 'a'), create_script(2, 'a')]
+    recorder = Recorder()
+    teardown_idx: list[int] = []
+    ChainScheduler(scripts, recorder.run_script, max_concurrency=2,
+                   teardown=lambda script: teardown_idx.append(script.idx)).run()
+    assert teardown_idx == [0]
@@ -0,0 +1,60 @@
+import datetime
+
+import pytest
+
+from script_chainer.runner.cron_schedule import CronSchedule, is_valid_cron
+
+t = datetime.datetime
+
+
+@pytest.mark.parametrize('expression, after, expected', [
+    ('30 4 * * *', t(2026, 10, 17, 12), t(2026, 10, 18, 4, 30)),
+    ('30 4 * * *', t(2026, 10, 17, 4, 29, 59), t(2026, 10, 17, 4, 30)),
+    ('30 4 * * *', t(2026, 10, 17, 4, 30, 10), t(2026, 10, 18, 4, 30)),  # 不包括开始的这一分钟
+    ('*/15 * * * *', t(2026, 10, 17, 10, 7), t(2026, 10, 17, 10, 15)),
+    ('*/15 * * * *', t(2026, 10, 17, 10, 45), t(2026, 10, 17, 11, 0)),
+    ('0 8-10/2 * * 1-5', t(2026, 10, 16, 10, 30), t(2026, 10, 19, 8, 0)),  # 周五之后是下周一
+    ('@weekly', t(2026, 10, 17, 12), t(2026, 10, 18)),
+    ('0 0 * * 7', t(2026, 10, 17), t(2026, 10, 18)),  # 7也是周日
+    ('0 0 31 * *', t(2026, 11, 1), t(2026, 12, 31)),  # 跳过没有31日的月份
+    ('0 0 1 1 *', t(2026, 12, 31, 23, 59), t(2027, 1, 1)),
+    ('0 0 29 2 *', t(2026, 3, 1), t(2028, 2, 29)),
+    # 日和星期都不是*时 满足其中一个即可
+    ('0 9 1 * 1', t(2026, 10, 17), t(2026, 10, 19, 9, 0)),
+    ('0 9 1 * 1', t(2026, 10, 27), t(2026, 11, 1, 9, 0)),
+])
+def test_next_time(expression: str, after: datetime.datetime, expected: datetime.datetime):
+    assert CronSchedule(expression).get_next_time(after) == expected
+
+
+def test_next_time_never():
+    assert CronSchedule('0 0 30 2 *').get_next_time(t(2026, 1, 1)) is None
+
+
+def test_next_time_matches():
+    schedule = CronSchedule('5,35 */6 * * *')
+    current = t(2026, 10, 17, 1, 2, 3)
+    for _ in range(10):
+        next_time = schedule.get_next_time(current)
+        assert next_time > current
+        assert schedule.match(next_time)
+        current = next_time
+    assert current == t(2026, 10, 18, 6, 35)
+
+
+@pytest.mark.parametrize('expression', [
+    '60 * * * *',
+    '* 24 * * *',
+    '* * 0 * *',
+    '* * * 13 *',
+    '* * * * 8',
+    '* * * *',
+    '*/0 * * * *',
+    '5-1 * * * *',
+    'a * * * *',
+    '@yearly',
+])
+def test_invalid(expression: str):
+    assert not is_valid_cron(expression)
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
@@ -0,0 +1,88 @@
+import os
+import time
+
+from script_chainer.runner.log_tailer import LogTailer
+
+
+def append(path: str, content: bytes) -> None:
+    with open(path, 'ab') as file:
+        file.write(content)
+
+
+def test_from_end_skips_existing(tmp_path):
+    path = str(tmp_path / 'a.log')
+    append(path, b'old\n')
+    tailer = LogTailer(path)
+    assert tailer.read_lines() == []
+    append(path, b'new\n')
+    assert tailer.read_lines() == ['new']
+
+    assert LogTailer(path, from_end=False).read_lines() == ['old', 'new']
+
+
+def test_missing_file(tmp_path):
+    path = str(tmp_path / 'a.log')
+    tailer = LogTailer(path)
+    assert tailer.read_lines() == []
+    append(path, b'first\n')  # 开始跟踪时不存在的文件 从开头读取
+    assert tailer.read_lines() == ['first']
+
+
+def test_partial_line(tmp_path):
+    path = str(tmp_path / 'a.log')
+    tailer = LogTailer(path)
+    append(path, b'hel')
+    assert tailer.read_lines() == []
+    append(path, b'lo\r\nwor')
+    assert tailer.read_lines() == ['hello']
+    append(path, b'ld\n')
+    assert tailer.read_lines() == ['world']
+
+
+def test_utf8_split_between_reads(tmp_path):
+    path = str(tmp_path / 'a.log')
+    tailer = LogTailer(path, max_read_bytes=4)
+    append(path, '任务完成\n'.encode('utf-8'))  # 每个汉字3个字节 每次读取都会截断一个字符
+    assert list(tailer.iter_lines()) == ['任务完成']
+    assert tailer.caught_up
+
+
+def test_iter_lines_reads_to_end(tmp_path):
+    path = str(tmp_path / 'a.log')
+    tailer = LogTailer(path, max_read_bytes=8)
+    append(path, b''.join(f'line {i}\n'.encode('utf-8') for i in range(20)))
+    assert tailer.read_lines() == ['line 0']
+    assert not tailer.caught_up
+    assert list(tailer.iter_lines()) == [f'line {i}' for i in range(1, 20)]
+
+
+def test_rotation_by_rename(tmp_path):
+    path = str(tmp_path / 'a.log')
+    append(path, b'old\n')
+    tailer = LogTailer(path)
+    os.rename(path, str(tmp_path / 'a.log.1'))
+    append(path, b'new\n')
+    assert tailer.read_lines() == ['new']
+
+
+def test_rotation_by_truncate(tmp_path):
+    path = str(tmp_path / 'a.log')
+    append(path, b'a long old line\n')
+    tailer = LogTailer(path)
+    with open(path, 'wb') as file:
+        file.write(b'new\n')
+    assert tailer.read_lines() == ['new']
+
+
+def test_rotation_by_glob(tmp_path):
+    old_path = str(tmp_path / '20260101.log')
+    append(old_path, b'old\n')
+    tailer = LogTailer(str(tmp_path / '*.log'))
+    append(old_path, b'old more\n')
+    assert tailer.read_lines() == ['old more']
+
+    new_path = str(tmp_path / '20260102.log')
+    append(new_path, b'new\n')
+    os.utime(new_path, (time.time() + 10, time.time() + 10))  # 确保新文件是最新修改的
+    assert tailer.read_lines() == ['new']
+    assert tailer.current_path == new_path
@@ -0,0 +1,129 @@
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from one_dragon.base.notify.push import Push
+from script_chainer.runner.notify_outbox import NotifyOutbox
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+
+    server: 'WebhookServer'
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get('Content-Length', '0'))
+        self.server.bodies.append(self.rfile.read(length).decode('utf-8'))
+        code = self.server.codes.pop(0) if len(self.server.codes) > 0 else 200
+        self.send_response(code)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class WebhookServer(HTTPServer):
+
+    def __init__(self, codes: list[int]):
+        """
+        自定义通知的接收端 按顺序返回 codes 中的状态码 用完后返回200
+        """
+        HTTPServer.__init__(self, ('127.0.0.1', 0), WebhookHandler)
+        self.codes: list[int] = codes
+        self.bodies: list[str] = []
+
+
+@pytest.fixture
+def webhook():
+    servers: list[WebhookServer] = []
+
+    def create(codes: list[int]) -> WebhookServer:
+        server = WebhookServer(codes)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield create
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def create_push(server: WebhookServer) -> Push:
+    push_config = SimpleNamespace(
+        custom_push_title='title',
+        webhook_url=f'http://127.0.0.1:{server.server_address[1]}/?title=$title',
+        webhook_method='POST',
+        webhook_content_type='text/plain',
+        webhook_body='$content',
+        webhook_headers='',
+    )
+    return Push(SimpleNamespace(push_config=push_config))
+
+
+def count_rows(db_path: str) -> int:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def wait_until(condition, timeout: float = 5) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_send_channels_reports_error_status(webhook):
+    server = webhook([503])
+    push = create_push(server)
+    assert push.send_channels('content') == ['custom_notify']
+    assert push.send_channels('content') == []
+    assert server.bodies == ['content', 'content']
+
+
+def test_outbox_retries_error_status(webhook, tmp_path):
+    server = webhook([500, 503])
+    push = create_push(server)
+    db_path = str(tmp_path / 'outbox.db')
+    outbox = NotifyOutbox(lambda: push, db_path=db_path, retry_seconds=0.05)
+    outbox.put('done')
+    try:
+        assert wait_until(lambda: len(server.bodies) == 3 and count_rows(db_path) == 0)
+    finally:
+        outbox.close()
+    assert server.bodies == ['done', 'done', 'done']
+
+
+def test_outbox_gives_up_after_max_attempts(webhook, tmp_path):
+    server = webhook([500] * 10)
+    push = create_push(server)
+    db_path = str(tmp_path / 'outbox.db')
+    outbox = NotifyOutbox(lambda: push, db_path=db_path, retry_seconds=0.01, max_attempts=2)
+    outbox.put('done')
+    try:
+        assert wait_until(lambda: count_rows(db_path) == 0)
+    finally:
+        outbox.close()
+    assert len(server.bodies) == 2
+
+
+def test_outbox_sends_without_digest_delay(webhook, tmp_path):
+    server = webhook([])
+    push = create_push(server)
+    outbox = NotifyOutbox(lambda: push, db_path=str(tmp_path / 'outbox.db'))
+    start_time = time.time()
+    outbox.put('done')
+    try:
+        assert wait_until(lambda: len(server.bodies) == 1, timeout=2)
+    finally:
+        outbox.close()
+    assert time.time() - start_time < 2
@@ -0,0 +1,113 @@
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+
+import pytest
+
+from script_chainer.runner import cpu_sampler
+from script_chainer.runner.cpu_sampler import SystemCpuSampler
+from script_chainer.runner.probes import AdaptiveInterval, CpuBelowProbe, check_probes
+
+FakeCpuTimes = namedtuple('FakeCpuTimes', ['user', 'idle'])
+
+
+class FakeClock:
+
+    def __init__(self):
+        """
+        可以手动推进的 cpu_times 和 monotonic
+        """
+        self.now: float = 100
+        self.user: float = 0
+        self.idle: float = 0
+
+    def advance(self, seconds: float, busy_percent: float) -> None:
+        self.now += seconds
+        self.user += seconds * busy_percent / 100
+        self.idle += seconds * (100 - busy_percent) / 100
+
+    def cpu_times(self) -> FakeCpuTimes:
+        return FakeCpuTimes(self.user, self.idle)
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    result = FakeClock()
+    monkeypatch.setattr(cpu_sampler.psutil, 'cpu_times', result.cpu_times)
+    monkeypatch.setattr(cpu_sampler.time, 'monotonic', result.monotonic)
+    return result
+
+
+def test_sampler_unknown_before_first_window(clock: FakeClock):
+    sampler = SystemCpuSampler(min_window_seconds=0.1)
+    assert sampler.get_percent() is None
+    clock.advance(0.05, 100)
+    assert sampler.get_percent() is None
+
+    clock.advance(0.15, 100)
+    assert sampler.get_percent() == pytest.approx(100)
+
+
+def test_sampler_window_and_reset(clock: FakeClock):
+    sampler = SystemCpuSampler(min_window_seconds=0.1)
+    clock.advance(1, 20)
+    assert sampler.get_percent() == pytest.approx(20)
+
+    # 窗口内返回上一次的结果
+    clock.advance(0.01, 100)
+    assert sampler.get_percent() == pytest.approx(20)
+
+    # 重新开始后 只统计之后的时间
+    sampler.reset()
+    assert sampler.get_percent() is None
+    clock.advance(0.5, 90)
+    assert sampler.get_percent() == pytest.approx(90)
+
+
+def test_cpu_below_probe_not_ready_on_first_check(clock: FakeClock):
+    probe = CpuBelowProbe(50)
+    assert not probe.check()
+    assert not check_probes([probe])
+
+    clock.advance(0.2, 10)
+    assert probe.check()
+
+    clock.advance(0.2, 95)
+    assert not probe.check()
+
+
+def _burn(stop_time: float) -> None:
+    while time.time() < stop_time:
+        pass
+
+
+def test_cpu_below_probe_with_real_load():
+    """
+    全部CPU满载时 第一次检查不能满足 统计到占用后仍然不满足
+    """
+    stop_time = time.time() + 3
+    workers = [multiprocessing.Process(target=_burn, args=(stop_time,), daemon=True)
+               for _ in range(os.cpu_count() or 1)]
+    for worker in workers:
+        worker.start()
+    try:
+        time.sleep(0.3)  # 等待负载开始
+        probe = CpuBelowProbe(50)
+        assert not probe.check()
+        time.sleep(0.5)
+        assert not probe.check()
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+
+
+def test_adaptive_interval():
+    interval = AdaptiveInterval(min_interval=0.1, max_interval=0.5, factor=2)
+    assert [interval.next() for _ in range(5)] == pytest.approx([0.1, 0.2, 0.4, 0.5, 0.5])
+    interval.reset()
+    assert interval.next() == pytest.approx(0.1)
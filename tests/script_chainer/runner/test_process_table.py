@@ -0,0 +1,36 @@
+import os
+
+import psutil
+
+from script_chainer.runner import process_table
+from script_chainer.runner.process_table import ProcessTable
+
+
+class UnreadableProcess:
+
+    def __init__(self, pid: int, error: type):
+        """
+        读取名称时抛出指定异常的进程
+        """
+        self.pid: int = pid
+        self.error: type = error
+
+    def name(self) -> str:
+        raise self.error(self.pid)
+
+
+def test_add_current_process():
+    table = ProcessTable()
+    table.refresh()
+    name = psutil.Process(os.getpid()).name()
+    assert os.getpid() in [i.pid for i in table.get_processes(name)]
+
+
+def test_add_unreadable_process(monkeypatch):
+    errors = {1001: psutil.ZombieProcess, 1002: psutil.AccessDenied, 1003: psutil.NoSuchProcess}
+    monkeypatch.setattr(process_table.psutil, 'pids', lambda: list(errors.keys()))
+    monkeypatch.setattr(process_table.psutil, 'Process', lambda pid: UnreadableProcess(pid, errors[pid]))
+    table = ProcessTable()
+    table.refresh()
+    # 僵尸进程和无权限的进程记录为无法读取 不会在每次刷新时重新读取 已经退出的进程不记录
+    assert table._pid_to_name == {1001: None, 1002: None}
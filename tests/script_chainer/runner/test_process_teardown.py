@@ -0,0 +1,99 @@
+import os
+import subprocess
+import time
+
+import psutil
+import pytest
+
+from script_chainer.config.script_config import ScriptConfig, CheckDoneMethods
+from script_chainer.config.script_plan import ScriptPlan
+from script_chainer.runner.process_table import ProcessTable
+from script_chainer.runner.process_teardown import get_teardown_processes, teardown_script
+from script_chainer.runner.process_tree_watcher import ProcessTreeWatcher
+from script_chainer.runner.run_metrics import ScriptRunMetrics
+from script_chainer.runner.script_run_result import ScriptRunResult
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'getsid'), reason='需要会话识别被收养的孤儿进程')
+
+
+def create_plan() -> ScriptPlan:
+    config = ScriptConfig(
+        script_path='/bin/sh',
+        script_process_name='',
+        game_process_name='',
+        run_timeout_seconds=60,
+        check_done=CheckDoneMethods.TREE_EMPTY.value.value,
+        kill_script_after_done=False,
+        kill_game_after_done=False,
+        script_arguments='',
+        notify_start=False,
+        notify_done=False,
+    )
+    return ScriptPlan(config)
+
+
+@pytest.fixture
+def orphan():
+    """
+    会话首进程两次fork出一个长时间运行的进程后退出 这个进程被收养 不再是子进程的后代
+    :return: 子进程, 孤儿进程
+    """
+    process = subprocess.Popen(
+        ['/bin/sh', '-c', '( sleep 30 & echo $! ); sleep 0.5'],
+        stdout=subprocess.PIPE, start_new_session=True,
+    )
+    orphan_pid = int(process.stdout.readline())
+    orphan_proc = psutil.Process(orphan_pid)
+    yield process, orphan_proc
+    process.stdout.close()
+    process.wait()
+    try:
+        orphan_proc.kill()
+    except psutil.Error:
+        pass
+
+
+def wait_member(tree_watcher: ProcessTreeWatcher, pid: int, timeout: float = 5) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if pid in [i.pid for i in tree_watcher.get_processes()]:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_forced_teardown_kills_orphan(orphan):
+    process, orphan_proc = orphan
+    tree_watcher = ProcessTreeWatcher(ProcessTable(), process.pid)
+    tree_watcher.start()
+    try:
+        assert wait_member(tree_watcher, orphan_proc.pid)
+        process.wait(timeout=5)
+        assert orphan_proc.ppid() != process.pid
+
+        plan = create_plan()
+        metrics = ScriptRunMetrics('', 0, plan.script_path)
+        tree_watcher.stop()  # 与执行器一样 停止检查后再关闭进程
+        # 没有进程树跟踪时 找不到被收养的孤儿进程
+        assert orphan_proc.pid not in [i.pid for i in get_teardown_processes(plan, metrics, ScriptRunResult.SKIPPED)]
+
+        report = teardown_script(plan, metrics, ScriptRunResult.SKIPPED, tree_watcher)
+        assert report is not None
+        assert report.remaining == []
+        assert not orphan_proc.is_running() or orphan_proc.status() == psutil.STATUS_ZOMBIE
+    finally:
+        tree_watcher.stop()
+
+
+def test_normal_done_keeps_orphan_without_kill_script(orphan):
+    process, orphan_proc = orphan
+    tree_watcher = ProcessTreeWatcher(ProcessTable(), process.pid)
+    tree_watcher.start()
+    try:
+        assert wait_member(tree_watcher, orphan_proc.pid)
+        plan = create_plan()
+        metrics = ScriptRunMetrics('', 0, plan.script_path)
+        processes = get_teardown_processes(plan, metrics, ScriptRunResult.SUCCESS, tree_watcher)
+        assert orphan_proc.pid not in [i.pid for i in processes]
+    finally:
+        tree_watcher.stop()